@@ -24,8 +24,9 @@
 ;;     This would indicate lines that will generate a warning when parsed by a
 ;;     more strict tool.
 ;;
-;;   * Provide a facility for a custom, possibly external, allocation summary
-;;     so that more detailed/careful analysis can be presented within Emacs.
+;;   * Extend the daemon-based summary (see ta-daemon-socket) beyond the
+;;     current day so that more detailed/careful analysis can be presented
+;;     within Emacs.
 ;;
 
 ;; provide an escape hatch for those who want even more customization
@@ -204,11 +205,117 @@
     )
 )
 
+;; path to the Unix domain socket of a running allocations daemon, started
+;; with:
+;;
+;;    python -m time_allocations serve -S <socket> [-y <year>] [<file> ...]
+;;
+;; when set, ta-summarize-current-allocations-with-daemon asks the daemon to
+;; summarize the day so the summary reflects full validation of the file.
+(defvar ta-daemon-socket nil)
+
+;; send a single query to the allocations daemon and return its result.
+(defun ta-daemon-query (request)
+  "Sends REQUEST, an alist, to the allocations daemon and returns the query's result."
+  (require 'json)
+  (unless ta-daemon-socket
+    (error "The allocations daemon's socket (ta-daemon-socket) is not set."))
+
+  (let* ((response-buffer (generate-new-buffer " *ta-daemon*"))
+         (process (make-network-process :name "ta-daemon"
+                                        :family 'local
+                                        :service ta-daemon-socket
+                                        :buffer response-buffer
+                                        :coding 'utf-8
+                                        :noquery t)))
+    (unwind-protect
+        (progn
+          (process-send-string process (concat (json-encode request) "\n"))
+
+          ;; responses are newline terminated so wait until we see one.
+          (while (and (process-live-p process)
+                      (not (with-current-buffer response-buffer
+                             (save-excursion
+                               (goto-char (point-min))
+                               (search-forward "\n" nil t)))))
+            (accept-process-output process 1))
+
+          (let ((response (with-current-buffer response-buffer
+                            (json-read-from-string (buffer-string)))))
+            (unless (equal (cdr (assq 'status response)) "ok")
+              (error "Allocations daemon: %s" (cdr (assq 'message response))))
+            (cdr (assq 'result response))))
+      (delete-process process)
+      (kill-buffer response-buffer)))
+)
+
+;; year of the first date in the buffer.  the daemon parses the buffer's file
+;; with it so dates are validated and each day's year is known.  when nil, the
+;; current year is used.
+(defvar-local ta-year nil)
+
+;; identify the year of the day containing the point by walking the date lines
+;; from the start of the buffer and rolling the year over each time a date
+;; precedes the one before it (e.g. 12/31 followed by 1/1).
+(defun ta-year-at-point ()
+  "Returns the year of the day containing the point."
+  (let ((year (or ta-year (string-to-number (format-time-string "%Y"))))
+        (limit (save-excursion (forward-line 1) (point)))
+        (previous-month-date nil))
+    (save-excursion
+      (goto-char (point-min))
+      (while (re-search-forward ta-date-regexp limit t)
+        (let* ((month-date (mapcar 'string-to-number
+                                   (split-string (cadr (split-string (match-string-no-properties 1)))
+                                                 "/")))
+               (month-date (+ (* 100 (car month-date)) (cadr month-date))))
+          (when (and previous-month-date (< month-date previous-month-date))
+            (setq year (1+ year)))
+          (setq previous-month-date month-date))))
+    year)
+)
+
+;; summarize the day containing the point via the allocations daemon.  the
+;; buffer is saved first so the daemon sees the current allocations, though the
+;; daemon only reparses the portion of the file that changed.  the day's year
+;; is sent along with its date so days from other years aren't included.
+(defun ta-summarize-current-allocations-with-daemon (&optional quiet_flag)
+  "Summarizes the allocations for the day containing the point using the allocations daemon."
+  (interactive)
+
+  (save-buffer)
+
+  (let* ((month-date (save-excursion
+                       (forward-line 1)
+                       (unless (re-search-backward ta-date-regexp nil t)
+                         (error "Not within a day's allocations."))
+                       (mapcar 'string-to-number
+                               (split-string (cadr (split-string (match-string-no-properties 1)))
+                                             "/"))))
+         (date-string (format "%04d-%02d-%02d"
+                              (ta-year-at-point)
+                              (car month-date)
+                              (cadr month-date)))
+         (duration (ta-daemon-query `((query . "total")
+                                      (files . [,(buffer-file-name)])
+                                      (year . ,(or ta-year
+                                                   (string-to-number (format-time-string "%Y"))))
+                                      (start . ,date-string)
+                                      (end . ,date-string)))))
+
+    ;; let the caller know the allocation summary.
+    (unless quiet_flag
+      (message "Today a total of %.2f hours." duration))
+
+    duration)
+)
+
 ;; setup our keybindings to efficiently interact with allocations.
 (defvar ta-mode-map
   (let ((map (make-sparse-keymap)))
     (define-key map (kbd "C-c d") 'ta-insert-current-date)
     (define-key map (kbd "C-c s") 'ta-summarize-current-allocations)
+    (define-key map (kbd "C-c S") 'ta-summarize-current-allocations-with-daemon)
     (define-key map (kbd "C-c t") 'ta-insert-current-time)
     (define-key map (kbd "C-c u") 'ta-update-timeline)
     map)
@@ -0,0 +1,617 @@
+#!/usr/bin/env python
+
+# command line interface to time allocations files.  invoked as:
+#
+#    python -m time_allocations [-t] <command> <file> [<file> ...]
+#
+# where <command> is one of "summary", "top", "validate", "export", "timelines",
+# "diff", or "serve".
+#
+# NOTE: this is frequently run from shell loops and editor hooks so startup
+#       time matters.  only the standard library is imported.  Pandas is
+#       only needed by the library's to_df().
+#
+
+import time
+
+# note when we started so import costs are visible when timings are requested.
+start_time = time.perf_counter()
+
+import argparse
+import sys
+
+from .allocations import Allocations, AllocationsConfig, top_categories
+
+class PhaseTimer( object ):
+    """
+    Accumulates wall clock timings for each phase of a command so they can be
+    reported when requested.
+    """
+
+    def __init__( self, start_time ):
+        """
+        Takes 1 argument:
+
+          start_time - time.perf_counter() value the first phase started at.
+        """
+
+        self._phases     = []
+        self._start_time = start_time
+        self._last_time  = start_time
+
+    def mark( self, phase_name ):
+        """
+        Records the time elapsed since the previous mark (or the timer's start)
+        as the duration of phase_name.
+
+        Takes 1 argument:
+
+          phase_name - String naming the phase that just completed.
+
+        Returns nothing.
+
+        """
+
+        current_time    = time.perf_counter()
+
+        self._phases.append( (phase_name, current_time - self._last_time) )
+        self._last_time = current_time
+
+    def report( self, file_like ):
+        """
+        Writes each phase's duration, and the total duration, to file_like.
+
+        Takes 1 argument:
+
+          file_like - File-like object to write the timings to.
+
+        Returns nothing.
+
+        """
+
+        for phase_name, duration in self._phases:
+            print( "{:>10s}: {:8.3f} ms".format( phase_name, duration * 1000 ),
+                   file=file_like )
+
+        print( "{:>10s}: {:8.3f} ms".format( "total", (self._last_time - self._start_time) * 1000 ),
+               file=file_like )
+
+def format_categories( categories ):
+    """
+    Formats a tuple of nested categories into the allocation file syntax.
+
+    Takes 1 argument:
+
+      categories - Tuple of nested categories, outermost first.
+
+    Returns 1 value:
+
+      categories_string - String of the form "<category>[ (<sub-category>[ (...)])]".
+
+    """
+
+    categories_string = categories[-1]
+    for category in reversed( categories[:-1] ):
+        categories_string = "{:s} ({:s})".format( category, categories_string )
+
+    return categories_string
+
+def load_allocations( file_names, configuration ):
+    """
+    Parses each of the supplied files into a single Allocations object.  A file
+    name of "-" reads from standard input.  Errors encountered are reported on
+    standard error.
+
+    Takes 2 arguments:
+
+      file_names    - List of file names to parse.
+      configuration - AllocationsConfig to parse with.
+
+    Returns 1 value:
+
+      allocations - Allocations object containing each file's allocations.
+
+    """
+
+    allocations = Allocations( configuration=configuration )
+
+    parse_files( allocations, file_names )
+    report_errors( allocations, sys.stderr )
+
+    return allocations
+
+def parse_files( allocations, file_names ):
+    """
+    Parses each of the supplied files into an existing Allocations object.  A file
+    name of "-" reads from standard input.
+
+    Takes 2 arguments:
+
+      allocations - Allocations object to parse into.
+      file_names  - List of file names to parse.
+
+    Returns nothing.
+
+    """
+
+    for file_name in file_names:
+        if file_name == "-":
+            allocations.parse( sys.stdin )
+        else:
+            with open( file_name, "r" ) as allocations_file:
+                allocations.parse( allocations_file )
+
+def report_errors( allocations, file_like ):
+    """
+    Writes each of the errors recorded while parsing to file_like, one per line, of
+    the form:
+
+      <allocations source>:<line number>:<column> - <error message> [<error code>]
+
+    Takes 2 arguments:
+
+      allocations - Allocations object whose errors are reported.
+      file_like   - File-like object to write the errors to.
+
+    Returns nothing.
+
+    """
+
+    errors = allocations.errors()
+
+    for error in errors:
+        print( "{:s}:{:d}:{:d} - {:s} [{:s}]".format( error.source,
+                                                      error.line_number,
+                                                      error.span[0] + 1,
+                                                      error.message,
+                                                      error.code ),
+               file=file_like )
+
+    # let the caller know when errors weren't recorded.
+    if len( errors ) < allocations.number_errors():
+        print( "{:d} additional error{:s} not shown.".format(
+            allocations.number_errors() - len( errors ),
+            "" if allocations.number_errors() - len( errors ) == 1 else "s" ),
+               file=file_like )
+
+def run_summary( arguments, timer ):
+    """
+    Prints the hours allocated to each category, to a maximum depth, along with
+    the total hours allocated.
+
+    Takes 2 arguments:
+
+      arguments - argparse.Namespace with the command's arguments.
+      timer     - PhaseTimer to record phases with.
+
+    Returns 1 value:
+
+      exit_status - Integer status to exit with.
+
+    """
+
+    allocations = load_allocations( arguments.files,
+                                    AllocationsConfig( duplicate_days=arguments.duplicate_days ) )
+    timer.mark( "parse" )
+
+    # restrict ourselves to a particular branch of the category tree.
+    if arguments.category is not None:
+        categories = Allocations._parse_categories( arguments.category )
+    else:
+        categories = None
+
+    totals = allocations.summarize( max_depth=arguments.depth,
+                                    categories=categories,
+                                    month=arguments.month )
+
+    for categories in sorted( totals ):
+        print( "{:8.2f}  {:s}".format( totals[categories],
+                                       format_categories( categories ) ) )
+    print( "{:8.2f}  {:s}".format( sum( totals.values() ), "(total)" ) )
+    timer.mark( "summary" )
+
+    return 0 if allocations.number_errors() == 0 else 1
+
+def run_top( arguments, timer ):
+    """
+    Prints the categories with the most hours allocated in each window of time.
+    Files are streamed so memory doesn't grow with the size of the archive.
+
+    Takes 2 arguments:
+
+      arguments - argparse.Namespace with the command's arguments.
+      timer     - PhaseTimer to record phases with.
+
+    Returns 1 value:
+
+      exit_status - Integer status to exit with.
+
+    """
+
+    configuration = AllocationsConfig( default_year=arguments.year )
+    number_errors = 0
+
+    def stream_files():
+        nonlocal number_errors
+
+        for file_name in arguments.files:
+            if file_name == "-":
+                allocations_file = sys.stdin
+            else:
+                allocations_file = open( file_name, "r" )
+
+            try:
+                for chunk in Allocations.stream( allocations_file, configuration ):
+                    report_errors( chunk, sys.stderr )
+                    number_errors += chunk.number_errors()
+
+                    yield chunk
+            finally:
+                if allocations_file is not sys.stdin:
+                    allocations_file.close()
+
+    if arguments.category is not None:
+        categories = Allocations._parse_categories( arguments.category )
+    else:
+        categories = None
+
+    for window_label, window_totals in top_categories( stream_files(),
+                                                       arguments.k,
+                                                       window=arguments.window,
+                                                       max_depth=arguments.depth,
+                                                       categories=categories ):
+        print( window_label )
+        for categories, hours in window_totals:
+            print( "{:8.2f}  {:s}".format( hours,
+                                           format_categories( categories ) ) )
+    timer.mark( "top" )
+
+    return 0 if number_errors == 0 else 1
+
+def run_validate( arguments, timer ):
+    """
+    Parses each file and reports the number of errors encountered.  The errors
+    themselves are reported on standard error.
+
+    Takes 2 arguments:
+
+      arguments - argparse.Namespace with the command's arguments.
+      timer     - PhaseTimer to record phases with.
+
+    Returns 1 value:
+
+      exit_status - Integer status to exit with.  Non-zero if any file had errors.
+
+    """
+
+    configuration = AllocationsConfig( strict_parsing=arguments.strict,
+                                       max_errors=arguments.max_errors,
+                                       deduplicate_errors=arguments.deduplicate,
+                                       abort_after_errors=arguments.abort_after,
+                                       collect_statistics=arguments.statistics )
+    number_errors = 0
+
+    for file_name in arguments.files:
+        allocations = Allocations( configuration=configuration )
+
+        # strict parsing, or too many errors, stops at the error that raised.
+        # the error was counted before it was raised.
+        try:
+            parse_files( allocations, [file_name] )
+        except ValueError as e:
+            print( str( e ), file=sys.stderr )
+
+        # strictly parsed errors are raised rather than recorded.
+        if not arguments.strict:
+            report_errors( allocations, sys.stderr )
+
+        number_errors += allocations.number_errors()
+
+        if arguments.statistics:
+            # only pay for the import when statistics are requested.
+            import json
+
+            print( json.dumps( {"file": file_name,
+                                "statistics": allocations.statistics()} ) )
+
+    timer.mark( "validate" )
+
+    if not arguments.quiet:
+        print( "{:d} error{:s} in {:d} file{:s}.".format(
+            number_errors,
+            "" if number_errors == 1 else "s",
+            len( arguments.files ),
+            "" if len( arguments.files ) == 1 else "s" ) )
+
+    return 0 if number_errors == 0 else 1
+
+def run_export( arguments, timer ):
+    """
+    Exports allocations as CSV or JSON Lines.  Records are streamed from the parsed
+    allocations rather than through a Pandas DataFrame.
+
+    Takes 2 arguments:
+
+      arguments - argparse.Namespace with the command's arguments.
+      timer     - PhaseTimer to record phases with.
+
+    Returns 1 value:
+
+      exit_status - Integer status to exit with.
+
+    """
+
+    allocations = load_allocations( arguments.files, AllocationsConfig( default_year=arguments.year ) )
+    timer.mark( "parse" )
+
+    if arguments.format == "jsonl":
+        write_records = allocations.write_jsonl
+    else:
+        write_records = allocations.write_csv
+
+    if arguments.output is None:
+        write_records( sys.stdout )
+    else:
+        with open( arguments.output, "w", newline="" ) as output_file:
+            write_records( output_file )
+    timer.mark( "export" )
+
+    return 0 if allocations.number_errors() == 0 else 1
+
+def run_timelines( arguments, timer ):
+    """
+    Prints each day whose timelines disagree with its allocations.
+
+    Takes 2 arguments:
+
+      arguments - argparse.Namespace with the command's arguments.
+      timer     - PhaseTimer to record phases with.
+
+    Returns 1 value:
+
+      exit_status - Integer status to exit with.  Non-zero if any day disagreed.
+
+    """
+
+    number_discrepancies = 0
+
+    for file_name in arguments.files:
+        allocations = load_allocations( [file_name], AllocationsConfig() )
+
+        for (date_string, logged_hours, allocated_hours) in allocations.timeline_discrepancies( arguments.tolerance ):
+            print( "{:s} {:>5s}: {:6.2f} logged, {:6.2f} allocated".format( file_name,
+                                                                            date_string,
+                                                                            logged_hours,
+                                                                            allocated_hours ) )
+            number_discrepancies += 1
+
+    timer.mark( "timelines" )
+
+    return 0 if number_discrepancies == 0 else 1
+
+def run_diff( arguments, timer ):
+    """
+    Prints the days and records that differ between two versions of an allocations
+    file.  Days are prefixed with "+" when added, "-" when removed, and "~" when
+    modified, followed by the records added and removed.
+
+    Takes 2 arguments:
+
+      arguments - argparse.Namespace with the command's arguments.
+      timer     - PhaseTimer to record phases with.
+
+    Returns 1 value:
+
+      exit_status - Integer status to exit with.  Non-zero if the versions differ
+                    or either had errors.
+
+    """
+
+    old_allocations = load_allocations( [arguments.old_file], AllocationsConfig() )
+    new_allocations = load_allocations( [arguments.new_file], AllocationsConfig() )
+    timer.mark( "parse" )
+
+    allocations_diff = old_allocations.diff( new_allocations )
+
+    for prefix, days in [("+", allocations_diff.added_days),
+                         ("-", allocations_diff.removed_days),
+                         ("~", allocations_diff.modified_days)]:
+        for date_string in days:
+            print( "{:s} {:s}".format( prefix, date_string ) )
+
+    for prefix, records in [("+", allocations_diff.added_records),
+                            ("-", allocations_diff.removed_records)]:
+        for (date_string, categories, duration) in records:
+            print( "{:s} {:>5s} {:8.2f}  {:s}".format( prefix,
+                                                       date_string,
+                                                       duration,
+                                                       format_categories( categories ) ) )
+    timer.mark( "diff" )
+
+    if old_allocations.number_errors() > 0 or new_allocations.number_errors() > 0:
+        return 1
+
+    return 0 if allocations_diff == ([], [], [], [], []) else 1
+
+def run_serve( arguments, timer ):
+    """
+    Runs the query daemon until interrupted.  See daemon.py for the queries
+    supported.
+
+    Takes 2 arguments:
+
+      arguments - argparse.Namespace with the command's arguments.
+      timer     - PhaseTimer to record phases with.
+
+    Returns 1 value:
+
+      exit_status - Integer status to exit with.
+
+    """
+
+    # the daemon isn't needed by the other commands so we avoid its import cost
+    # unless we're serving.
+    from .daemon import serve
+
+    serve( arguments.socket,
+           arguments.files,
+           AllocationsConfig( default_year=arguments.year ) )
+    timer.mark( "serve" )
+
+    return 0
+
+def parse_arguments( argv ):
+    """
+    Parses the command line.
+
+    Takes 1 argument:
+
+      argv - List of command line arguments, excluding the program name.
+
+    Returns 1 value:
+
+      arguments - argparse.Namespace with the parsed arguments.  The command's
+                  handler is in the "handler" attribute.
+
+    """
+
+    parser = argparse.ArgumentParser( prog="python -m time_allocations",
+                                      description="Summarizes, validates, and exports time allocations." )
+    parser.add_argument( "-t", "--timings", action="store_true",
+                         help="Report the time spent in each phase on standard error." )
+
+    subparsers          = parser.add_subparsers( dest="command" )
+    subparsers.required = True
+
+    summary_parser = subparsers.add_parser( "summary",
+                                            help="Summarize hours per category." )
+    summary_parser.add_argument( "-c", "--category",
+                                 help="Only summarize allocations within this category (e.g. \"project (task)\")." )
+    summary_parser.add_argument( "-d", "--depth", type=int, default=1,
+                                 help="Maximum category depth to summarize at.  Defaults to 1." )
+    summary_parser.add_argument( "-D", "--duplicate-days",
+                                 choices=[Allocations.DUPLICATE_DAYS_KEEP_FIRST,
+                                          Allocations.DUPLICATE_DAYS_KEEP_LAST,
+                                          Allocations.DUPLICATE_DAYS_SUM,
+                                          Allocations.DUPLICATE_DAYS_ERROR],
+                                 help="How days that appear more than once across the files are handled.  "
+                                      "Defaults to summing them without checking." )
+    summary_parser.add_argument( "-m", "--month", type=int, choices=range( 1, 13 ), metavar="MONTH",
+                                 help="Only summarize allocations in this month (1-12)." )
+    summary_parser.add_argument( "files", nargs="+", metavar="FILE",
+                                 help="Allocations file to summarize.  \"-\" reads from standard input." )
+    summary_parser.set_defaults( handler=run_summary )
+
+    top_parser = subparsers.add_parser( "top",
+                                        help="Report the categories with the most hours in each window of time." )
+    top_parser.add_argument( "-c", "--category",
+                             help="Only consider allocations within this category (e.g. \"project (task)\")." )
+    top_parser.add_argument( "-d", "--depth", type=int, default=1,
+                             help="Maximum category depth to total at.  Defaults to 1." )
+    top_parser.add_argument( "-k", type=int, default=10,
+                             help="Number of categories to report per window.  Defaults to 10." )
+    top_parser.add_argument( "-w", "--window", default=Allocations.WINDOW_QUARTER,
+                             choices=[Allocations.WINDOW_MONTH, Allocations.WINDOW_QUARTER, Allocations.WINDOW_YEAR],
+                             help="Window of time to total over.  Defaults to \"quarter\"." )
+    top_parser.add_argument( "-y", "--year", type=int,
+                             help="Year of the first date, so windows are labeled with years." )
+    top_parser.add_argument( "files", nargs="+", metavar="FILE",
+                             help="Allocations file to stream.  \"-\" reads from standard input." )
+    top_parser.set_defaults( handler=run_top )
+
+    validate_parser = subparsers.add_parser( "validate",
+                                             help="Report errors in allocations files." )
+    validate_parser.add_argument( "-a", "--abort-after", type=int, metavar="N",
+                                  help="Stop validating a file after N errors." )
+    validate_parser.add_argument( "-D", "--deduplicate", action="store_true",
+                                  help="Only report the first error of each kind per file." )
+    validate_parser.add_argument( "-M", "--max-errors", type=int, metavar="N",
+                                  help="Report at most N errors per file." )
+    validate_parser.add_argument( "-q", "--quiet", action="store_true",
+                                  help="Suppress the error count summary." )
+    validate_parser.add_argument( "-S", "--statistics", action="store_true",
+                                  help="Print each file's parsing statistics as a line of JSON." )
+    validate_parser.add_argument( "-s", "--strict", action="store_true",
+                                  help="Stop validating a file at its first error." )
+    validate_parser.add_argument( "files", nargs="+", metavar="FILE",
+                                  help="Allocations file to validate.  \"-\" reads from standard input." )
+    validate_parser.set_defaults( handler=run_validate )
+
+    export_parser = subparsers.add_parser( "export",
+                                           help="Export allocations as CSV or JSON Lines." )
+    export_parser.add_argument( "-f", "--format", choices=["csv", "jsonl"], default="csv",
+                                help="Format to export.  Defaults to CSV." )
+    export_parser.add_argument( "-o", "--output",
+                                help="Path to write the export to.  Defaults to standard output." )
+    export_parser.add_argument( "-y", "--year", type=int,
+                                help="Year of the first date, so each allocation's ISO date is exported." )
+    export_parser.add_argument( "files", nargs="+", metavar="FILE",
+                                help="Allocations file to export.  \"-\" reads from standard input." )
+    export_parser.set_defaults( handler=run_export )
+
+    timelines_parser = subparsers.add_parser( "timelines",
+                                              help="Report days whose timelines disagree with their allocations." )
+    timelines_parser.add_argument( "-T", "--tolerance", type=float, default=0.0,
+                                   help="Hours that timelines and allocations may differ by.  Defaults to 0." )
+    timelines_parser.add_argument( "files", nargs="+", metavar="FILE",
+                                   help="Allocations file to check.  \"-\" reads from standard input." )
+    timelines_parser.set_defaults( handler=run_timelines )
+
+    diff_parser = subparsers.add_parser( "diff",
+                                         help="Report the days and records that differ between two versions of a file." )
+    diff_parser.add_argument( "old_file", metavar="OLD",
+                              help="Original allocations file.  \"-\" reads from standard input." )
+    diff_parser.add_argument( "new_file", metavar="NEW",
+                              help="Modified allocations file.  \"-\" reads from standard input." )
+    diff_parser.set_defaults( handler=run_diff )
+
+    serve_parser = subparsers.add_parser( "serve",
+                                          help="Answer JSON queries over a Unix domain socket." )
+    serve_parser.add_argument( "-S", "--socket", required=True,
+                               help="Path of the Unix domain socket to listen on." )
+    serve_parser.add_argument( "-y", "--year", type=int,
+                               help="Year of the first date in each file, for queries that don't specify one." )
+    serve_parser.add_argument( "files", nargs="*", metavar="FILE",
+                               help="Allocations file to load up front." )
+    serve_parser.set_defaults( handler=run_serve )
+
+    arguments = parser.parse_args( argv )
+
+    if getattr( arguments, "depth", 1 ) < 1:
+        parser.error( "Depth must be positive ({:d})".format( arguments.depth ) )
+    if getattr( arguments, "k", 1 ) < 1:
+        parser.error( "K must be positive ({:d})".format( arguments.k ) )
+    if getattr( arguments, "window", None ) == Allocations.WINDOW_YEAR and arguments.year is None:
+        parser.error( "Yearly windows require a year (-y)" )
+
+    return arguments
+
+def main( argv=None ):
+    """
+    Runs the requested command.
+
+    Takes 1 argument:
+
+      argv - Optional list of command line arguments, excluding the program name.
+             If omitted, defaults to sys.argv[1:].
+
+    Returns 1 value:
+
+      exit_status - Integer status to exit with.
+
+    """
+
+    timer = PhaseTimer( start_time )
+    timer.mark( "startup" )
+
+    arguments = parse_arguments( sys.argv[1:] if argv is None else argv )
+
+    exit_status = arguments.handler( arguments, timer )
+
+    if arguments.timings:
+        timer.report( sys.stderr )
+
+    return exit_status
+
+if __name__ == "__main__":
+    sys.exit( main() )
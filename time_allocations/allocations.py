@@ -1,21 +1,121 @@
 from __future__ import print_function
 
+import array
+import collections
+import datetime
+import hashlib
+import heapq
+import itertools
 import re
 import sys
+import time
+import weakref
 
 STRING_INPUT_LABEL = "(string)"
 
+# structured description of a single parse error.  code is one of the
+# Allocations.ERROR_* constants and span is the (start, end) column range of the
+# offending text within its line.
+ParseError = collections.namedtuple( "ParseError", ["source", "line_number", "code", "message", "span"] )
+
+# differences between two versions of allocations.  see Allocations.diff().
+# days are "<month>/<date>" strings and records are (date, categories, duration)
+# tuples, as returned by Allocations.records().
+AllocationsDiff = collections.namedtuple( "AllocationsDiff", ["added_days",
+                                                              "removed_days",
+                                                              "modified_days",
+                                                              "added_records",
+                                                              "removed_records"] )
+
+# dense per-day totals over a span of dates.  see Allocations.daily_totals().
+# the *_days members are arrays of offsets, in days, from start.
+DailyTotals = collections.namedtuple( "DailyTotals", ["start",
+                                                      "hours",
+                                                      "missing_days",
+                                                      "under_days",
+                                                      "over_days",
+                                                      "weekly_utilization"] )
+
+# hours allocated to each category on each day, as coordinate (COO) arrays of a
+# sparse matrix with a row per category and a column per day.  see
+# Allocations.category_day_matrix().
+CategoryDayMatrix = collections.namedtuple( "CategoryDayMatrix", ["rows",
+                                                                  "columns",
+                                                                  "hours",
+                                                                  "categories",
+                                                                  "day_ordinals"] )
+
 class AllocationsConfig( object ):
     """
     """
 
-    def __init__( self, default_year=None, strict_parsing=False, validate_dates=True ):
+    def __init__( self, default_year=None, strict_parsing=False, validate_dates=True,
+                  max_errors=None, deduplicate_errors=False, abort_after_errors=None,
+                  collect_statistics=False, duration_scale=None, duplicate_days=None,
+                  category_aliases=None, casefold_categories=False, category_rewrites=None,
+                  max_line_length=None ):
         """
+          category_aliases    - Optional dictionary mapping alternate spellings of a
+                                category to its canonical spelling, e.g.
+                                {"Proj X": "ProjectX"}.  Aliases apply to each
+                                level of nested categories independently.  If
+                                omitted, defaults to None and categories aren't
+                                aliased.
+          casefold_categories - Optional flag specifying whether categories are
+                                case-folded.  Aliases are matched regardless of
+                                case and categories without an alias are folded to
+                                lower case.  If omitted, defaults to False.
+          category_rewrites   - Optional list of (pattern, replacement) pairs applied,
+                                in order, to each category with re.sub() before
+                                aliases are looked up.  Patterns may be strings or
+                                compiled regular expressions.  If omitted, defaults
+                                to None and categories aren't rewritten.
+          collect_statistics  - Optional flag specifying whether parsing statistics are
+                                collected.  See Allocations.statistics().  If omitted,
+                                defaults to False.
+          duration_scale      - Optional positive integer specifying the number of units
+                                per hour that durations are stored in as exact integers,
+                                e.g. Allocations.DURATION_SCALE_MINUTES.  If omitted,
+                                defaults to None and durations are stored as floating
+                                point hours.
+          duplicate_days      - Optional policy for days recorded more than once for
+                                the same owner, e.g. when blocks are copied between
+                                files.  Must be one of the Allocations.DUPLICATE_DAYS_*
+                                constants.  If omitted, defaults to None and duplicate
+                                days aren't detected.
+          max_line_length     - Optional positive integer specifying the length of the
+                                longest line, after comments and surrounding
+                                whitespace are removed, that is parsed.  Longer
+                                lines are ignored without being validated, e.g.
+                                log dumps pasted between allocations.  If omitted,
+                                defaults to None and lines of any length are
+                                parsed.
+          max_errors          - Optional non-negative integer specifying the maximum
+                                number of errors recorded.  Errors beyond this are
+                                counted but not recorded.  If omitted, defaults to None
+                                and all errors are recorded.
+          deduplicate_errors  - Optional flag specifying whether only the first error
+                                of each kind (error code) is recorded.  If omitted,
+                                defaults to False.
+          abort_after_errors  - Optional positive integer specifying the number of
+                                errors after which parsing is aborted with a
+                                ValueError.  If omitted, defaults to None and parsing
+                                is never aborted in non-strict mode.
         """
 
-        self._default_year   = default_year
-        self._strict_parsing = strict_parsing
-        self._validate_dates = validate_dates
+        self._default_year        = default_year
+        self._strict_parsing      = strict_parsing
+        self._validate_dates      = validate_dates
+        self._max_errors          = max_errors
+        self._deduplicate_errors  = deduplicate_errors
+        self._abort_after_errors  = abort_after_errors
+        self._collect_statistics  = collect_statistics
+        self._duration_scale      = duration_scale
+        self._duplicate_days      = duplicate_days
+        self._category_aliases    = category_aliases
+        self._casefold_categories = casefold_categories
+        self._category_rewrites   = category_rewrites
+        self._max_line_length     = max_line_length
 
     def defaults():
         """
@@ -33,8 +133,28 @@ class AllocationsConfig( object ):
             return self._strict_parsing
         elif key == "validate_dates":
             return self._validate_dates
+        elif key == "max_errors":
+            return self._max_errors
+        elif key == "deduplicate_errors":
+            return self._deduplicate_errors
+        elif key == "abort_after_errors":
+            return self._abort_after_errors
+        elif key == "collect_statistics":
+            return self._collect_statistics
+        elif key == "duration_scale":
+            return self._duration_scale
+        elif key == "duplicate_days":
+            return self._duplicate_days
+        elif key == "category_aliases":
+            return self._category_aliases
+        elif key == "casefold_categories":
+            return self._casefold_categories
+        elif key == "category_rewrites":
+            return self._category_rewrites
+        elif key == "max_line_length":
+            return self._max_line_length
         else:
-            return KeyError( "Unknown key ({:s})".format( key ) )
+            raise KeyError( "Unknown key ({:s})".format( key ) )
 
     def from_file( file_name ):
         """
@@ -44,6 +164,108 @@ class AllocationsConfig( object ):
         """
         """
 
+class _SharedRecords( object ):
+    """
+    Read-only sequence of (date, categories) records backed by columns in shared
+    memory.  Records are built from the day and category tables as they're
+    accessed so that attaching to shared memory doesn't build every record.  See
+    Allocations.from_shared_memory().
+    """
+
+    def __init__( self, days, categories_table, category_codes, allocation_days ):
+        """
+        Takes 4 arguments:
+
+          days             - List of "<month>/<date>" strings, one per day.
+          categories_table - List of the distinct category tuples.
+          category_codes   - Sequence of indices into categories_table, one per
+                             record.
+          allocation_days  - Sequence of indices into days, one per record.
+        """
+
+        self._days             = days
+        self._categories_table = categories_table
+        self._category_codes   = category_codes
+        self._allocation_days  = allocation_days
+
+    def __len__( self ):
+        return len( self._category_codes )
+
+    def __getitem__( self, index ):
+        if isinstance( index, slice ):
+            return [(self._days[day_index], self._categories_table[category_code])
+                    for day_index, category_code in zip( self._allocation_days[index],
+                                                         self._category_codes[index] )]
+
+        return (self._days[self._allocation_days[index]],
+                self._categories_table[self._category_codes[index]])
+
+    def __iter__( self ):
+        days             = self._days
+        categories_table = self._categories_table
+
+        for day_index, category_code in zip( self._allocation_days, self._category_codes ):
+            yield (days[day_index], categories_table[category_code])
+
+class _PrefixView( object ):
+    """
+    Read-only sequence of the first items of a list or array that is only appended
+    to.  Snapshots view the published prefix of each container rather than copying
+    it so that they're cheap to take regardless of the number of allocations.  See
+    Allocations.snapshot().
+    """
+
+    def __init__( self, container, length ):
+        """
+        Takes 2 arguments:
+
+          container - List or array.array to view.  Items beyond length may be
+                      appended to it while it is viewed, but the first length
+                      items must not change.
+          length    - Number of items at the start of container to view.
+        """
+
+        self._container = container
+        self._length    = length
+
+    def __len__( self ):
+        return self._length
+
+    def __getitem__( self, index ):
+        if isinstance( index, slice ):
+            start, stop, step = index.indices( self._length )
+            if step == 1:
+                return self._container[start:max( start, stop )]
+
+            return self._container[:self._length][index]
+
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError( "View index out of range" )
+
+        return self._container[index]
+
+    def __iter__( self ):
+        return itertools.islice( self._container, self._length )
+
+    def __array__( self, dtype=None, copy=None ):
+        # arrays are converted through their buffers rather than item by item.
+        import numpy as np
+
+        return np.asarray( self._container[:self._length], dtype=dtype )
+
+    @property
+    def typecode( self ):
+        return self._container.typecode
+
+    @property
+    def itemsize( self ):
+        return self._container.itemsize
+
+    def tobytes( self ):
+        return self._container[:self._length].tobytes()
+
 class Allocations( object ):
     """
     """
@@ -51,26 +273,110 @@ class Allocations( object ):
     FILTER_TYPE_EXCLUDE = "exclude"
     FILTER_TYPE_INCLUDE = "include"
 
+    # common scales for fixed point durations.  see AllocationsConfig.
+    DURATION_SCALE_MINUTES    = 60
+    DURATION_SCALE_HUNDREDTHS = 100
+
+    # policies for days recorded more than once for the same owner.  the first
+    # or the last of the days can be kept, both can be kept so their allocations
+    # are summed, or the duplicate can be reported as an error and dropped.
+    DUPLICATE_DAYS_KEEP_FIRST = "keep-first"
+    DUPLICATE_DAYS_KEEP_LAST  = "keep-last"
+    DUPLICATE_DAYS_SUM        = "sum"
+    DUPLICATE_DAYS_ERROR      = "error"
+
+    # containers that only grow between publications and that snapshots view the
+    # published prefix of.  see _publish() and snapshot().
+    SNAPSHOT_ATTRIBUTES = ["_allocations",
+                           "_durations",
+                           "_allocation_days",
+                           "_days",
+                           "_day_ordinals",
+                           "_day_starts",
+                           "_day_hashes",
+                           "_day_partitions",
+                           "_timeline_days",
+                           "_timeline_starts",
+                           "_timeline_ends",
+                           "_errors"]
+
+    # minimum number of lines parsed at a time by aload() before control is
+    # returned to the event loop, and by stream() before a chunk is yielded.
+    ASYNC_CHUNK_SIZE = 10000
+
+    # number of records written at a time by write_csv() and write_jsonl().
+    EXPORT_BATCH_SIZE = 8192
+
+    # windows that streaming queries total allocations over.  see
+    # top_categories().
+    WINDOW_MONTH   = "month"
+    WINDOW_QUARTER = "quarter"
+    WINDOW_YEAR    = "year"
+
+    # codes identifying the kinds of parse errors.  see ParseError.
+    ERROR_ALLOCATION_CATEGORY  = "allocation-category"
+    ERROR_ALLOCATION_DURATION  = "allocation-duration"
+    ERROR_ALLOCATION_MALFORMED = "allocation-malformed"
+    ERROR_ALLOCATION_UNDATED   = "allocation-undated"
+    ERROR_ALLOCATION_UNITS     = "allocation-units"
+    ERROR_DATE_DUPLICATE       = "date-duplicate"
+    ERROR_DATE_INVALID         = "date-invalid"
+    ERROR_DATE_MALFORMED       = "date-malformed"
+    ERROR_DATE_WEEKDAY         = "date-weekday"
+    ERROR_TIMELINE_INVALID     = "timeline-invalid"
+
+    # weekday names indexed by datetime.date.weekday().
+    WEEKDAYS = ["Monday",
+                "Tuesday",
+                "Wednesday",
+                "Thursday",
+                "Friday",
+                "Saturday",
+                "Sunday"]
+
+    # ordinal of the Unix epoch, used to convert day ordinals to datetime64's.
+    EPOCH_ORDINAL = datetime.date( 1970, 1, 1 ).toordinal()
+
+    # map from year to its weekday table, built on first use.  see
+    # _weekday_table().
+    _weekday_tables = {}
+
+    # names of the statistics collected while parsing.  see statistics().
+    STATISTICS_NAMES = ["lines_read",
+                        "blank_lines",
+                        "comment_lines",
+                        "ignored_lines",
+                        "dates_accepted",
+                        "dates_rejected",
+                        "allocations_accepted",
+                        "allocations_rejected",
+                        "timelines_accepted",
+                        "timelines_rejected",
+                        "is_valid_date_seconds",
+                        "is_valid_allocation_seconds",
+                        "record_allocation_seconds"]
+
+    # classifications of individual lines.  see _classify_line().
+    LINE_TYPE_ALLOCATION = "allocation"
+    LINE_TYPE_DATE       = "date"
+    LINE_TYPE_EMPTY      = "empty"
+    LINE_TYPE_IGNORED    = "ignored"
+    LINE_TYPE_INVALID    = "invalid"
+    LINE_TYPE_TIMELINE   = "timeline"
+
     # patterns for date-like and allocation-like lines.  used to determine
     # whether the parser should complain about a line that it didn't parse or
     # not.
     #
     # potential dates roughly match "<weekday> <digit>/<digit>" with deletions
     # of each sub-component.  potential allocations *roughly* match
-    # "<category>:.*<unit>" while trying taking into account the myriad of ways
-    # cut and paste could result in an allocation that should be flagged while
-    # ignoring commonly used divider/comment/formatting lines.
+    # "<category>:.*<unit>" and are detected by _looks_like_allocation() rather
+    # than a pattern, see it for details.
     # XXX: handle just <month>/<date>
     potential_date_pattern       = re.compile( r"^(" +
                                                r"(\w+\s+)?\d+\s*/\s*\d+" + r"|" + # optional weekday, with month/date (possibly whitespace padded)
                                                r"\w+\s+(\d+/\s*|\s*/\d+)" +       # weekday with month or date, but not both (possibly whitespace padded)
                                                r")$" )
-    # XXX: describe these one per line
-    potential_allocation_pattern = re.compile( r"^(" +
-                                               r"[^:]*:\s+([^:]*((hour|hr)s?)?)?" + r"|" + # category/subcategories with duration (possibly invalid) and units
-                                               r".*\d+(\.\d*)? (hour|hr)s?"       +        # anything with a duration and units at the end
-                                               r")$",
-                                               flags=re.IGNORECASE )
 
     # accept integral and fractional, positive durations.
     #
@@ -91,15 +397,20 @@ class Allocations( object ):
     # parentheses.
     valid_categories_pattern = re.compile( r"^([^()]+)(\((.*)\))?$" )
 
+    # match a single range within a timeline, "HH:MM-HH:MM", or an open range
+    # that hasn't ended yet, "HH:MM-".  hours and minutes are in groups #1 and
+    # #2 for the start and in groups #4 and #5 for the end.
+    timeline_range_pattern = re.compile( r"^(\d{2}):(\d{2})-((\d{2}):(\d{2}))?$" )
+
     def __init__( self, file_like=None, configuration=None ):
         # XXX: factor this out into a parse routine so additional fragments can
         #      be consumed by the object.
         """
           strict_parsing - Optional flag specifying whether parsing should fail if an invalid
                            line is encountered.  If True, invalid lines cause parsing to fail
-                           with an ValueError exception.  Otherwise, invalid lines cause a warning to
-                           be logged to standard error and the internal error count incremented.
-                           If omitted, defaults to False.
+                           with an ValueError exception.  Otherwise, invalid lines are recorded
+                           as ParseError's, available via errors(), and the internal error count
+                           incremented.  If omitted, defaults to False.
 
           validate_dates - Optional
           default_year   - Optional
@@ -114,10 +425,63 @@ class Allocations( object ):
         self._current_year = configuration.get( "default_year" )
 
         # determines how improperly formatted lines are handled.  exceptions are
-        # raised when strictness is requested, warnings on standard error
-        # otherwise.
+        # raised when strictness is requested, errors are recorded otherwise.
         self._strict_parsing = configuration.get( "strict_parsing" )
 
+        # bounds on the errors recorded when parsing isn't strict.
+        self._max_errors         = configuration.get( "max_errors" )
+        self._deduplicate_errors = configuration.get( "deduplicate_errors" )
+        self._abort_after_errors = configuration.get( "abort_after_errors" )
+
+        # statistics are only collected when requested so parsing doesn't pay for
+        # them otherwise.
+        self._collect_statistics = configuration.get( "collect_statistics" )
+
+        # lines longer than this are ignored without being validated.
+        self._max_line_length = configuration.get( "max_line_length" )
+
+        # durations are either floating point hours or integers in units of
+        # 1/scale hours.  the latter sum exactly and are converted to hours when
+        # they're exported.
+        self._duration_scale = configuration.get( "duration_scale" )
+
+        # days are only indexed by owner and date when duplicates are handled.
+        self._duplicate_days = configuration.get( "duplicate_days" )
+        if self._duplicate_days not in (None,
+                                        Allocations.DUPLICATE_DAYS_KEEP_FIRST,
+                                        Allocations.DUPLICATE_DAYS_KEEP_LAST,
+                                        Allocations.DUPLICATE_DAYS_SUM,
+                                        Allocations.DUPLICATE_DAYS_ERROR):
+            raise ValueError( "Unknown duplicate days policy ({:s})".format( self._duplicate_days ) )
+
+        # compile the category normalizations once.  aliases are keyed by their
+        # case-folded spelling when categories are case-folded so they match
+        # regardless of case.
+        self._casefold_categories = configuration.get( "casefold_categories" )
+        self._category_rewrites   = [(re.compile( pattern ) if isinstance( pattern, str ) else pattern, replacement)
+                                     for (pattern, replacement) in (configuration.get( "category_rewrites" ) or [])]
+        self._category_aliases    = {(alias.casefold() if self._casefold_categories else alias): category
+                                     for alias, category in (configuration.get( "category_aliases" ) or {}).items()}
+
+        self._normalize_categories = (self._casefold_categories or
+                                      len( self._category_rewrites ) > 0 or
+                                      len( self._category_aliases ) > 0)
+
+        # map from each distinct categories string to its normalized and
+        # interned categories so each is only decomposed once, along with the
+        # distinct normalized categories.
+        self._categories_cache    = {}
+        self._interned_categories = {}
+
+        # state published for readers, the number of times it has been published,
+        # and a weak reference to the snapshot of the most recent publication, if
+        # one was taken and is still in use.  snapshots can't be modified.  see
+        # snapshot().
+        self._published = None
+        self._version   = 0
+        self._snapshot  = None
+        self._read_only = False
+
         # reset the allocations.
         self.clear()
 
@@ -128,37 +492,70 @@ class Allocations( object ):
         # and didn't fully construct an object, or we've complained and the
         # caller can check a non-zero number of errors that have accumulated.
 
-    def _raise_parse_error( self, source_string, line_number, error_string, parsed_line ):
+    def _raise_parse_error( self, source_string, line_number, error_code, error_string, parsed_line, raw_line ):
         """
-        Raises or logs a parse error depending on whether strict parsing was requested.
-        If strict parsing was requested, a ValueError is raised, otherwise the error is
-        logged to standard error.  In either case the error message is of the form:
+        Raises or records a parse error depending on whether strict parsing was requested.
+        If strict parsing was requested, a ValueError is raised with a message of the
+        form:
 
           <allocations source>:<line number> <error message> (<parsed line>)
 
-        Takes 5 arguments:
+        Otherwise a ParseError is recorded, subject to the configured maximum number of
+        errors and error deduplication, and parsing is aborted with a ValueError if the
+        configured number of errors has been reached.  In either case the error count is
+        incremented.
+
+        Takes 7 arguments:
 
           self          - Allocations object that encountered an error.
           source_string - String specifying the source of the error encountered.
           line_number   - Line number of source_string where the parse error occurred.
+          error_code    - One of the Allocations.ERROR_* constants identifying the kind
+                          of parse error.
           error_string  - Error message describing the parse error.
-          parsed_line   - Input line that generated the parse error.
+          parsed_line   - Cleaned input line that generated the parse error.
+          raw_line      - Input line, prior to cleaning, that generated the parse error.
 
         Returns nothing.
 
         """
 
-        formatted_error = "{:s}:{:d} - {:s} (\"{:s}\")".format(
-            source_string,
-            line_number,
-            error_string,
-            parsed_line )
+        self._number_errors += 1
 
-        # raise or print depending on how retentive we've been configured.
+        # raise or record depending on how retentive we've been configured.
         if self._strict_parsing is True:
-            raise ValueError( formatted_error )
-        else:
-            print( formatted_error, file=sys.stderr )
+            raise ValueError( "{:s}:{:d} - {:s} (\"{:s}\")".format(
+                source_string,
+                line_number,
+                error_string,
+                parsed_line ) )
+
+        if ((self._max_errors is None or len( self._errors ) < self._max_errors) and
+            not (self._deduplicate_errors and error_code in self._error_codes)):
+            self._errors.append( ParseError( source_string,
+                                             line_number,
+                                             error_code,
+                                             error_string,
+                                             Allocations._line_span( raw_line, parsed_line ) ) )
+            self._error_codes.add( error_code )
+
+        if (self._abort_after_errors is not None and
+            self._number_errors >= self._abort_after_errors):
+            raise ValueError( "{:s}:{:d} - Too many errors ({:d})".format(
+                source_string,
+                line_number,
+                self._number_errors ) )
+
+    def _line_span( raw_line, cleaned_line ):
+        """
+        Returns the (start, end) column range of cleaned_line within raw_line.
+        """
+
+        # cleaning only removes characters from either end of the raw line so the
+        # first occurrence is the cleaned line.
+        start_index = raw_line.find( cleaned_line )
+
+        return (start_index, start_index + len( cleaned_line ))
 
     def _is_valid_date( date_string, year=None ):
         """
@@ -184,22 +581,16 @@ class Allocations( object ):
                         date_string.  If omitted, defaults to None and date_string
                         is not verified to be consistent with a particular year.
 
-        Returns 2 values:
+        Returns 3 values:
 
           status        - Boolean specifying whether date_string is valid or not.
+          error_code    - One of the Allocations.ERROR_* constants identifying why
+                          date_string is invalid when status is False.  None otherwise.
           error_message - A message indicating why date_string is invalid when status
                           is False.  Empty otherwise.
 
         """
 
-        weekdays = ["Sunday",
-                    "Monday",
-                    "Tuesday",
-                    "Wednesday",
-                    "Thursday",
-                    "Friday",
-                    "Saturday"]
-
         # break the date into weekday and numeric month and day so we can
         # validate each.
         #
@@ -209,38 +600,98 @@ class Allocations( object ):
         try:
             weekday, month_date_string = date_string.split()
         except ValueError:
-            return (False, "Date is not well formed")
+            return (False, Allocations.ERROR_DATE_MALFORMED, "Date is not well formed")
 
         # make sure the weekday is known.
-        if weekday not in weekdays:
-            return (False, "Invalid weekday in date ({:s})".format( weekday ))
+        if weekday not in Allocations.WEEKDAYS:
+            return (False, Allocations.ERROR_DATE_WEEKDAY, "Invalid weekday in date ({:s})".format( weekday ))
 
         # ensure we have a numeric month and date.
         try:
             month, date = list( map( int, month_date_string.split( "/" ) ) )
         except ValueError:
-            return (False,
+            return (False, Allocations.ERROR_DATE_MALFORMED,
                     "Date is not well formed".format( date_string ))
 
         # validate the month/date is valid without knowing the year.
         # we assume that leap dates are okay here.
         if month in [1, 3, 5, 7, 8, 10, 12]:
             if not (1 <= date <= 31):
-                return (False, "Date is invalid ({:d}/{:d})".format( month, date ))
+                return (False, Allocations.ERROR_DATE_INVALID, "Date is invalid ({:d}/{:d})".format( month, date ))
         elif month in [4, 6, 9, 11]:
             if not (1 <= date <= 30):
-                return (False, "Date is invalid ({:d}/{:d})".format( month, date ))
+                return (False, Allocations.ERROR_DATE_INVALID, "Date is invalid ({:d}/{:d})".format( month, date ))
         elif month == 2:
             if not (1 <= date <= 29):
-                return (False, "Date is invalid ({:d}/{:d})".format( month, date ))
+                return (False, Allocations.ERROR_DATE_INVALID, "Date is invalid ({:d}/{:d})".format( month, date ))
         else:
-            return (False, "Month is invalid ({:d})".format( month ))
+            return (False, Allocations.ERROR_DATE_INVALID, "Month is invalid ({:d})".format( month ))
 
         # verify the weekday matches the date provided for the given year.
         if year is not None:
-            return (False, "XXX")
+            day_entry = Allocations._weekday_table( year ).get( (month, date) )
+
+            if day_entry is None:
+                return (False, Allocations.ERROR_DATE_INVALID, "Date is invalid ({:d}/{:d}/{:d})".format( month, date, year ))
+            elif day_entry[0] != weekday:
+                return (False, Allocations.ERROR_DATE_WEEKDAY,
+                        "Weekday does not match date ({:d}/{:d}/{:d} is a {:s})".format( month, date, year, day_entry[0] ))
+
+        return (True, None, "")
+
+    def _weekday_table( year ):
+        """
+        Returns the weekday table for a year, building it on first use.  Tables are
+        shared by every Allocations object so dates are validated with a dictionary
+        lookup rather than constructing a datetime.date per line.
+
+        Takes 1 argument:
+
+          year - Integer specifying the year of the table.
+
+        Returns 1 value:
+
+          weekday_table - Dictionary mapping (month, date) to a (weekday, ordinal)
+                          pair for every day in year.  weekday is one of
+                          Allocations.WEEKDAYS and ordinal is the day's proleptic
+                          Gregorian ordinal.  See datetime.date.toordinal().
+
+        """
+
+        weekday_table = Allocations._weekday_tables.get( year )
+        if weekday_table is not None:
+            return weekday_table
+
+        weekday_table = {}
+
+        first_day     = datetime.date( year, 1, 1 )
+        first_ordinal = first_day.toordinal()
+        first_weekday = first_day.weekday()
+
+        is_leap_year = (year % 4 == 0 and (year % 100 != 0 or year % 400 == 0))
+        month_days   = [31, 29 if is_leap_year else 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
+
+        day_number = 0
+        for month, number_days in enumerate( month_days, start=1 ):
+            for date in range( 1, number_days + 1 ):
+                weekday_table[(month, date)] = (Allocations.WEEKDAYS[(first_weekday + day_number) % 7],
+                                                first_ordinal + day_number)
+                day_number += 1
+
+        Allocations._weekday_tables[year] = weekday_table
 
-        return (True, "")
+        return weekday_table
+
+    def _date_month_date( date_string ):
+        """
+        Returns the numeric (month, date) pair of a date string that has been
+        validated with _is_valid_date().
+        """
+
+        _, month_date_string = date_string.split()
+        month, date          = month_date_string.split( "/" )
+
+        return (int( month ), int( date ))
 
     def _looks_like_date( date_string ):
         """
@@ -264,9 +715,11 @@ class Allocations( object ):
           allocation_string - String containing an allocation to validate for
                               well formedness.
 
-        Returns 2 values:
+        Returns 3 values:
 
           status        - Boolean specifying whether allocation_string is valid or not.
+          error_code    - One of the Allocations.ERROR_* constants identifying why
+                          allocation_string is invalid when status is False.  None otherwise.
           error_message - A message indicating why allocation_string is invalid when status
                           is False.  Empty otherwise.
 
@@ -285,21 +738,21 @@ class Allocations( object ):
                                                                     allocation_string.split( ":" ) ) ) )
 
         except ValueError:
-            return (False, "Allocation is not well formed")
+            return (False, Allocations.ERROR_ALLOCATION_MALFORMED, "Allocation is not well formed")
 
         try:
             time_string, units_string = duration_string.split()
         except ValueError:
-            return (False, "Allocation is missing units")
+            return (False, Allocations.ERROR_ALLOCATION_UNITS, "Allocation is missing units")
 
         # we currently only support time in hours.
         if units_string.lower() not in ["hour", "hours"]:
-            return (False, "Allocation has wrong units - expected \"hours\" but received \"{:s}\"".format(
+            return (False, Allocations.ERROR_ALLOCATION_UNITS, "Allocation has wrong units - expected \"hours\" but received \"{:s}\"".format(
                 units_string ))
 
         # verify we got a positive time.
         if not Allocations.valid_duration_pattern.match( time_string ):
-            return (False, "Allocation has invalid duration")
+            return (False, Allocations.ERROR_ALLOCATION_DURATION, "Allocation has invalid duration")
 
         # our regular expression should pull a subset of floating point values
         # that we're willing to accept.  make sure it hasn't accidentally
@@ -307,11 +760,11 @@ class Allocations( object ):
         try:
             float( time_string )
         except ValueError:
-            return (False, "Allocation has invalid duration")
+            return (False, Allocations.ERROR_ALLOCATION_DURATION, "Allocation has invalid duration")
 
         # catch an empty category without sub-categories.
         if len( categories_string ) == 0:
-            return (False, "Allocation has an empty category")
+            return (False, Allocations.ERROR_ALLOCATION_CATEGORY, "Allocation has an empty category")
 
         # our duration is sensible, now verify that we've only got nested
         # sub-categories.  verify our parentheses are balanced and follow
@@ -325,7 +778,7 @@ class Allocations( object ):
                 # means that this isn't a nested sub-category, but rather
                 # a second sub-category at a particular nesting level.
                 if maximum_count > parentheses_count:
-                    return (False, "Allocation has multiple sub-categories")
+                    return (False, Allocations.ERROR_ALLOCATION_CATEGORY, "Allocation has multiple sub-categories")
 
                 parentheses_count += 1
                 maximum_count     += 1
@@ -335,21 +788,21 @@ class Allocations( object ):
 
                 if parentheses_count < 0:
                     if maximum_count == 0:
-                        return (False, "Allocation has a closing parenthesis without an open")
+                        return (False, Allocations.ERROR_ALLOCATION_CATEGORY, "Allocation has a closing parenthesis without an open")
                     else:
-                        return (False, "Allocation has too many closing parentheses")
+                        return (False, Allocations.ERROR_ALLOCATION_CATEGORY, "Allocation has too many closing parentheses")
 
         # do we have an open parenthesis that was not closed along the way?
         if parentheses_count != 0:
-            return (False, "Allocation has an unmatched open parenthesis")
+            return (False, Allocations.ERROR_ALLOCATION_CATEGORY, "Allocation has an unmatched open parenthesis")
 
         # do we have well-formed sub-categories and an empty category?
         if maximum_count > 0 and categories_string.find( "(" ) == 0:
-            return (False, "Allocation has an empty category")
+            return (False, Allocations.ERROR_ALLOCATION_CATEGORY, "Allocation has an empty category")
 
         # if there were no sub-categories, we're good.
         if maximum_count == 0:
-            return (True, "")
+            return (True, None, "")
 
         # check that all of the sub-categories are non-empty.  iterate through
         # the first N - 1 nested sub-categories and examine the distance between
@@ -373,18 +826,335 @@ class Allocations( object ):
 
             if( close_distance == 1 or
                 categories_string[open_index+1:close_index].isspace()):
-                return (False, "Allocation has an empty sub-category (nesting level {:d})".format( nesting_index + 1 ) )
+                return (False, Allocations.ERROR_ALLOCATION_CATEGORY, "Allocation has an empty sub-category (nesting level {:d})".format( nesting_index + 1 ) )
 
             open_index += close_distance
 
         # all of the sub-categories are non-empty.
-        return (True, "")
+        return (True, None, "")
 
     def _looks_like_allocation( allocation_string ):
         """
+        Determines whether a line that isn't a valid allocation looks enough like one
+        that it should be reported rather than ignored.  This tries to take into
+        account the myriad of ways cut and paste could result in an allocation that
+        should be flagged while ignoring commonly used divider/comment/formatting
+        lines.  Lines look like allocations if they either:
+
+          1. Have a single colon that is followed by whitespace, e.g. a category
+             with a (possibly invalid) duration.
+          2. End with a duration and units, e.g. "... 1.5 hours".
+
+        NOTE: this was previously a regular expression whose alternatives
+              backtracked quadratically on long lines of digits or whitespace.  it
+              is now a handful of linear scans of the line, so lines of any length
+              are checked in time proportional to their length.
+
+        Takes 1 argument:
+
+          allocation_string - Cleaned line to check.
+
+        Returns 1 value:
+
+          looks_like_allocation - Boolean indicating whether allocation_string
+                                  looks like an allocation.
+
+        """
+
+        # category/sub-categories with a duration (possibly invalid) and units.
+        colon_index = allocation_string.find( ":" )
+        if (colon_index > -1 and
+            allocation_string[colon_index + 1:colon_index + 2].isspace() and
+            allocation_string.find( ":", colon_index + 1 ) == -1):
+            return True
+
+        # anything with a duration and units at the end, e.g. "<digits> hours" or
+        # "<digits>. hr".  units are case insensitive and may be plural.
+        line = allocation_string.lower()
+        if line.endswith( "s" ):
+            line = line[:-1]
+
+        for units in ("hour", "hr"):
+            if line.endswith( " " + units ):
+                duration_string = line[:-len( units ) - 1]
+                break
+        else:
+            return False
+
+        # the duration either ends with a digit or is a number with a trailing
+        # decimal point.
+        if duration_string.endswith( "." ):
+            duration_string = duration_string[:-1]
+
+        return duration_string[-1:].isdecimal()
+
+    def _parse_timeline( timeline_string ):
+        """
+        Parses a timeline into the time ranges it is comprised of.  The supplied
+        timeline must be of the form:
+
+          HH:MM-HH:MM [HH:MM-HH:MM [...]] [HH:MM-] [(<duration> hours)]
+
+        Where the last range may be open (i.e. it has started but not ended) and
+        the optional parenthetical note at the end is ignored.  Ranges whose end is
+        before their start are assumed to span midnight.
+
+        Takes 1 argument:
+
+          timeline_string - String containing a timeline to parse.
+
+        Returns 3 values:
+
+          is_timeline   - Boolean specifying whether timeline_string has the form of
+                          a timeline.
+          error_message - A message indicating why timeline_string is invalid when
+                          it is a timeline with invalid times.  Empty otherwise.
+          ranges        - List of (start, end) tuples, in minutes since midnight, for
+                          each of the closed ranges in the timeline.  Empty if
+                          timeline_string is not a valid timeline.
+
+        """
+
+        # drop the duration note.
+        note_index = timeline_string.find( "(" )
+        if note_index > -1:
+            if not timeline_string.endswith( ")" ):
+                return (False, "", [])
+
+            timeline_string = timeline_string[:note_index]
+
+        range_strings = timeline_string.split()
+        if len( range_strings ) == 0:
+            return (False, "", [])
+
+        range_matches = list( map( Allocations.timeline_range_pattern.match, range_strings ) )
+        if not all( range_matches ):
+            return (False, "", [])
+
+        ranges = []
+        for range_index, range_match in enumerate( range_matches ):
+            start_hours, start_minutes, _, end_hours, end_minutes = range_match.groups()
+
+            # only the last range may still be open.
+            if end_hours is None:
+                if range_index != (len( range_matches ) - 1):
+                    return (True, "Timeline has an open range before its end", [])
+                continue
+
+            times = []
+            for hours, minutes in ((start_hours, start_minutes), (end_hours, end_minutes)):
+                if int( hours ) > 23 or int( minutes ) > 59:
+                    return (True, "Timeline has an invalid time ({:s}:{:s})".format( hours, minutes ), [])
+
+                times.append( int( hours ) * 60 + int( minutes ) )
+
+            # ranges that end before they start continue past midnight.
+            if times[1] < times[0]:
+                times[1] += 24 * 60
+
+            ranges.append( tuple( times ) )
+
+        return (True, "", ranges)
+
+    def _parse_categories( categories_string ):
+        """
+        Decomposes a category string into a tuple of nested categories.  The category
+        string is assumed to be well-formed according to _is_valid_allocation().
+
+        Takes 1 argument:
+
+          categories_string - String of the form "<category>[ (<sub-category>[ (...)])]".
+
+        Returns 1 value:
+
+          categories - Tuple of nested categories, outermost first.
+
+        """
+
+        # walk through the string and extract each nested category one at a
+        # time.  we build a list we'll construct a tuple from
+        categories_list = []
+        while categories_string is not None:
+            matches                             = Allocations.valid_categories_pattern.match( categories_string ).groups()
+            current_category, categories_string = matches[0].strip(), matches[2]
+
+            categories_list.append( current_category )
+
+        return tuple( categories_list )
+
+    def _normalize_category( self, category ):
+        """
+        Normalizes a single category according to the configured rewrites, case
+        folding, and aliases, in that order.
+
+        Takes 1 argument:
+
+          category - String containing a single category (without nesting).
+
+        Returns 1 value:
+
+          category - String containing the normalized category.
+
+        """
+
+        for pattern, replacement in self._category_rewrites:
+            category = pattern.sub( replacement, category )
+
+        if self._casefold_categories:
+            category = category.casefold()
+
+        return self._category_aliases.get( category, category )
+
+    def _categories( self, categories_string ):
+        """
+        Decomposes a category string into a tuple of normalized, interned categories.
+        Results are memoized so each distinct category string is only decomposed and
+        normalized once.  See _parse_categories() and _normalize_category().
+
+        Takes 1 argument:
+
+          categories_string - String of the form "<category>[ (<sub-category>[ (...)])]".
+
+        Returns 1 value:
+
+          categories - Tuple of nested categories, outermost first.
+
+        """
+
+        categories = self._categories_cache.get( categories_string )
+
+        if categories is None:
+            categories = self._intern_categories( Allocations._parse_categories( categories_string ) )
+
+            self._categories_cache[categories_string] = categories
+
+        return categories
+
+    def _intern_categories( self, categories ):
+        """
+        Normalizes and interns a tuple of nested categories so that categories that
+        normalize to the same categories share a single tuple.  See
+        _normalize_category().
+
+        Takes 1 argument:
+
+          categories - Tuple of nested categories, outermost first.
+
+        Returns 1 value:
+
+          categories - Tuple of normalized, interned categories.
+
+        """
+
+        if self._normalize_categories:
+            categories = tuple( map( self._normalize_category, categories ) )
+
+        categories = tuple( map( sys.intern, categories ) )
+
+        return self._interned_categories.setdefault( categories, categories )
+
+    def _clean_line( line ):
+        """
+        Removes comments and leading/trailing whitespace from a line.
+
+        Takes 1 argument:
+
+          line - String containing a single line of allocations.
+
+        Returns 1 value:
+
+          cleaned_line - line without its comment and surrounding whitespace.
+
+        """
+
+        # strip out empty comments.
+        comment_start_index = line.find( "#" )
+        if comment_start_index > -1:
+            line = line[:comment_start_index]
+
+        # remove leading/trailing whitespace.
+        return line.strip()
+
+    def _classify_line( line, year=None, statistics=None, max_line_length=None ):
+        """
+        Classifies a line as a date, an allocation, an invalid line that should be
+        reported, or a line that is ignored.  Lines are cleaned with _clean_line()
+        before they are classified.
+
+        Takes 4 arguments:
+
+          line            - String containing a single line of allocations.
+          year            - Optional integer specifying the year to validate dates
+                            with.  See _is_valid_date() for details.
+          statistics      - Optional dictionary to accumulate the time spent in
+                            each validator into.  If omitted, defaults to None and
+                            the validators are not timed.
+          max_line_length - Optional positive integer specifying the length of the
+                            longest cleaned line that is validated.  Longer lines
+                            are ignored.  If omitted, defaults to None and lines of
+                            any length are validated.
+
+        Returns 4 values:
+
+          line_type     - One of the Allocations.LINE_TYPE_* constants.
+          cleaned_line  - line after cleaning.
+          error_code    - One of the Allocations.ERROR_* constants identifying why
+                          the line is invalid when line_type is LINE_TYPE_INVALID.
+                          None otherwise.
+          error_message - A message indicating why the line is invalid when line_type
+                          is LINE_TYPE_INVALID.  Empty otherwise.
+
         """
 
-        return Allocations.potential_allocation_pattern.match( allocation_string )
+        line = Allocations._clean_line( line )
+
+        # ignore empty lines.
+        if len( line ) == 0:
+            return (Allocations.LINE_TYPE_EMPTY, line, None, "")
+
+        # reject overly long lines before any of the validators see them.
+        if max_line_length is not None and len( line ) > max_line_length:
+            return (Allocations.LINE_TYPE_IGNORED, line, None, "")
+
+        if statistics is not None:
+            start_time = time.perf_counter()
+
+        date_status, date_code, date_error = Allocations._is_valid_date( line, year )
+
+        if statistics is not None:
+            end_time                             = time.perf_counter()
+            statistics["is_valid_date_seconds"] += end_time - start_time
+            start_time                           = end_time
+
+        if date_status is True:
+            return (Allocations.LINE_TYPE_DATE, line, None, "")
+
+        allocation_status, allocation_code, allocation_error = Allocations._is_valid_allocation( line )
+
+        if statistics is not None:
+            statistics["is_valid_allocation_seconds"] += time.perf_counter() - start_time
+
+        if allocation_status is True:
+            return (Allocations.LINE_TYPE_ALLOCATION, line, None, "")
+
+        is_timeline, timeline_error, _ = Allocations._parse_timeline( line )
+        if is_timeline is True:
+            if len( timeline_error ) > 0:
+                return (Allocations.LINE_TYPE_INVALID, line, Allocations.ERROR_TIMELINE_INVALID, timeline_error)
+
+            return (Allocations.LINE_TYPE_TIMELINE, line, None, "")
+
+        # neither the date nor the allocation are valid, so we need to determine
+        # if we silently ignore this line because it isn't something we would be
+        # expected to parse or if we need to complain.
+        if Allocations._looks_like_date( line ):
+            return (Allocations.LINE_TYPE_INVALID, line, date_code, date_error)
+        elif Allocations._looks_like_allocation( line ):
+            return (Allocations.LINE_TYPE_INVALID, line, allocation_code, allocation_error)
+
+        # this line didn't look like either a date or an allocation so we assume
+        # it wasn't something we should parse.
+        return (Allocations.LINE_TYPE_IGNORED, line, None, "")
 
     def _record_allocation( self, date_string, allocation_string ):
         """
@@ -409,7 +1179,9 @@ class Allocations( object ):
                                 categories[4] corresponds to the
                                 sub-sub-sub-category.
 
-              duration        - Floating point duration for the allocation.
+              duration        - Duration for the allocation.  Floating point hours
+                                unless durations are fixed point, in which case
+                                this is an integer number of units.
 
             """
 
@@ -427,18 +1199,14 @@ class Allocations( object ):
             #
             categories_string, duration_string = allocation_string.split( ":" )
 
-            duration                           = float( duration_string.split()[0] )
+            duration_string                    = duration_string.split()[0]
 
-            # walk through the string and extract each nested category one at a
-            # time.  we build a list we'll construct a tuple from
-            categories_list = []
-            while categories_string is not None:
-                matches                             = Allocations.valid_categories_pattern.match( categories_string ).groups()
-                current_category, categories_string = matches[0].strip(), matches[2]
+            if self._duration_scale is None:
+                duration = float( duration_string )
+            else:
+                duration = Allocations._fixed_point_duration( duration_string, self._duration_scale )
 
-                categories_list.append( current_category )
-
-            return (tuple( categories_list ), duration)
+            return (self._categories( categories_string ), duration)
 
         if date_string is None:
             # XXX: we don't know where to record this particular allocation.
@@ -446,154 +1214,2352 @@ class Allocations( object ):
 
         categories, duration = _parse_allocation( allocation_string )
 
-        self._allocations.append( (date_string, categories, duration) )
+        # positive durations smaller than half of a unit, or too small to be
+        # represented as floating point, round to nothing, which would silently
+        # lose them.
+        if duration == 0:
+            if self._duration_scale is None:
+                raise ValueError( "Allocation duration rounds to zero" )
 
-    def clear( self ):
+            raise ValueError( "Allocation duration rounds to zero ({:d} units per hour)".format(
+                self._duration_scale ) )
+
+        # allocations belong to the most recently parsed day.
+        self._allocations.append( (date_string, categories) )
+        self._durations.append( duration )
+        self._allocation_days.append( len( self._days ) - 1 )
+
+    def _fixed_point_duration( duration_string, scale ):
         """
-        Clears existing allocations.  All known categories and their allocations are
-        wiped out so that the allocations from the next call to parse() are the only
-        allocations available.
+        Converts a valid duration string into an integer number of units without
+        going through floating point, rounding to the nearest unit.  Durations
+        smaller than half of a unit round to zero.
 
-        Takes no arguments.
+        Takes 2 arguments:
 
-        Returns nothing.
+          duration_string - String containing a duration in hours that is valid
+                            according to valid_duration_pattern.
+          scale           - Positive integer specifying the number of units per hour.
 
-        """
+        Returns 1 value:
 
-        # XXX:
-        self._allocations   = []
-        self._number_errors = 0
+          duration - Integer number of units in duration_string.
 
-    def get_configuration( self ):
-        """
         """
 
-        return self._configuration
+        integral_string, _, fractional_string = duration_string.partition( "." )
 
-    def number_errors( self ):
-        """
-        """
+        numerator   = int( (integral_string + fractional_string) or "0" )
+        denominator = 10 ** len( fractional_string )
 
-        return self._number_errors
+        # round halves up.
+        return (2 * numerator * scale + denominator) // (2 * denominator)
 
-    def parse( self, file_like, current_year=None, current_configuration=None ):
-        # XXX: file_like is the wrong name since it ends up being a string
+    def _record_timeline( self, timeline_string ):
         """
-        Parses a block of allocations and merges them into the existing allocations.
-        XXX: raises ValueError or complains depending upon the configuration.
-
-        Takes 3 arguments:
+        Records the ranges of a valid timeline against the most recently parsed day.
 
-          file_like             -
-          current_year          - XXX: Parse with a temporary year.
-          current_configuration - XXX: Parse with a temporary configuration.
+        Takes 1 argument:
 
-        Returns 1 value:
+          timeline_string - String containing a timeline that is valid according to
+                            _parse_timeline().
 
-          status -
+        Returns nothing.
 
         """
 
-        if current_configuration is None:
-            current_configuration = self._configuration
-
-        # XXX: handle the current date being optional
-        if current_year is None:
-            current_year = self._current_year
+        _, _, ranges = Allocations._parse_timeline( timeline_string )
 
-        # XXX: shouldn't be part of the instance
-        allocations_source  = "(string)"
-        current_line_number = 0
+        day_index = len( self._days ) - 1
+        for (start, end) in ranges:
+            self._timeline_days.append( day_index )
+            self._timeline_starts.append( start )
+            self._timeline_ends.append( end )
 
-        # note the previous number of errors
-        previous_error_count = self.number_errors()
+    def _publish( self ):
+        """
+        Publishes the current state so that snapshots taken from now on reflect it.
+        The containers are published along with their lengths rather than being
+        copied, since they only grow until they're replaced (e.g. by clear()).
+        Readers view the published prefix of each when they take a snapshot.
 
-        # read in all of the lines if we're working with a file-like object.  we
-        # assume this will never be used on truly large data (100's of thousands
-        # of lines) so we simply buffer the data and move on.
-        if not isinstance( file_like, str ):
+        Takes no arguments.
 
-            # figure out where these allocations come from.
-            try:
-                allocations_source = file_like.name
-            except:
-                allocations_source = "(unknown)"
+        Returns nothing.
 
-            allocations_string = file_like.readlines()
+        """
 
-            file_like = allocations_string
+        # statistics are updated in place so they're copied.
+        if self._statistics is None:
+            statistics = None
         else:
-            file_like = file_like.splitlines()
+            statistics = dict( self._statistics )
+
+        source_statistics = {source: dict( source_statistics )
+                             for source, source_statistics in self._source_statistics.items()}
+
+        # publish everything with a single assignment so readers never see part
+        # of a publication.
+        self._published = ([(getattr( self, name ), len( getattr( self, name ) ))
+                            for name in Allocations.SNAPSHOT_ATTRIBUTES],
+                           self._number_errors,
+                           statistics,
+                           source_statistics,
+                           self._version + 1)
+        self._version  += 1
+
+    def _close_day( self ):
+        """
+        Hashes the allocations of the most recently parsed day once all of them
+        have been recorded.  Days whose hashes match have the same allocations, so
+        versions of allocations can be compared day by day.  See diff().
 
-        # walk through line-by-line and parse the allocations from cleaned up
-        # lines.
-        for current_line in file_like:
+        Hashes are computed from a canonical form of the day's text rather than
+        with hash(), whose values are salted per process, so that they're
+        meaningful when shared with, or persisted for, other processes.
 
-            current_line_number += 1
+        Takes no arguments.
 
-            # strip out empty comments.
-            comment_start_index = current_line.find( "#" )
-            if comment_start_index > -1:
-                current_line = current_line[:comment_start_index]
+        Returns nothing.
 
-            # remove leading/trailing whitespace.
-            current_line = current_line.strip()
+        """
 
-            # ignore empty lines.
-            if len( current_line ) == 0:
-                continue
+        day_start = self._day_starts[-1]
 
-            # are we looking at the start of a new day?
-            date_status, date_error = Allocations._is_valid_date( current_line,
-                                                                  current_year )
+        # separate the date, allocations, and categories with control characters
+        # that can't appear in a parsed line so the form is unambiguous.
+        day_string = "\x1e".join( [self._days[-1]] +
+                                   ["\x1f".join( categories ) + "\x1d" + repr( duration )
+                                    for ((_, categories), duration) in zip( self._allocations[day_start:],
+                                                                           self._durations[day_start:] )] )
 
-            if date_status is True:
-                weekday, current_date = current_line.split()
-                continue
+        day_digest = hashlib.blake2b( day_string.encode( "utf-8" ), digest_size=8 ).digest()
 
-            allocation_status, allocation_error = Allocations._is_valid_allocation( current_line )
+        self._day_hashes.append( int.from_bytes( day_digest, "little", signed=True ) )
 
-            if allocation_status is True:
-                try:
-                    self._record_allocation( current_date, current_line )
-                except ValueError as e:
-                    # XXX: failed to record (likely no date)
-                    self._number_errors +=1
+    def _index_day( self, day_key, allocations_source, line_number, parsed_line, raw_line ):
+        """
+        Indexes the day about to be recorded and applies the duplicate days policy
+        if the day was already recorded.  Days that are dropped by the policy are
+        marked so their allocations are removed once parsing completes.  See
+        _drop_days().
 
+        Takes 5 arguments:
+
+          day_key            - (owner, date, ordinal) tuple identifying the day.
+          allocations_source - String specifying the source of the day.
+          line_number        - Line number of the day's date within allocations_source.
+          parsed_line        - Cleaned date line.
+          raw_line           - Date line prior to cleaning.
+
+        Returns nothing.
+
+        """
+
+        day_index       = len( self._days )
+        first_day_index = self._day_indices.get( day_key )
+
+        if first_day_index is None:
+            self._day_indices[day_key] = day_index
+        elif self._duplicate_days == Allocations.DUPLICATE_DAYS_KEEP_FIRST:
+            self._dropped_days.add( day_index )
+        elif self._duplicate_days == Allocations.DUPLICATE_DAYS_KEEP_LAST:
+            self._dropped_days.add( first_day_index )
+            self._day_indices[day_key] = day_index
+        elif self._duplicate_days == Allocations.DUPLICATE_DAYS_ERROR:
+            if self._statistics is not None:
+                self._statistics["dates_accepted"] -= 1
+                self._statistics["dates_rejected"] += 1
+
+            self._raise_parse_error( allocations_source,
+                                     line_number,
+                                     Allocations.ERROR_DATE_DUPLICATE,
+                                     "Day was already recorded ({:s})".format( day_key[1] ),
+                                     parsed_line,
+                                     raw_line )
+            self._dropped_days.add( day_index )
+
+        # days whose allocations are summed are simply recorded again.
+
+    def _drop_days( self ):
+        """
+        Removes the days marked as dropped, along with their allocations and
+        timelines, in a single pass.
+
+        Takes no arguments.
+
+        Returns nothing.
+
+        """
+
+        # map each day to its index once the dropped days are removed, or to
+        # None if it is dropped.
+        new_day_indices = []
+        number_days     = 0
+        for day_index in range( len( self._days ) ):
+            if day_index in self._dropped_days:
+                new_day_indices.append( None )
+            else:
+                new_day_indices.append( number_days )
+                number_days += 1
+
+        kept_days = [day_index for day_index in range( len( self._days ) )
+                     if new_day_indices[day_index] is not None]
+
+        kept_allocations = [allocation_index for allocation_index, day_index in enumerate( self._allocation_days )
+                            if new_day_indices[day_index] is not None]
+        kept_timelines   = [timeline_index for timeline_index, day_index in enumerate( self._timeline_days )
+                            if new_day_indices[day_index] is not None]
+
+        # each kept day starts where the previous kept day's allocations end.
+        day_starts = array.array( "L" )
+        day_start  = 0
+        for day_index in kept_days:
+            day_starts.append( day_start )
+
+            if day_index + 1 < len( self._day_starts ):
+                day_start += self._day_starts[day_index + 1] - self._day_starts[day_index]
+            else:
+                day_start += len( self._allocations ) - self._day_starts[day_index]
+
+        self._allocations     = [self._allocations[allocation_index] for allocation_index in kept_allocations]
+        self._durations       = array.array( self._durations.typecode,
+                                             [self._durations[allocation_index] for allocation_index in kept_allocations] )
+        self._allocation_days = array.array( "L",
+                                             [new_day_indices[self._allocation_days[allocation_index]]
+                                              for allocation_index in kept_allocations] )
+
+        self._timeline_days   = array.array( "L",
+                                             [new_day_indices[self._timeline_days[timeline_index]]
+                                              for timeline_index in kept_timelines] )
+        self._timeline_starts = array.array( "H", [self._timeline_starts[timeline_index] for timeline_index in kept_timelines] )
+        self._timeline_ends   = array.array( "H", [self._timeline_ends[timeline_index] for timeline_index in kept_timelines] )
+
+        self._days           = [self._days[day_index] for day_index in kept_days]
+        self._day_ordinals   = array.array( "l", [self._day_ordinals[day_index] for day_index in kept_days] )
+        self._day_partitions = [self._day_partitions[day_index] for day_index in kept_days]
+        self._day_hashes     = array.array( "q", [self._day_hashes[day_index] for day_index in kept_days] )
+        self._day_starts     = day_starts
+
+        self._day_indices = {day_key: new_day_indices[day_index]
+                             for day_key, day_index in self._day_indices.items()}
+
+        self._dropped_days = set()
+
+    def _partitions( self ):
+        """
+        Returns the partition index of the parsed days.  Days are partitioned by
+        their year and owner, and each partition summarizes its days so that queries
+        can skip partitions without scanning their allocations.
+
+        The index is cached and extended with the days parsed since it was built, or
+        rebuilt if days were removed.  Readers racing to build the index each build
+        their own and the last one built is cached.
+
+        Takes no arguments.
+
+        Returns 1 value:
+
+          partitions - Dictionary mapping (year, owner) to a dictionary describing
+                       the partition with the following keys:
+
+                         segments      - List of [first day, end day) index ranges
+                                         of the consecutive days in the partition.
+                         first_ordinal - Smallest day ordinal in the partition.
+                         last_ordinal  - Largest day ordinal in the partition.
+                         categories    - Set of the distinct category tuples
+                                         allocated to in the partition.
+
+                       Ordinals are 0 when the year is unknown.
+
+        """
+
+        day_partitions = self._day_partitions
+        number_days    = len( day_partitions )
+
+        cached = self._partition_index
+        if cached is not None and cached[0] is day_partitions:
+            if cached[1] == number_days:
+                return cached[2]
+
+            # copy the partitions before extending them so readers of the
+            # cached index never see it change.
+            first_day  = cached[1]
+            partitions = {partition_key: {"segments":      [list( segment ) for segment in partition["segments"]],
+                                          "first_ordinal": partition["first_ordinal"],
+                                          "last_ordinal":  partition["last_ordinal"],
+                                          "categories":    set( partition["categories"] )}
+                          for partition_key, partition in cached[2].items()}
+        else:
+            first_day  = 0
+            partitions = {}
+
+        for day_index in range( first_day, number_days ):
+            day_ordinal = self._day_ordinals[day_index]
+            partition   = partitions.get( day_partitions[day_index] )
+
+            if partition is None:
+                partition = {"segments":      [],
+                             "first_ordinal": day_ordinal,
+                             "last_ordinal":  day_ordinal,
+                             "categories":    set()}
+                partitions[day_partitions[day_index]] = partition
+
+            segments = partition["segments"]
+            if len( segments ) > 0 and segments[-1][1] == day_index:
+                segments[-1][1] += 1
+            else:
+                segments.append( [day_index, day_index + 1] )
+
+            partition["first_ordinal"] = min( partition["first_ordinal"], day_ordinal )
+            partition["last_ordinal"]  = max( partition["last_ordinal"], day_ordinal )
+
+            record_start, record_end = self._day_record_range( day_index )
+            partition["categories"].update( [categories for (_, categories) in self._allocations[record_start:record_end]] )
+
+        self._partition_index = (day_partitions, number_days, partitions)
+
+        return partitions
+
+    def _partition_ranges( self, owners, start_ordinal, end_ordinal, categories ):
+        """
+        Returns the ranges of allocations that may satisfy a query, skipping the
+        partitions that can't.  See _partitions().
+
+        Takes 4 arguments:
+
+          owners        - Collection of owners to include, or None to include all.
+          start_ordinal - Ordinal of the first day to include, or None.
+          end_ordinal   - Ordinal of the last day to include, or None.
+          categories    - Tuple of nested categories allocations must be within.
+
+        Returns 1 value:
+
+          ranges - List of (first allocation, end allocation, check dates) tuples,
+                   in the order the allocations were parsed.  check dates is True
+                   when the range's allocations must be checked against the
+                   ordinals since the partition only partially overlaps them.
+
+        """
+
+        number_categories = len( categories )
+        ranges            = []
+
+        for (_, owner), partition in self._partitions().items():
+            if owners is not None and owner not in owners:
+                continue
+
+            # days without a year never fall within a range of dates.
+            check_dates = False
+            if start_ordinal is not None or end_ordinal is not None:
+                if partition["first_ordinal"] == 0:
+                    continue
+                if start_ordinal is not None and partition["last_ordinal"] < start_ordinal:
+                    continue
+                if end_ordinal is not None and partition["first_ordinal"] > end_ordinal:
+                    continue
+
+                check_dates = ((start_ordinal is not None and partition["first_ordinal"] < start_ordinal) or
+                               (end_ordinal is not None and partition["last_ordinal"] > end_ordinal))
+
+            if number_categories > 0:
+                if not any( partition_categories[:number_categories] == categories
+                            for partition_categories in partition["categories"] ):
+                    continue
+
+            for first_day, end_day in partition["segments"]:
+                ranges.append( (self._day_starts[first_day],
+                                self._day_record_range( end_day - 1 )[1],
+                                check_dates) )
+
+        return sorted( ranges )
+
+    def _day_record_range( self, day_index ):
+        """
+        Returns the [first allocation, end allocation) index range of a day's
+        allocations.
+        """
+
+        day_start = self._day_starts[day_index]
+        if day_index + 1 < len( self._day_starts ):
+            day_end = self._day_starts[day_index + 1]
+        else:
+            day_end = len( self._allocations )
+
+        return (day_start, day_end)
+
+    def _day_records( self, day_index ):
+        """
+        Returns the records of a single day as a list of (date, categories, duration)
+        tuples.  See records().
+        """
+
+        day_start, day_end = self._day_record_range( day_index )
+
+        if self._duration_scale is None:
+            duration_scale = 1
+        else:
+            duration_scale = self._duration_scale
+
+        return [(date_string, categories, duration / duration_scale)
+                for ((date_string, categories), duration) in zip( self._allocations[day_start:day_end],
+                                                                  self._durations[day_start:day_end] )]
+
+    def _export_batches( self, batch_size ):
+        """
+        Generates the parsed allocations in batches of flat rows for exporting.  See
+        write_csv() and write_jsonl().
+
+        Takes 1 argument:
+
+          batch_size - Maximum number of rows per batch.
+
+        Returns 1 value:
+
+          batches - Iterator of lists of (date, ISO date, duration, categories)
+                    tuples.  ISO date is the "YYYY-MM-DD" string of the
+                    allocation's day, or None when its year is unknown, and
+                    duration is in hours.
+
+        """
+
+        if self._duration_scale is None:
+            duration_scale = 1
+        else:
+            duration_scale = self._duration_scale
+
+        # records are grouped by day so each day's ISO date is formatted once.
+        previous_day_index = None
+        iso_date           = None
+
+        for batch_start in range( 0, len( self._allocations ), batch_size ):
+            batch_end = batch_start + batch_size
+            batch     = []
+
+            for ((date_string, categories), duration, day_index) in zip( self._allocations[batch_start:batch_end],
+                                                                         self._durations[batch_start:batch_end],
+                                                                         self._allocation_days[batch_start:batch_end] ):
+                if day_index != previous_day_index:
+                    day_ordinal        = self._day_ordinals[day_index]
+                    iso_date           = datetime.date.fromordinal( day_ordinal ).isoformat() if day_ordinal > 0 else None
+                    previous_day_index = day_index
+
+                batch.append( (date_string, iso_date, duration / duration_scale, categories) )
+
+            yield batch
+
+    def _window_label( window, date_string, day_ordinal ):
+        """
+        Returns the label of the window of time a day falls within.  See
+        top_categories() for the labels of each window.  Raises ValueError if a
+        yearly window is requested for a day without a year.
+        """
+
+        month = int( date_string.split( "/" )[0] )
+
+        if window == Allocations.WINDOW_YEAR:
+            if day_ordinal == 0:
+                raise ValueError( "Yearly windows require dates with a year ({:s})".format( date_string ) )
+
+            return "{:d}".format( datetime.date.fromordinal( day_ordinal ).year )
+        elif window == Allocations.WINDOW_QUARTER:
+            label = "Q{:d}".format( (month - 1) // 3 + 1 )
+        else:
+            label = "{:02d}".format( month )
+
+        if day_ordinal > 0:
+            label = "{:d}-{:s}".format( datetime.date.fromordinal( day_ordinal ).year, label )
+
+        return label
+
+    def _split_day_chunks( lines, chunk_size ):
+        """
+        Splits lines into chunks of roughly chunk_size lines that each start at a
+        date line, so that each chunk can be parsed independently of the others.
+        The first chunk starts at the first line regardless of whether it is a date.
+
+        Takes 2 arguments:
+
+          lines      - List of lines to split.
+          chunk_size - Positive integer specifying the minimum number of lines in
+                       each chunk.  The last chunk may be shorter.
+
+        Returns 1 value:
+
+          chunks - List of (first line number, lines) pairs, one per chunk.  Line
+                   numbers start from 1.
+
+        """
+
+        chunks      = []
+        chunk_start = 0
+
+        while chunk_start < len( lines ):
+            # extend the chunk to the next date so that no day is split.
+            chunk_end = chunk_start + chunk_size
+            while (chunk_end < len( lines ) and
+                   not Allocations._is_valid_date( Allocations._clean_line( lines[chunk_end] ) )[0]):
+                chunk_end += 1
+
+            chunks.append( (chunk_start + 1, lines[chunk_start:chunk_end]) )
+            chunk_start = chunk_end
+
+        return chunks
+
+    def _read_day_chunks( file_name, chunk_size ):
+        """
+        Reads a file and splits it into day-aligned chunks with _split_day_chunks().
+        """
+
+        with open( file_name, "r" ) as allocations_file:
+            return Allocations._split_day_chunks( allocations_file.readlines(),
+                                                  chunk_size )
+
+    def _count_line( statistics, raw_line, line_type, error_code ):
+        """
+        Counts a classified line in the parsing statistics.
+
+        Takes 4 arguments:
+
+          statistics - Dictionary of statistics to update.
+          raw_line   - Line, prior to cleaning, that was classified.
+          line_type  - One of the Allocations.LINE_TYPE_* constants for raw_line.
+          error_code - One of the Allocations.ERROR_* constants when line_type is
+                       LINE_TYPE_INVALID.  Ignored otherwise.
+
+        Returns nothing.
+
+        """
+
+        statistics["lines_read"] += 1
+
+        if line_type == Allocations.LINE_TYPE_EMPTY:
+            if "#" in raw_line:
+                statistics["comment_lines"] += 1
+            else:
+                statistics["blank_lines"] += 1
+        elif line_type == Allocations.LINE_TYPE_DATE:
+            statistics["dates_accepted"] += 1
+        elif line_type == Allocations.LINE_TYPE_ALLOCATION:
+            statistics["allocations_accepted"] += 1
+        elif line_type == Allocations.LINE_TYPE_TIMELINE:
+            statistics["timelines_accepted"] += 1
+        elif line_type == Allocations.LINE_TYPE_INVALID:
+            # error codes are prefixed with the kind of line that was rejected.
+            statistics["{:s}s_rejected".format( error_code.split( "-" )[0] )] += 1
+        else:
+            statistics["ignored_lines"] += 1
+
+    def _parse_lines( self, lines, allocations_source, first_line_number, current_year, previous_month_date=None,
+                      owner=None ):
+        """
+        Parses a sequence of lines and merges their allocations into the existing
+        allocations.  Allocations seen before the first date line are errors, so
+        callers parsing a portion of a larger source should start on a date line.
+
+        When a year is supplied, a date that precedes the previous date and is
+        valid in the following year rolls the year over (e.g. 12/31 followed by
+        1/1).  Each day is recorded with its ordinal so that it can be sorted and
+        compared without reparsing.
+
+        Takes 6 arguments:
+
+          lines               - Sequence of lines to parse.
+          allocations_source  - String specifying the source of lines.
+          first_line_number   - Line number of lines[0] within allocations_source.
+          current_year        - Integer specifying the year to validate dates with, or
+                                None.  See _is_valid_date() for details.
+          previous_month_date - Optional (month, date) pair of the date preceding
+                                lines, used to detect a year rollover at the first
+                                date of lines.  If omitted, defaults to None and
+                                the first date never rolls over.
+          owner               - Optional owner of the allocations in lines, used to
+                                detect days recorded more than once.  If omitted,
+                                defaults to None.
+
+        Returns 2 values:
+
+          current_year        - Integer specifying the year of the last date parsed,
+                                or None if current_year was None.
+          previous_month_date - (month, date) pair of the last date parsed, or None
+                                if no dates were parsed or current_year was None.
+
+        """
+
+        if self._read_only:
+            raise ValueError( "Snapshots cannot be modified" )
+
+        current_line_number = first_line_number - 1
+        current_date        = None
+
+        # every day of a year shares a single partition key.  see _partitions().
+        day_partition = (current_year, owner)
+
+        statistics = self._statistics
+        if statistics is not None:
+            parse_start_time = time.perf_counter()
+
+        try:
+            # walk through line-by-line and parse the allocations from cleaned up
+            # lines.
+            for raw_line in lines:
+
+                current_line_number += 1
+
+                line_type, current_line, error_code, error_string = Allocations._classify_line( raw_line,
+                                                                                                current_year,
+                                                                                                statistics,
+                                                                                                self._max_line_length )
+
+                # dates that precede the previous date, and would be rejected in the
+                # current year, belong to the next year if they're valid there.
+                # the date is validated before its month and date are compared since
+                # rejected lines may not have a numeric month and date.
+                if (previous_month_date is not None and
+                    (line_type == Allocations.LINE_TYPE_DATE or
+                     error_code == Allocations.ERROR_DATE_INVALID or
+                     error_code == Allocations.ERROR_DATE_WEEKDAY) and
+                    Allocations._is_valid_date( current_line, current_year + 1 )[0] and
+                    Allocations._date_month_date( current_line ) < previous_month_date):
+                    current_year                         += 1
+                    line_type, error_code, error_string   = Allocations.LINE_TYPE_DATE, None, ""
+
+                if statistics is not None:
+                    Allocations._count_line( statistics, raw_line, line_type, error_code )
+
+                # are we looking at the start of a new day?
+                if line_type == Allocations.LINE_TYPE_DATE:
+                    if current_date is not None:
+                        self._close_day()
+
+                    weekday, current_date = current_line.split()
+
+                    # days without a year have an unknown ordinal.
+                    if current_year is None:
+                        day_ordinal = 0
+                    else:
+                        previous_month_date = Allocations._date_month_date( current_line )
+                        day_ordinal         = Allocations._weekday_table( current_year )[previous_month_date][1]
+
+                    if self._duplicate_days is not None:
+                        self._index_day( (owner, current_date, day_ordinal),
+                                         allocations_source,
+                                         current_line_number,
+                                         current_line,
+                                         raw_line )
+
+                    if day_partition[0] != current_year:
+                        day_partition = (current_year, owner)
+
+                    self._days.append( current_date )
+                    self._day_ordinals.append( day_ordinal )
+                    self._day_starts.append( len( self._allocations ) )
+                    self._day_partitions.append( day_partition )
+                elif line_type == Allocations.LINE_TYPE_ALLOCATION:
+                    try:
+                        if statistics is None:
+                            self._record_allocation( current_date, current_line )
+                        else:
+                            record_start_time = time.perf_counter()
+                            self._record_allocation( current_date, current_line )
+                            statistics["record_allocation_seconds"] += time.perf_counter() - record_start_time
+                    except ValueError as e:
+                        if statistics is not None:
+                            statistics["allocations_accepted"] -= 1
+                            statistics["allocations_rejected"] += 1
+
+                        # allocations are rejected when there isn't a date to
+                        # record them on or when their duration rounds to zero.
+                        if current_date is None:
+                            record_error_code = Allocations.ERROR_ALLOCATION_UNDATED
+                        else:
+                            record_error_code = Allocations.ERROR_ALLOCATION_DURATION
+
+                        self._raise_parse_error( allocations_source,
+                                                 current_line_number,
+                                                 record_error_code,
+                                                 str( e ),
+                                                 current_line,
+                                                 raw_line )
+                elif line_type == Allocations.LINE_TYPE_TIMELINE:
+                    # timelines are notes about the allocations that follow, so
+                    # those without a date are ignored rather than complained about.
+                    if current_date is not None:
+                        self._record_timeline( current_line )
+                elif line_type == Allocations.LINE_TYPE_INVALID:
                     self._raise_parse_error( allocations_source,
                                              current_line_number,
-                                             str( e ),
-                                             current_line )
+                                             error_code,
+                                             error_string,
+                                             current_line,
+                                             raw_line )
+
+                # empty lines, and lines that didn't look like either a date or an
+                # allocation, are skipped.
+        except BaseException:
+            # hash the day being parsed when parsing stops early (e.g. strict
+            # parsing raised) so every day has a hash.
+            if len( self._day_hashes ) < len( self._days ):
+                self._close_day()
+
+            raise
+
+        if current_date is not None:
+            self._close_day()
+
+        if len( self._dropped_days ) > 0:
+            self._drop_days()
+
+        if statistics is not None:
+            source_statistics             = self._source_statistics.setdefault( allocations_source,
+                                                                                {"lines": 0, "seconds": 0.0} )
+            source_statistics["lines"]   += current_line_number - first_line_number + 1
+            source_statistics["seconds"] += time.perf_counter() - parse_start_time
+
+        self._publish()
+
+        return (current_year, previous_month_date)
+
+    @classmethod
+    async def aload( cls, file_names, configuration=None, executor=None, chunk_size=None ):
+        """
+        Asynchronously parses one or more files into a new Allocations object
+        without blocking the event loop.  Files are read concurrently in an executor
+        and then parsed, in order, one day-aligned chunk at a time in the executor.
+        Control is returned to the event loop between chunks.
+
+        Takes 4 arguments:
+
+          file_names    - List of file names to parse.
+          configuration - Optional AllocationsConfig to parse with.  If omitted,
+                          defaults to AllocationsConfig.defaults().
+          executor      - Optional concurrent.futures.Executor to read and parse
+                          with.  If omitted, defaults to None and the event loop's
+                          default executor is used.
+          chunk_size    - Optional positive integer specifying the minimum number of
+                          lines parsed per chunk.  If omitted, defaults to
+                          Allocations.ASYNC_CHUNK_SIZE.
+
+        Returns 1 value:
+
+          allocations - Allocations object containing the files' allocations.
+
+        """
+
+        import asyncio
+
+        allocations = cls( configuration=configuration )
+
+        if chunk_size is None:
+            chunk_size = Allocations.ASYNC_CHUNK_SIZE
+
+        loop = asyncio.get_running_loop()
+
+        # read everything up front so slow storage for one file doesn't
+        # serialize reading the others.
+        files_chunks = await asyncio.gather( *[loop.run_in_executor( executor,
+                                                                     Allocations._read_day_chunks,
+                                                                     file_name,
+                                                                     chunk_size )
+                                               for file_name in file_names] )
+
+        for file_name, file_chunks in zip( file_names, files_chunks ):
+            # each file starts in the configured year and rolls over as its
+            # chunks are parsed.
+            current_year        = allocations._current_year
+            previous_month_date = None
+
+            for first_line_number, lines in file_chunks:
+                current_year, previous_month_date = await loop.run_in_executor( executor,
+                                                                                allocations._parse_lines,
+                                                                                lines,
+                                                                                file_name,
+                                                                                first_line_number,
+                                                                                current_year,
+                                                                                previous_month_date )
+
+        return allocations
+
+    @classmethod
+    def stream( cls, file_like, configuration=None, chunk_size=None ):
+        """
+        Incrementally parses allocations, yielding them one day-aligned chunk at a
+        time so that the allocations of large archives can be processed without
+        holding all of them in memory.  Years roll over between chunks as they do
+        within them.
+
+        Errors are recorded per chunk, so bounds on the number of errors (e.g.
+        max_errors) apply to each chunk rather than to file_like as a whole.
+
+        Takes 3 arguments:
+
+          file_like     - String or iterable of lines (e.g. a file object) to parse.
+          configuration - Optional AllocationsConfig to parse with.  If omitted,
+                          defaults to AllocationsConfig.defaults().
+          chunk_size    - Optional positive integer specifying the minimum number of
+                          lines parsed per chunk.  If omitted, defaults to
+                          Allocations.ASYNC_CHUNK_SIZE.
+
+        Returns 1 value:
+
+          chunks - Iterator of Allocations objects, one per chunk, in the order
+                   they were parsed.
+
+        """
+
+        if chunk_size is None:
+            chunk_size = Allocations.ASYNC_CHUNK_SIZE
+
+        if isinstance( file_like, str ):
+            allocations_source = STRING_INPUT_LABEL
+            file_like          = file_like.splitlines()
+        else:
+            allocations_source = getattr( file_like, "name", "(unknown)" )
+
+        chunk               = cls( configuration=configuration )
+        current_year        = chunk._current_year
+        previous_month_date = None
+
+        lines             = []
+        first_line_number = 1
+
+        for line in file_like:
+            # start a new chunk at the first date after the current one is full.
+            if (len( lines ) >= chunk_size and
+                Allocations._is_valid_date( Allocations._clean_line( line ) )[0]):
+                current_year, previous_month_date = chunk._parse_lines( lines,
+                                                                        allocations_source,
+                                                                        first_line_number,
+                                                                        current_year,
+                                                                        previous_month_date )
+                yield chunk
+
+                chunk              = cls( configuration=configuration )
+                first_line_number += len( lines )
+                lines              = []
+
+            lines.append( line )
+
+        if len( lines ) > 0:
+            chunk._parse_lines( lines,
+                                allocations_source,
+                                first_line_number,
+                                current_year,
+                                previous_month_date )
+            yield chunk
+
+    @classmethod
+    def from_shared_memory( cls, name, configuration=None ):
+        """
+        Attaches to allocations published with to_shared_memory(), e.g. from a
+        worker process.  The numeric columns are used in place and records are built
+        from the day and category tables as they're read, so attaching doesn't copy
+        the allocations.  The shared memory must outlive the returned object.
+
+        Takes 2 arguments:
+
+          name          - Name of the shared memory block to attach to.
+          configuration - Optional AllocationsConfig to read with.  Only affects how
+                          category filters are normalized; durations are read as
+                          they were published.  If omitted, defaults to
+                          AllocationsConfig.defaults().
+
+        Returns 1 value:
+
+          allocations - Read-only Allocations object.  See snapshot().
+
+        """
+
+        import json
+        from multiprocessing import shared_memory
+
+        # attaching shouldn't make this process responsible for the block.  the
+        # track parameter is only available in Python 3.13 and newer.
+        try:
+            shared_block = shared_memory.SharedMemory( name=name, track=False )
+        except TypeError:
+            shared_block = shared_memory.SharedMemory( name=name )
+
+        shared_buffer = shared_block.buf.toreadonly()
+
+        header_offset = int.from_bytes( shared_buffer[:8], "little" )
+        header_length = int.from_bytes( shared_buffer[8:16], "little" )
+        header        = json.loads( bytes( shared_buffer[header_offset:header_offset + header_length] ).decode( "utf-8" ) )
+
+        columns = {column_name: shared_buffer[offset:offset + length * array.array( typecode ).itemsize].cast( typecode )
+                   for column_name, (offset, typecode, length) in header["columns"].items()}
+
+        allocations = cls( configuration=configuration )
+
+        # durations must be interpreted the way they were stored.
+        allocations._duration_scale = header["duration_scale"]
+
+        categories_table = [tuple( map( sys.intern, categories ) ) for categories in header["categories"]]
+        partitions_table = [tuple( partition_key ) for partition_key in header["partitions"]]
+
+        allocations._days            = header["days"]
+        allocations._allocations     = _SharedRecords( allocations._days,
+                                                       categories_table,
+                                                       columns["category_codes"],
+                                                       columns["allocation_days"] )
+        allocations._day_partitions  = [partitions_table[partition_code] for partition_code in columns["day_partitions"]]
+        allocations._errors          = [ParseError( *error[:-1], span=None if error[-1] is None else tuple( error[-1] ) )
+                                        for error in header["errors"]]
+        allocations._number_errors   = header["number_errors"]
+
+        for column_name in ["durations",
+                            "allocation_days",
+                            "day_ordinals",
+                            "day_starts",
+                            "day_hashes",
+                            "timeline_days",
+                            "timeline_starts",
+                            "timeline_ends"]:
+            setattr( allocations, "_" + column_name, columns[column_name] )
+
+        # keep the block mapped for as long as its columns are in use.
+        allocations._shared_block = shared_block
+        allocations._read_only    = True
+        allocations._publish()
+
+        return allocations
+
+    def add_records( self, dates, category_paths, durations, owner=None, source=STRING_INPUT_LABEL,
+                     first_line_number=1 ):
+        """
+        Merges allocations from another source, e.g. a time tracker's export, into
+        the existing allocations without going through the text format.  Records
+        are validated in bulk: each must have a date, non-empty categories, and a
+        positive duration.  Invalid records are skipped and raised or recorded like
+        invalid lines are when parsing, with the record's position in place of a
+        line number.
+
+        Records are grouped into days by date, in chronological order, and records
+        on the same date keep their relative order.  Each date becomes a single day
+        that is subject to AllocationsConfig's duplicate_days policy like a day
+        that was parsed.
+
+        Takes 6 arguments:
+
+          dates             - Sequence of datetime.date's, one per record.
+          category_paths    - Sequence of sequences of nested categories, outermost
+                              first, one per record.  A single string is a
+                              top-level category.  Categories must be strings and
+                              are stripped of surrounding whitespace and normalized
+                              like those parsed.
+          durations         - Sequence of durations in hours, one per record.
+                              Either numbers or strings in the text format, e.g.
+                              "1.5".
+          owner             - Optional owner of the records.  See parse().  If
+                              omitted, defaults to None.
+          source            - Optional string specifying the source of the records,
+                              used when reporting errors.  If omitted, defaults to
+                              STRING_INPUT_LABEL.
+          first_line_number - Optional line number reported for the first record.
+                              Subsequent records are numbered consecutively.  If
+                              omitted, defaults to 1.
+
+        Returns 1 value:
+
+          status - Boolean indicating whether every record was added without errors.
+
+        """
+
+        if self._read_only:
+            raise ValueError( "Snapshots cannot be modified" )
+
+        if not (len( dates ) == len( category_paths ) == len( durations )):
+            raise ValueError( "Records must have the same number of dates, categories, and durations "
+                              "({:d}, {:d}, {:d})".format( len( dates ), len( category_paths ), len( durations ) ) )
+
+        previous_error_count = self._number_errors
+        statistics           = self._statistics
+
+        def format_record( date, category_path, duration_hours ):
+            # render invalid records like an allocation so errors can quote them.
+            if isinstance( category_path, tuple ):
+                categories_string = " (".join( map( str, category_path ) ) + ")" * (len( category_path ) - 1)
+            else:
+                categories_string = str( category_path )
+
+            return "{!s} {:s}: {!s} hours".format( date, categories_string, duration_hours )
+
+        # validate the records and group them by day.  the categories of each
+        # distinct path are only validated and normalized once.
+        category_cache = {}
+        day_records    = {}
+
+        # index of the first record on each day so that the day is reported at
+        # that record when it duplicates a day already recorded.
+        day_record_indices = {}
+
+        for record_index, (date, category_path, duration_hours) in enumerate( zip( dates, category_paths, durations ) ):
+            # a lone string is a single category rather than a sequence of
+            # characters.  paths that aren't sequences are reported below.
+            if isinstance( category_path, str ):
+                category_path = (category_path,)
+            elif not isinstance( category_path, tuple ):
+                try:
+                    category_path = tuple( category_path )
+                except TypeError:
+                    pass
+
+            # paths with unhashable categories are validated without the cache.
+            try:
+                categories, category_error = category_cache.get( category_path, (False, None) )
+            except TypeError:
+                categories, category_error = (False, None)
+
+            if categories is False:
+                categories = None
+
+                if not isinstance( category_path, tuple ):
+                    category_error = "Allocation categories are not a sequence"
+                elif not all( isinstance( category, str ) for category in category_path ):
+                    category_error = "Allocation has a category that is not a string"
+                else:
+                    stripped_categories = tuple( category.strip() for category in category_path )
+
+                    if len( stripped_categories ) == 0 or not all( stripped_categories ):
+                        category_error = "Allocation has an empty category"
+                    else:
+                        categories = self._intern_categories( stripped_categories )
+
+                try:
+                    category_cache[category_path] = (categories, category_error)
+                except TypeError:
+                    pass
+
+            # durations are stored like those parsed.
+            if isinstance( duration_hours, str ):
+                if Allocations.valid_duration_pattern.match( duration_hours ):
+                    if self._duration_scale is None:
+                        duration = float( duration_hours )
+                    else:
+                        duration = Allocations._fixed_point_duration( duration_hours, self._duration_scale )
+                else:
+                    duration = None
+            elif (isinstance( duration_hours, (int, float) ) and not isinstance( duration_hours, bool ) and
+                  0 < duration_hours < float( "inf" )):
+                if self._duration_scale is None:
+                    duration = float( duration_hours )
+                else:
+                    duration = int( duration_hours * self._duration_scale + 0.5 )
+            else:
+                duration = None
+
+            if not isinstance( date, datetime.date ):
+                error_code, error_string = Allocations.ERROR_DATE_MALFORMED, "Date is not well formed"
+            elif categories is None:
+                error_code, error_string = Allocations.ERROR_ALLOCATION_CATEGORY, category_error
+            elif duration is None:
+                error_code, error_string = Allocations.ERROR_ALLOCATION_DURATION, "Allocation has invalid duration"
+            elif duration == 0 and self._duration_scale is None:
+                # positive durations can underflow floating point.
+                error_code, error_string = Allocations.ERROR_ALLOCATION_DURATION, "Allocation duration rounds to zero"
+            elif duration == 0:
+                # positive durations can still round to zero fixed point units.
+                error_code, error_string = (Allocations.ERROR_ALLOCATION_DURATION,
+                                            "Allocation duration rounds to zero ({:d} units per hour)".format(
+                                                self._duration_scale ))
+            else:
+                day_records.setdefault( date.toordinal(), [] ).append( (categories, duration) )
+                day_record_indices.setdefault( date.toordinal(), record_index )
+                continue
+
+            if statistics is not None:
+                statistics["allocations_rejected"] += 1
+
+            record_string = format_record( date, category_path, duration_hours )
+            self._raise_parse_error( source,
+                                     first_line_number + record_index,
+                                     error_code,
+                                     error_string,
+                                     record_string,
+                                     record_string )
+
+        # append each day to the store as if it had been parsed.
+        for day_ordinal in sorted( day_records ):
+            date        = datetime.date.fromordinal( day_ordinal )
+            date_string = "{:d}/{:d}".format( date.month, date.day )
+            records     = day_records[day_ordinal]
+
+            if self._duplicate_days is not None:
+                date_line = "{:s} {:s}".format( Allocations.WEEKDAYS[date.weekday()], date_string )
+
+                self._index_day( (owner, date_string, day_ordinal),
+                                 source,
+                                 first_line_number + day_record_indices[day_ordinal],
+                                 date_line,
+                                 date_line )
+
+            day_index = len( self._days )
+
+            self._days.append( date_string )
+            self._day_ordinals.append( day_ordinal )
+            self._day_starts.append( len( self._allocations ) )
+            self._day_partitions.append( (date.year, owner) )
+
+            self._allocations.extend( (date_string, categories) for (categories, _) in records )
+            self._durations.extend( duration for (_, duration) in records )
+            self._allocation_days.extend( [day_index] * len( records ) )
+
+            self._close_day()
+
+            if statistics is not None:
+                statistics["dates_accepted"]       += 1
+                statistics["allocations_accepted"] += len( records )
+
+        if len( self._dropped_days ) > 0:
+            self._drop_days()
+
+        self._publish()
+
+        return (self._number_errors == previous_error_count)
+
+    def category_day_matrix( self, max_depth=1, categories=None, owners=None, start=None, end=None ):
+        """
+        Totals the hours allocated to each category on each day as a sparse matrix,
+        with a row per category and a column per day.  Only the non-zero entries are
+        built, directly from the parsed allocations, so the matrix's size is
+        proportional to the number of distinct (category, day) pairs rather than to
+        the number of categories times the number of days.  Days recorded for
+        several owners share a column.  Days without a year are excluded.
+
+        Takes 5 arguments:
+
+          max_depth  - Optional positive integer specifying the deepest category
+                       level to total.  See summarize().  If omitted, defaults
+                       to 1.
+          categories - Optional tuple of nested categories to restrict the matrix
+                       to.  See summarize().  If omitted, defaults to None and all
+                       categories are included.
+          owners     - Optional collection of owners to restrict the matrix to.
+                       See parse().  If omitted, defaults to None and all owners
+                       are included.
+          start      - Optional datetime.date of the first day to include.  If
+                       omitted, defaults to None and the range is unbounded at the
+                       start.
+          end        - Optional datetime.date of the last day to include.  If
+                       omitted, defaults to None and the range is unbounded at the
+                       end.
+
+        Returns 1 value:
+
+          matrix - CategoryDayMatrix namedtuple with the following members:
+
+                     rows         - array of each entry's row.
+                     columns      - array of each entry's column.
+                     hours        - array of the hours allocated for each entry.
+                     categories   - List of category tuples labeling each row, in
+                                    sorted order.
+                     day_ordinals - array of the proleptic Gregorian ordinals
+                                    labeling each column, in increasing order.
+
+                   Entries are ordered by row and then column.  See to_sparse()
+                   to build a SciPy sparse matrix.
+
+        """
+
+        if categories is None:
+            categories = ()
+        elif self._normalize_categories:
+            categories = tuple( map( self._normalize_category, categories ) )
+
+        number_categories = len( categories )
+
+        # days without a year can't be placed in a column so the partitions
+        # holding them are always skipped.
+        start_ordinal = 1 if start is None else start.toordinal()
+        end_ordinal   = None if end is None else end.toordinal()
+
+        # total each entry in the units durations are stored in, keyed by the
+        # row's code and the day's ordinal.  rows are coded as they're seen and
+        # each distinct category is mapped to its row's code once, or to -1 when
+        # it's excluded.
+        row_codes      = {}
+        category_codes = {}
+        totals         = {}
+
+        for (range_start, range_end, check_dates) in self._partition_ranges( owners, start_ordinal, end_ordinal, categories ):
+            for ((_, allocation_categories), duration, day_index) in zip( self._allocations[range_start:range_end],
+                                                                           self._durations[range_start:range_end],
+                                                                           self._allocation_days[range_start:range_end] ):
+                category_code = category_codes.get( allocation_categories )
+                if category_code is None:
+                    if allocation_categories[:number_categories] == categories:
+                        category_code = row_codes.setdefault( allocation_categories[:max_depth],
+                                                              len( row_codes ) )
+                    else:
+                        category_code = -1
+
+                    category_codes[allocation_categories] = category_code
+
+                if category_code < 0:
+                    continue
+
+                day_ordinal = self._day_ordinals[day_index]
+                if check_dates:
+                    if ((day_ordinal < start_ordinal) or
+                        (end_ordinal is not None and day_ordinal > end_ordinal)):
+                        continue
+
+                entry_key         = (category_code, day_ordinal)
+                totals[entry_key] = totals.get( entry_key, 0 ) + duration
+
+        # renumber the rows so they're in sorted order.
+        row_categories = sorted( row_codes )
+        row_indices    = [0] * len( row_categories )
+        for row_index, row_category in enumerate( row_categories ):
+            row_indices[row_codes[row_category]] = row_index
+
+        day_ordinals   = array.array( "l", sorted( set( day_ordinal for (_, day_ordinal) in totals ) ) )
+        column_indices = {day_ordinal: column_index for column_index, day_ordinal in enumerate( day_ordinals )}
+
+        if self._duration_scale is None:
+            duration_scale = 1
+        else:
+            duration_scale = self._duration_scale
+
+        entries = sorted( (row_indices[category_code], column_indices[day_ordinal], total)
+                          for (category_code, day_ordinal), total in totals.items() )
+
+        return CategoryDayMatrix( array.array( "L", [row for (row, _, _) in entries] ),
+                                  array.array( "L", [column for (_, column, _) in entries] ),
+                                  array.array( "d", [total / duration_scale for (_, _, total) in entries] ),
+                                  row_categories,
+                                  day_ordinals )
+
+    def clear( self ):
+        """
+        Clears existing allocations.  All known categories and their allocations are
+        wiped out so that the allocations from the next call to parse() are the only
+        allocations available.
+
+        Takes no arguments.
+
+        Returns nothing.
+
+        """
+
+        if self._read_only:
+            raise ValueError( "Snapshots cannot be modified" )
+
+        # XXX:
+        self._allocations   = []
+        self._number_errors = 0
+
+        # durations of each allocation, in the same order as the allocations.
+        if self._duration_scale is None:
+            self._durations = array.array( "d" )
+        else:
+            self._durations = array.array( "q" )
+
+        # errors recorded while parsing non-strictly along with the codes
+        # recorded so errors can be deduplicated.
+        self._errors      = []
+        self._error_codes = set()
+
+        # parsing statistics, if requested, along with the lines parsed and time
+        # spent parsing each source.
+        if self._collect_statistics:
+            self._statistics = dict.fromkeys( Allocations.STATISTICS_NAMES, 0 )
+        else:
+            self._statistics = None
+        self._source_statistics = {}
+
+        # dates of each day parsed, in the order they were parsed, along with the
+        # index of the day each allocation was recorded under.  each day's
+        # ordinal is recorded when its year is known and is 0 otherwise.
+        self._days            = []
+        self._day_ordinals    = array.array( "l" )
+        self._allocation_days = array.array( "L" )
+
+        # index of each day's first allocation and the hash of each day's
+        # allocations.  see _close_day().
+        self._day_starts = array.array( "L" )
+        self._day_hashes = array.array( "q" )
+
+        # (year, owner) partition of each day along with the partition index
+        # built from them on demand.  see _partitions().
+        self._day_partitions  = []
+        self._partition_index = None
+
+        # map from (owner, date, ordinal) to the index of the day kept for it, and
+        # the indices of days dropped by the duplicate days policy that are yet
+        # to be removed.  only maintained when duplicate days are handled.
+        self._day_indices  = {}
+        self._dropped_days = set()
+
+        # timeline ranges, in minutes since midnight, and the index of the day
+        # each was recorded under.
+        self._timeline_days   = array.array( "L" )
+        self._timeline_starts = array.array( "H" )
+        self._timeline_ends   = array.array( "H" )
+
+        self._publish()
+
+    def daily_totals( self, start, end, owners=None, minimum_hours=None, maximum_hours=None,
+                      target_hours=8.0, workdays=None ):
+        """
+        Totals the hours allocated to each day in a span of dates and reports the
+        workdays that are missing, the days allocated too few or too many hours, and
+        the utilization of each week against a target.  Totals are dense so every
+        day in the span has one, whether or not it was recorded.  Days without a
+        year are excluded.
+
+        Takes 7 arguments:
+
+          start         - datetime.date of the first day to total.
+          end           - datetime.date of the last day to total.  Must not precede
+                          start.
+          owners        - Optional collection of owners to total.  See parse().  If
+                          omitted, defaults to None and all owners are totaled.
+          minimum_hours - Optional number of hours that recorded workdays must be
+                          allocated at least.  If omitted, defaults to None and
+                          no days are under.
+          maximum_hours - Optional number of hours that recorded days must be
+                          allocated at most.  If omitted, defaults to None and
+                          no days are over.
+          target_hours  - Optional number of hours expected per workday, used to
+                          compute utilization.  If omitted, defaults to 8.0.
+          workdays      - Optional collection of weekday names, from WEEKDAYS, that
+                          are expected to be recorded.  If omitted, defaults to
+                          None and Monday through Friday are workdays.
+
+        Returns 1 value:
+
+          daily_totals - DailyTotals namedtuple with the following members:
+
+                           start              - datetime.date of the first day.
+                           hours              - array of hours allocated to each
+                                                day from start through end.
+                           missing_days       - array of the offsets of the
+                                                workdays that weren't recorded.
+                           under_days         - array of the offsets of the
+                                                recorded workdays allocated fewer
+                                                than minimum_hours.
+                           over_days          - array of the offsets of the
+                                                recorded days allocated more than
+                                                maximum_hours.
+                           weekly_utilization - array of the hours allocated in
+                                                each Monday through Sunday week
+                                                overlapping the span, divided by
+                                                target_hours for each of the
+                                                week's workdays within the span.
+                                                Weeks without workdays in the
+                                                span are NaN.
+
+        """
+
+        if workdays is None:
+            workdays = Allocations.WEEKDAYS[:5]
+
+        for weekday in workdays:
+            if weekday not in Allocations.WEEKDAYS:
+                raise ValueError( "Unknown workday ({:s})".format( weekday ) )
+
+        if end < start:
+            raise ValueError( "Span of dates ends before it starts ({:s} - {:s})".format(
+                str( start ), str( end ) ) )
+
+        start_ordinal = start.toordinal()
+        end_ordinal   = end.toordinal()
+        number_days   = end_ordinal - start_ordinal + 1
+
+        if self._duration_scale is None:
+            duration_scale = 1
+        else:
+            duration_scale = self._duration_scale
+
+        # total each day's allocations in place and scatter them into the span.
+        # only the partitions overlapping the span are visited.
+        totals   = array.array( "d", bytes( 8 * number_days ) )
+        recorded = bytearray( number_days )
+
+        for (_, owner), partition in self._partitions().items():
+            if owners is not None and owner not in owners:
                 continue
+            if (partition["first_ordinal"] == 0 or
+                partition["last_ordinal"] < start_ordinal or
+                partition["first_ordinal"] > end_ordinal):
+                continue
+
+            for first_day, end_day in partition["segments"]:
+                for day_index in range( first_day, end_day ):
+                    day_offset = self._day_ordinals[day_index] - start_ordinal
+                    if day_offset < 0 or day_offset >= number_days:
+                        continue
+
+                    day_start, day_end = self._day_record_range( day_index )
+
+                    totals[day_offset]  += sum( self._durations[day_start:day_end] ) / duration_scale
+                    recorded[day_offset] = 1
+
+        # weekday of each offset, with Monday as 0.
+        first_weekday = start.weekday()
+        is_workday    = [Allocations.WEEKDAYS[weekday] in workdays for weekday in range( 7 )]
+
+        missing_days = array.array( "L" )
+        under_days   = array.array( "L" )
+        over_days    = array.array( "L" )
+
+        # weeks start on Monday, so the first week may be partial.
+        number_weeks  = (first_weekday + number_days + 6) // 7
+        week_hours    = [0.0] * number_weeks
+        week_workdays = [0] * number_weeks
+
+        for day_offset in range( number_days ):
+            weekday    = (first_weekday + day_offset) % 7
+            week_index = (first_weekday + day_offset) // 7
+            hours      = totals[day_offset]
+
+            week_hours[week_index] += hours
+
+            if is_workday[weekday]:
+                week_workdays[week_index] += 1
+
+                if not recorded[day_offset]:
+                    missing_days.append( day_offset )
+                elif minimum_hours is not None and hours < minimum_hours:
+                    under_days.append( day_offset )
+
+            if recorded[day_offset] and maximum_hours is not None and hours > maximum_hours:
+                over_days.append( day_offset )
+
+        weekly_utilization = array.array( "d", [hours / (target_hours * workday_count) if workday_count > 0 else float( "nan" )
+                                                for hours, workday_count in zip( week_hours, week_workdays )] )
+
+        return DailyTotals( start,
+                            totals,
+                            missing_days,
+                            under_days,
+                            over_days,
+                            weekly_utilization )
+
+    def dates( self ):
+        """
+        Returns the dates of each day parsed, in the order they were parsed.
+
+        Takes no arguments.
+
+        Returns 1 value:
+
+          dates - List of (date string, date) pairs, one per day.  date string is
+                  the "<month>/<date>" string the day was recorded under and date
+                  is a datetime.date when the day's year is known, None otherwise.
+
+        """
+
+        return [(date_string, datetime.date.fromordinal( day_ordinal ) if day_ordinal > 0 else None)
+                for date_string, day_ordinal in zip( self._days, self._day_ordinals )]
+
+    def diff( self, other ):
+        """
+        Compares these allocations with another version of them, e.g. after old
+        entries were edited.  Days are compared by the hashes computed while
+        parsing, so only the records of days that differ are examined.  Both
+        versions should be parsed with the same configuration.
+
+        Days are matched by their date, and year when known.  Repeated dates are
+        matched in the order they appear.
+
+        Takes 1 argument:
+
+          other - Allocations object containing the new version of the allocations.
+
+        Returns 1 value:
+
+          diff - AllocationsDiff describing the days added, removed, and modified in
+                 other along with the records added and removed.  Records from added
+                 and removed days are included in added_records and removed_records,
+                 respectively.
+
+        """
+
+        def index_days( allocations ):
+            day_indices = {}
+            occurrences = {}
+
+            for day_index, day_key in enumerate( zip( allocations._days, allocations._day_ordinals ) ):
+                occurrence           = occurrences.get( day_key, 0 )
+                occurrences[day_key] = occurrence + 1
+
+                day_indices[day_key + (occurrence,)] = day_index
+
+            return day_indices
+
+        old_day_indices = index_days( self )
+        new_day_indices = index_days( other )
+
+        days_diff = AllocationsDiff( [], [], [], [], [] )
+
+        for day_key, old_day_index in old_day_indices.items():
+            new_day_index = new_day_indices.get( day_key )
+
+            if new_day_index is None:
+                days_diff.removed_days.append( day_key[0] )
+                days_diff.removed_records.extend( self._day_records( old_day_index ) )
+            elif self._day_hashes[old_day_index] != other._day_hashes[new_day_index]:
+                old_records = collections.Counter( self._day_records( old_day_index ) )
+                new_records = collections.Counter( other._day_records( new_day_index ) )
+
+                days_diff.modified_days.append( day_key[0] )
+                days_diff.added_records.extend( (new_records - old_records).elements() )
+                days_diff.removed_records.extend( (old_records - new_records).elements() )
+
+        for day_key, new_day_index in new_day_indices.items():
+            if day_key not in old_day_indices:
+                days_diff.added_days.append( day_key[0] )
+                days_diff.added_records.extend( other._day_records( new_day_index ) )
+
+        return days_diff
+
+    def errors( self ):
+        """
+        Returns the errors recorded while parsing non-strictly.
+
+        Takes no arguments.
+
+        Returns 1 value:
+
+          errors - List of ParseError's, in the order they were encountered.  This
+                   may be shorter than number_errors() when the number of errors
+                   recorded is bounded or errors are deduplicated.
+
+        """
+
+        return list( self._errors )
+
+    def get_configuration( self ):
+        """
+        """
+
+        return self._configuration
+
+    def memory_usage( self, deep=True ):
+        """
+        Estimates the memory used by the parsed allocations, broken down by what the
+        memory holds.  Objects shared between allocations (e.g. repeated category
+        strings) are only counted once.
+
+        Takes 1 argument:
+
+          deep - Optional flag specifying whether the objects referenced by each
+                 container (tuples, strings, and numbers) are counted.  If False,
+                 only the containers themselves are counted.  If omitted, defaults
+                 to True.
+
+        Returns 1 value:
+
+          usage - Dictionary mapping each of "records", "categories", "dates",
+                  "timelines", "errors", "statistics", "snapshot",
+                  "partition_index", "weekday_tables", and "total" to the number
+                  of bytes used.  "snapshot" is the memory used by the most
+                  recent snapshot while it is still in use, which views the
+                  allocations rather than copying them.  See snapshot().  "partition_index" is the cached index of the
+                  partitions, if one was built.  See partitions().
+                  "weekday_tables" are the tables used to validate dates, which
+                  are shared by every Allocations object.  See _weekday_table().
+
+        """
+
+        seen_ids = set()
+
+        def size_of( value ):
+            # count each object once regardless of how many places refer to it.
+            if id( value ) in seen_ids:
+                return 0
+
+            seen_ids.add( id( value ) )
+
+            return sys.getsizeof( value )
+
+        usage = {"records":    (size_of( self._allocations ) +
+                                size_of( self._durations ) +
+                                size_of( self._allocation_days )),
+                 "categories": size_of( self._categories_cache ) + size_of( self._interned_categories ),
+                 "dates":      (size_of( self._days ) +
+                                size_of( self._day_ordinals ) +
+                                size_of( self._day_starts ) +
+                                size_of( self._day_hashes ) +
+                                size_of( self._day_partitions ) +
+                                size_of( self._day_indices )),
+                 "timelines":  (size_of( self._timeline_days ) +
+                                size_of( self._timeline_starts ) +
+                                size_of( self._timeline_ends )),
+                 "errors":     size_of( self._errors ) + size_of( self._error_codes ),
+                 "statistics": size_of( self._source_statistics )}
+
+        if self._statistics is not None:
+            usage["statistics"] += size_of( self._statistics )
+
+        # snapshots share the allocations, and the objects they refer to, so only
+        # the snapshot's views of them are counted.
+        snapshot          = None if self._snapshot is None else self._snapshot()
+        usage["snapshot"] = 0
+        if snapshot is not None and snapshot is not self:
+            usage["snapshot"] = sum( size_of( getattr( snapshot, name ) )
+                                     for name in Allocations.SNAPSHOT_ATTRIBUTES )
+
+        if deep:
+            for record in self._allocations:
+                date_string, categories = record
+
+                usage["records"]    += size_of( record )
+                usage["dates"]      += size_of( date_string )
+                usage["categories"] += size_of( categories ) + sum( map( size_of, categories ) )
+
+            usage["dates"] += sum( map( size_of, self._days ) )
+
+            for categories_string, categories in self._categories_cache.items():
+                usage["categories"] += (size_of( categories_string ) +
+                                        size_of( categories ) +
+                                        sum( map( size_of, categories ) ))
+
+            for error in self._errors:
+                usage["errors"] += sum( map( size_of, (error, error.source, error.message, error.span) ) )
+
+            for source, source_statistics in self._source_statistics.items():
+                usage["statistics"] += size_of( source ) + size_of( source_statistics )
+
+        # the caches are counted after the records so the category tuples they
+        # share are attributed to the records.
+        usage["partition_index"] = 0
+        if self._partition_index is not None:
+            partitions                = self._partition_index[2]
+            usage["partition_index"] += size_of( self._partition_index ) + size_of( partitions )
+
+            for partition_key, partition in partitions.items():
+                usage["partition_index"] += (size_of( partition ) +
+                                             size_of( partition["segments"] ) +
+                                             size_of( partition["categories"] ))
+
+                if deep:
+                    usage["partition_index"] += (size_of( partition_key ) +
+                                                 sum( map( size_of, partition["segments"] ) ) +
+                                                 sum( map( size_of, partition["categories"] ) ))
+
+        usage["weekday_tables"] = size_of( Allocations._weekday_tables )
+        for weekday_table in list( Allocations._weekday_tables.values() ):
+            usage["weekday_tables"] += size_of( weekday_table )
+
+            if deep:
+                for month_date, weekday_ordinal in weekday_table.items():
+                    usage["weekday_tables"] += (size_of( month_date ) +
+                                                size_of( weekday_ordinal ) +
+                                                size_of( weekday_ordinal[1] ))
+
+        usage["total"] = sum( usage.values() )
+
+        return usage
+
+    def number_errors( self ):
+        """
+        """
+
+        return self._number_errors
+
+    def parse( self, file_like, current_year=None, current_configuration=None, owner=None ):
+        # XXX: file_like is the wrong name since it ends up being a string
+        """
+        Parses a block of allocations and merges them into the existing allocations.
+        XXX: raises ValueError or complains depending upon the configuration.
+
+        Takes 4 arguments:
+
+          file_like             -
+          current_year          - XXX: Parse with a temporary year.
+          current_configuration - XXX: Parse with a temporary configuration.
+          owner                 - Optional owner of the allocations, e.g. the person
+                                  whose file is parsed.  Days are only considered
+                                  duplicates of days with the same owner.  See
+                                  AllocationsConfig's duplicate_days.  If omitted,
+                                  defaults to None.
+
+        Returns 1 value:
+
+          status -
+
+        """
+
+        if current_configuration is None:
+            current_configuration = self._configuration
+
+        # XXX: handle the current date being optional
+        if current_year is None:
+            current_year = self._current_year
+
+        # XXX: shouldn't be part of the instance
+        allocations_source  = "(string)"
+
+        # note the previous number of errors
+        previous_error_count = self.number_errors()
+
+        # read in all of the lines if we're working with a file-like object.  we
+        # assume this will never be used on truly large data (100's of thousands
+        # of lines) so we simply buffer the data and move on.
+        if not isinstance( file_like, str ):
+
+            # figure out where these allocations come from.
+            try:
+                allocations_source = file_like.name
+            except:
+                allocations_source = "(unknown)"
+
+            allocations_string = file_like.readlines()
+
+            file_like = allocations_string
+        else:
+            file_like = file_like.splitlines()
+
+        self._parse_lines( file_like, allocations_source, 1, current_year, owner=owner )
+
+        # parsing is successful if we didn't have any errors.
+        return (self.number_errors() == previous_error_count)
+
+    def partitions( self ):
+        """
+        Describes the partitions the parsed days are organized into.  Days are
+        partitioned by their year and owner.
+
+        Takes no arguments.
+
+        Returns 1 value:
+
+          partitions - Dictionary mapping (year, owner) to a (first date, last date,
+                       number of days, categories) tuple.  The dates are
+                       datetime.date's, or None when the year is unknown, and
+                       categories is a frozenset of the category tuples allocated
+                       to.  year is None when unknown and owner is None unless one
+                       was supplied to parse().
+
+        """
+
+        def to_date( day_ordinal ):
+            return datetime.date.fromordinal( day_ordinal ) if day_ordinal > 0 else None
+
+        return {partition_key: (to_date( partition["first_ordinal"] ),
+                                to_date( partition["last_ordinal"] ),
+                                sum( end_day - first_day for (first_day, end_day) in partition["segments"] ),
+                                frozenset( partition["categories"] ))
+                for partition_key, partition in self._partitions().items()}
+
+    def query( self ):
+        """
+        Starts a lazy query over the allocations.  Operations are recorded by the
+        returned AllocationsQuery and only evaluated, in a single pass, when its
+        results are requested.  See AllocationsQuery.
+
+        Takes no arguments.
+
+        Returns 1 value:
+
+          query - AllocationsQuery matching every allocation.
+
+        """
+
+        return AllocationsQuery( self )
+
+    def read_csv( self, file_like, owner=None, year=None ):
+        """
+        Merges allocations from a CSV into the existing allocations via
+        add_records().  The CSV must have a header naming its columns, as written
+        by write_csv():
+
+          level_NN - Nested categories, one column per level starting with
+                     "level_00".  Empty trailing levels are ignored.
+          datetime - ISO date of the allocation, "YYYY-MM-DD".  Empty when the
+                     year wasn't known.
+          date     - Date of the allocation, either "<month>/<date>" or an ISO
+                     date.  Used when the "datetime" column is missing or empty.
+          duration - Duration of the allocation in hours.
+
+        Other columns are ignored.  "<month>/<date>" dates are placed in year,
+        rolling over to the next year when a date precedes the one before it, like
+        dates are when parsing.  Rows are validated like add_records() does, with
+        errors reported against their line in the CSV.
+
+        Takes 3 arguments:
+
+          file_like - File-like object, or iterable of lines, to read the CSV from.
+          owner     - Optional owner of the allocations.  See parse().  If omitted,
+                      defaults to None.
+          year      - Optional year of the first "<month>/<date>" date.  If omitted,
+                      defaults to None and rows without an ISO date are rejected.
+
+        Returns 1 value:
+
+          status - Boolean indicating whether every row was added without errors.
+
+        """
+
+        import csv
+
+        try:
+            source = file_like.name
+        except AttributeError:
+            source = STRING_INPUT_LABEL
+
+        reader = csv.reader( file_like )
+        header = next( reader, None )
+        if header is None:
+            return True
+
+        datetime_index = header.index( "datetime" ) if "datetime" in header else None
+        date_index     = header.index( "date" ) if "date" in header else None
+
+        if datetime_index is None and date_index is None:
+            raise ValueError( "CSV does not have a date column ({:s})".format( source ) )
+
+        if "duration" not in header:
+            raise ValueError( "CSV does not have a duration column ({:s})".format( source ) )
+
+        duration_index = header.index( "duration" )
+        level_indices  = [column_index for (_, column_index) in
+                          sorted( (int( column_name[len( "level_" ):] ), column_index)
+                                  for column_index, column_name in enumerate( header )
+                                  if re.match( r"^level_\d+$", column_name ) )]
+
+        # convert each column once per distinct value.  dates that don't parse
+        # are passed through so add_records() reports them.
+        date_cache          = {}
+        current_year        = year
+        previous_month_date = None
+
+        def parse_date( date_string ):
+            nonlocal current_year, previous_month_date
+
+            month_date_match = re.match( r"^(\d{1,2})/(\d{1,2})$", date_string )
+            if month_date_match is None or current_year is None:
+                month_date = None
+                cache_key  = date_string
+            else:
+                month_date = (int( month_date_match.group( 1 ) ), int( month_date_match.group( 2 ) ))
+                if previous_month_date is not None and month_date < previous_month_date:
+                    current_year += 1
+                previous_month_date = month_date
+
+                cache_key = (date_string, current_year)
+
+            date = date_cache.get( cache_key )
+            if date is None:
+                try:
+                    if month_date is None:
+                        date = datetime.date.fromisoformat( date_string )
+                    else:
+                        date = datetime.date( current_year, *month_date )
+                except ValueError:
+                    date = date_string
+
+                date_cache[cache_key] = date
+
+            return date
+
+        dates          = []
+        category_paths = []
+        durations      = []
+
+        for row in reader:
+            # short rows are padded so missing values are reported as invalid.
+            if len( row ) < len( header ):
+                row = row + [""] * (len( header ) - len( row ))
+
+            category_path = tuple( row[level_index] for level_index in level_indices )
+            while len( category_path ) > 1 and category_path[-1] == "":
+                category_path = category_path[:-1]
+
+            if datetime_index is not None and row[datetime_index] != "":
+                date_string = row[datetime_index]
+            elif date_index is not None:
+                date_string = row[date_index]
+            else:
+                date_string = ""
+
+            dates.append( parse_date( date_string ) )
+            category_paths.append( category_path )
+            durations.append( row[duration_index].strip() )
+
+        # the header occupies the first line.
+        return self.add_records( dates,
+                                 category_paths,
+                                 durations,
+                                 owner=owner,
+                                 source=source,
+                                 first_line_number=2 )
+
+    def records( self ):
+        """
+        Iterates through the parsed allocations in the order they were parsed.
+
+        Takes no arguments.
+
+        Returns 1 value:
+
+          records - Iterator of (date, categories, duration) tuples.  date is the
+                    "<month>/<date>" string the allocation was recorded under,
+                    categories is a tuple of nested categories, and duration is
+                    the allocation's duration in hours.
+
+        """
+
+        if self._duration_scale is None:
+            return ((date_string, categories, duration)
+                    for ((date_string, categories), duration) in zip( self._allocations, self._durations ))
+
+        return ((date_string, categories, duration / self._duration_scale)
+                for ((date_string, categories), duration) in zip( self._allocations, self._durations ))
+
+    def set_configuration( self, new_configuration ):
+        """
+        """
+
+        self._configuration = new_configuration
+
+    def snapshot( self ):
+        """
+        Returns an immutable snapshot of the allocations as of the most recent
+        parse() or clear() to complete.  Snapshots may be taken, and read, while
+        another thread parses into this object without blocking it or seeing a
+        partially parsed source.  Methods that modify allocations raise ValueError
+        when called on a snapshot.
+
+        Snapshots view the published portion of the containers the allocations
+        are parsed into, which are only appended to, so taking one doesn't copy
+        the allocations.  Later snapshots of the same state are the same object
+        while any reader holds it.  Containers replaced after a snapshot is
+        taken (e.g. by clear()) are kept until the snapshot is released.  See
+        memory_usage().
+
+        Takes no arguments.
+
+        Returns 1 value:
+
+          snapshot - Allocations object with the published allocations.
+
+        """
+
+        # snapshots and allocations attached to shared memory never change.
+        if self._read_only:
+            return self
+
+        # a snapshot of the current publication can be shared by every reader.
+        snapshot = None if self._snapshot is None else self._snapshot()
+        if snapshot is not None and snapshot._version == self._published[-1]:
+            return snapshot
+
+        containers, number_errors, statistics, source_statistics, version = self._published
+
+        snapshot = object.__new__( Allocations )
+        snapshot.__dict__.update( self.__dict__ )
+
+        for name, (container, length) in zip( Allocations.SNAPSHOT_ATTRIBUTES, containers ):
+            setattr( snapshot, name, _PrefixView( container, length ) )
+
+        # the caches and indexes maintained while parsing keep changing, so
+        # snapshots don't share them.
+        snapshot._categories_cache    = {}
+        snapshot._interned_categories = {}
+        snapshot._error_codes         = set()
+        snapshot._day_indices         = {}
+        snapshot._dropped_days        = set()
+        snapshot._partition_index     = None
+
+        snapshot._number_errors     = number_errors
+        snapshot._statistics        = statistics
+        snapshot._source_statistics = source_statistics
+        snapshot._version           = version
+        snapshot._read_only         = True
+
+        # snapshots of the snapshot are itself.
+        snapshot._published = ([(getattr( snapshot, name ), len( getattr( snapshot, name ) ))
+                                for name in Allocations.SNAPSHOT_ATTRIBUTES],
+                               number_errors,
+                               statistics,
+                               source_statistics,
+                               version)
+        snapshot._snapshot  = None
+
+        self._snapshot = weakref.ref( snapshot )
+
+        return snapshot
+
+    def statistics( self ):
+        """
+        Returns the statistics collected while parsing.  Statistics are only collected
+        when requested via the configuration's collect_statistics flag and are reset
+        by clear().
+
+        Takes no arguments.
+
+        Returns 1 value:
+
+          statistics - Dictionary of statistics, or None if statistics weren't
+                       collected.  Contains a numeric value for each of the names in
+                       Allocations.STATISTICS_NAMES along with a "sources" dictionary
+                       mapping each source parsed to a dictionary with its "lines",
+                       "seconds", and "lines_per_second".
+
+        """
+
+        if self._statistics is None:
+            return None
+
+        statistics            = dict( self._statistics )
+        statistics["sources"] = {}
+
+        for source, source_statistics in self._source_statistics.items():
+            seconds = source_statistics["seconds"]
+
+            statistics["sources"][source] = {"lines": source_statistics["lines"],
+                                             "seconds": seconds,
+                                             "lines_per_second": (source_statistics["lines"] / seconds
+                                                                  if seconds > 0 else 0.0)}
+
+        return statistics
+
+    def summarize( self, max_depth=1, categories=None, dates=None, month=None, owners=None, start=None, end=None ):
+        """
+        Totals the hours allocated to each category.  Nested categories deeper than
+        a maximum depth are rolled up into their parent so that, for instance, a
+        maximum depth of 1 totals each top-level category.  A subset of allocations
+        may be summarized by restricting the category, date, month, owner, or range
+        of dates considered.  Restricting the categories, owners, or range of dates
+        skips the partitions of days that can't match without scanning them.  See
+        partitions().
+
+        Takes 7 arguments:
+
+          max_depth  - Optional positive integer specifying the deepest category level
+                       to total.  If omitted, defaults to 1.
+          categories - Optional tuple of nested categories to restrict the summary to.
+                       Only allocations within this category (or its sub-categories)
+                       are totaled.  The categories are normalized like those
+                       parsed.  If omitted, defaults to None and all categories
+                       are totaled.
+          dates      - Optional collection of "<month>/<date>" strings to restrict the
+                       summary to.  If omitted, defaults to None and all dates are
+                       totaled.
+          month      - Optional integer month, in [1, 12], to restrict the summary to.
+                       If omitted, defaults to None and all months are totaled.
+          owners     - Optional collection of owners to restrict the summary to.  See
+                       parse().  If omitted, defaults to None and all owners are
+                       totaled.
+          start      - Optional datetime.date of the first day to total.  Days
+                       without a year are excluded when a range of dates is
+                       requested.  If omitted, defaults to None and the range is
+                       unbounded at the start.
+          end        - Optional datetime.date of the last day to total.  If omitted,
+                       defaults to None and the range is unbounded at the end.
+
+        Returns 1 value:
+
+          totals - Dictionary mapping tuples of nested categories, at most max_depth
+                   long, to the total hours allocated to them.
+
+        """
+
+        if categories is None:
+            categories = ()
+        elif self._normalize_categories:
+            categories = tuple( map( self._normalize_category, categories ) )
+
+        if dates is not None:
+            dates = set( dates )
+
+        number_categories = len( categories )
+
+        start_ordinal = None if start is None else start.toordinal()
+        end_ordinal   = None if end is None else end.toordinal()
+
+        if owners is None and start is None and end is None and number_categories == 0:
+            ranges = [(0, len( self._allocations ), False)]
+        else:
+            ranges = self._partition_ranges( owners, start_ordinal, end_ordinal, categories )
+
+        # total in the units durations are stored in so fixed point durations
+        # are summed exactly.
+        totals = {}
+        for (range_start, range_end, check_dates) in ranges:
+            for ((date_string, allocation_categories), duration, day_index) in zip( self._allocations[range_start:range_end],
+                                                                                     self._durations[range_start:range_end],
+                                                                                     self._allocation_days[range_start:range_end] ):
+                if allocation_categories[:number_categories] != categories:
+                    continue
+                if dates is not None and date_string not in dates:
+                    continue
+                if month is not None and int( date_string.split( "/" )[0] ) != month:
+                    continue
+                if check_dates:
+                    day_ordinal = self._day_ordinals[day_index]
+
+                    if ((start_ordinal is not None and day_ordinal < start_ordinal) or
+                        (end_ordinal is not None and day_ordinal > end_ordinal)):
+                        continue
+
+                allocation_categories         = allocation_categories[:max_depth]
+                totals[allocation_categories] = totals.get( allocation_categories, 0 ) + duration
+
+        if self._duration_scale is None:
+            return totals
+
+        return {allocation_categories: total / self._duration_scale
+                for allocation_categories, total in totals.items()}
+
+    def summarize_batch( self, reports ):
+        """
+        Computes many summaries in a single pass over the allocations.  Each report
+        is described by the parameters summarize() accepts, optionally totaled per
+        window of time.  The reports are planned together: only the partitions
+        that at least one report may need are scanned, each day is matched against
+        every report once, and each distinct category is matched once per report,
+        so the cost of adding a report is small compared to a separate
+        summarize().
+
+        Takes 1 argument:
+
+          reports - List of dictionaries describing each report.  Each may contain
+                    the parameters of summarize() ("max_depth", "categories",
+                    "dates", "month", "owners", "start", and "end") along with
+                    "window", one of Allocations.WINDOW_MONTH,
+                    Allocations.WINDOW_QUARTER, or Allocations.WINDOW_YEAR, to
+                    total per window of time.  See top_categories() for the
+                    labels of each window.  Omitted parameters take their
+                    summarize() defaults and reports without a window are totaled
+                    over all time.
+
+        Returns 1 value:
+
+          results - List of results, one per report.  Reports without a window
+                    produce a dictionary like summarize() does while those with a
+                    window produce a dictionary mapping window labels to such
+                    dictionaries.
 
-            # neither the date nor the allocation are valid, so we need to
-            # determine if we silently ignore this line because it isn't
-            # something we would be expected to parse or if we need to complain
-            # and increment our error count.
-            if (date_status is not True) and Allocations._looks_like_date( current_line ):
-                self._raise_parse_error( allocations_source,
-                                         current_line_number,
-                                         date_error,
-                                         current_line )
-            elif (allocation_status is not True) and Allocations._looks_like_allocation( current_line ):
-                self._raise_parse_error( allocations_source,
-                                         current_line_number,
-                                         allocation_error,
-                                         current_line )
+        """
 
-            # this line didn't look like either a date or an allocation so we
-            # assume it wasn't something we should parse.  move on to the next
-            # line.
-            pass
+        report_parameters = set( ["max_depth", "categories", "dates", "month", "owners", "start", "end", "window"] )
+
+        # normalize each report's parameters once up front.
+        plans = []
+        for report in reports:
+            for parameter in report:
+                if parameter not in report_parameters:
+                    raise ValueError( "Unknown report parameter ({:s})".format( parameter ) )
+
+            window = report.get( "window" )
+            if window not in (None, Allocations.WINDOW_MONTH, Allocations.WINDOW_QUARTER, Allocations.WINDOW_YEAR):
+                raise ValueError( "Unknown window ({:s})".format( window ) )
+
+            categories = report.get( "categories" )
+            if categories is None:
+                categories = ()
+            elif self._normalize_categories:
+                categories = tuple( map( self._normalize_category, categories ) )
+
+            dates  = report.get( "dates" )
+            owners = report.get( "owners" )
+            start  = report.get( "start" )
+            end    = report.get( "end" )
+
+            plans.append( {"max_depth":     report.get( "max_depth", 1 ),
+                           "categories":    categories,
+                           "dates":         None if dates is None else set( dates ),
+                           "month":         report.get( "month" ),
+                           "owners":        None if owners is None else set( owners ),
+                           "start_ordinal": None if start is None else start.toordinal(),
+                           "end_ordinal":   None if end is None else end.toordinal(),
+                           "window":        window} )
+
+        # scan the union of the allocations every report may need.  ranges from
+        # different reports cover whole partition segments so they either
+        # coincide or don't overlap.
+        ranges = set()
+        for plan in plans:
+            if (plan["owners"] is None and plan["start_ordinal"] is None and
+                plan["end_ordinal"] is None and len( plan["categories"] ) == 0):
+                ranges = set( [(0, len( self._allocations ))] )
+                break
+
+            ranges.update( (range_start, range_end)
+                           for (range_start, range_end, _) in self._partition_ranges( plan["owners"],
+                                                                                      plan["start_ordinal"],
+                                                                                      plan["end_ordinal"],
+                                                                                      plan["categories"] ) )
+
+        def match_day( day_index ):
+            # returns (report index, window label) pairs for each report the day
+            # satisfies.
+            date_string = self._days[day_index]
+            day_ordinal = self._day_ordinals[day_index]
+            owner       = self._day_partitions[day_index][1]
+            month       = int( date_string.split( "/" )[0] )
+
+            matches = []
+            for report_index, plan in enumerate( plans ):
+                if plan["owners"] is not None and owner not in plan["owners"]:
+                    continue
+                if plan["dates"] is not None and date_string not in plan["dates"]:
+                    continue
+                if plan["month"] is not None and month != plan["month"]:
+                    continue
+                if plan["start_ordinal"] is not None or plan["end_ordinal"] is not None:
+                    if day_ordinal == 0:
+                        continue
+                    if plan["start_ordinal"] is not None and day_ordinal < plan["start_ordinal"]:
+                        continue
+                    if plan["end_ordinal"] is not None and day_ordinal > plan["end_ordinal"]:
+                        continue
+
+                if plan["window"] is None:
+                    label = None
+                else:
+                    label = Allocations._window_label( plan["window"], date_string, day_ordinal )
+
+                matches.append( (report_index, label) )
+
+            return matches
+
+        def match_categories( allocation_categories ):
+            # returns the key each report totals the categories under, or None
+            # if the report excludes them.
+            return [allocation_categories[:plan["max_depth"]]
+                    if allocation_categories[:len( plan["categories"] )] == plan["categories"] else None
+                    for plan in plans]
+
+        # totals per report, per window label.  reports without a window total
+        # under None.
+        totals        = [{} for _ in plans]
+        category_keys = {}
+        day_matches   = None
+        previous_day  = None
+
+        for (range_start, range_end) in sorted( ranges ):
+            for ((_, allocation_categories), duration, day_index) in zip( self._allocations[range_start:range_end],
+                                                                           self._durations[range_start:range_end],
+                                                                           self._allocation_days[range_start:range_end] ):
+                if day_index != previous_day:
+                    day_matches  = match_day( day_index )
+                    previous_day = day_index
+
+                if len( day_matches ) == 0:
+                    continue
+
+                keys = category_keys.get( allocation_categories )
+                if keys is None:
+                    keys                                 = match_categories( allocation_categories )
+                    category_keys[allocation_categories] = keys
+
+                for report_index, label in day_matches:
+                    key = keys[report_index]
+                    if key is None:
+                        continue
+
+                    window_totals = totals[report_index].get( label )
+                    if window_totals is None:
+                        window_totals               = {}
+                        totals[report_index][label] = window_totals
+
+                    window_totals[key] = window_totals.get( key, 0 ) + duration
+
+        results = []
+        for plan, report_totals in zip( plans, totals ):
+            if self._duration_scale is not None:
+                report_totals = {label: {key: total / self._duration_scale
+                                         for key, total in window_totals.items()}
+                                 for label, window_totals in report_totals.items()}
+
+            if plan["window"] is None:
+                results.append( report_totals.get( None, {} ) )
+            else:
+                results.append( report_totals )
+
+        return results
+
+    def timelines( self ):
+        """
+        Computes the time logged by each day's timelines.  Days with multiple
+        timelines have their ranges combined.  Open ranges are not counted.
 
-        # parsing is successful if we didn't have any errors.
-        return (self.number_errors() == previous_error_count)
+        Takes no arguments.
 
-    def set_configuration( self, new_configuration ):
+        Returns 1 value:
+
+          timelines - List of (date, starts, ends, logged hours) tuples, one per day
+                      with a timeline, in the order they were parsed.  starts and
+                      ends are arrays of each range's start and end in minutes
+                      since midnight.
+
+        """
+
+        # bucket each range by day so each day's arrays can be sliced out of the
+        # parsed ranges in bulk.  ranges are recorded in day order.
+        timelines     = []
+        range_start   = 0
+        number_ranges = len( self._timeline_days )
+
+        while range_start < number_ranges:
+            day_index = self._timeline_days[range_start]
+
+            range_end = range_start + 1
+            while range_end < number_ranges and self._timeline_days[range_end] == day_index:
+                range_end += 1
+
+            starts = self._timeline_starts[range_start:range_end]
+            ends   = self._timeline_ends[range_start:range_end]
+
+            timelines.append( (self._days[day_index],
+                               starts,
+                               ends,
+                               (sum( ends ) - sum( starts )) / 60.0) )
+
+            range_start = range_end
+
+        return timelines
+
+    def timeline_discrepancies( self, tolerance=0.0 ):
         """
+        Compares the time logged by each day's timelines against the time allocated
+        that day.
+
+        Takes 1 argument:
+
+          tolerance - Optional non-negative number of hours that logged and allocated
+                      time may differ by without being reported.  If omitted,
+                      defaults to 0.0 and all differences are reported.
+
+        Returns 1 value:
+
+          discrepancies - List of (date, logged hours, allocated hours) tuples, one
+                          per day with a timeline whose logged and allocated time
+                          differ by more than tolerance.
+
         """
 
-        self._configuration = new_configuration
+        # total the allocations and the timelines per day in one pass each.
+        allocated_minutes = [0.0] * len( self._days )
+        for day_index, duration in zip( self._allocation_days, self._durations ):
+            allocated_minutes[day_index] += duration * 60
+
+        if self._duration_scale is not None:
+            allocated_minutes = [minutes / self._duration_scale for minutes in allocated_minutes]
+
+        logged_minutes = {}
+        for day_index, start, end in zip( self._timeline_days,
+                                          self._timeline_starts,
+                                          self._timeline_ends ):
+            logged_minutes[day_index] = logged_minutes.get( day_index, 0 ) + end - start
+
+        discrepancies = []
+        for day_index in sorted( logged_minutes ):
+            logged_hours    = logged_minutes[day_index] / 60.0
+            allocated_hours = allocated_minutes[day_index] / 60.0
+
+            if abs( logged_hours - allocated_hours ) > tolerance:
+                discrepancies.append( (self._days[day_index],
+                                       logged_hours,
+                                       allocated_hours) )
+
+        return discrepancies
 
     def to_df( self, filters=None, filter_type=None, max_depth=-1 ):
         """
@@ -626,14 +3592,14 @@ class Allocations( object ):
         max_category_depth = max( map( lambda x: len( x[1] ), self._allocations ),
                                   default=0 )
 
-        date_duration_list = []
+        date_list          = []
         index_list         = []
         index_names_list   = list( map( lambda x: "level_{:02d}".format( x ),
                                         range( max_category_depth ) ) )
 
         # build the categories index. XXX
-        for (date_string, categories, duration) in self._allocations:
-            date_duration_list.append( (date_string, duration) )
+        for (date_string, categories) in self._allocations:
+            date_list.append( date_string )
 
             categories_list                    = [""] * max_category_depth
             categories_list[0:len(categories)] = categories
@@ -643,8 +3609,789 @@ class Allocations( object ):
         multi_index = pd.MultiIndex.from_tuples( index_list,
                                                  names=index_names_list )
 
-        df = pd.DataFrame.from_records( date_duration_list,
-                                        index=multi_index,
-                                        columns=["date", "duration"] )
+        # durations are only converted to hours here, when exported.
+        import numpy as np
+
+        durations = np.array( self._durations, dtype=np.float64 )
+        if self._duration_scale is not None:
+            durations /= self._duration_scale
+
+        df = pd.DataFrame( {"date": date_list,
+                            "duration": durations},
+                           index=multi_index )
+
+        # convert the day ordinals into datetime64's by offsetting them from
+        # the Unix epoch.  days whose year is unknown are NaT.
+        allocation_ordinals = np.array( self._day_ordinals, dtype=np.int64 )[np.array( self._allocation_days, dtype=np.intp )]
+        datetimes           = (allocation_ordinals - Allocations.EPOCH_ORDINAL).astype( "datetime64[D]" )
+        datetimes[allocation_ordinals == 0] = np.datetime64( "NaT" )
+
+        df["datetime"] = datetimes
 
         return df
+
+    def to_shared_memory( self, name=None ):
+        """
+        Publishes the allocations into a shared memory block so that other processes
+        can attach to them with from_shared_memory() rather than receiving a copy.
+        Records are stored as integer columns that index tables of the distinct
+        dates and categories.  Owners must be strings or None.
+
+        This should not be called while another thread parses into this object.
+        Publish a snapshot() instead.
+
+        Takes 1 argument:
+
+          name - Optional name for the shared memory block.  If omitted, defaults to
+                 None and a unique name is generated.
+
+        Returns 1 value:
+
+          shared_block - multiprocessing.shared_memory.SharedMemory containing the
+                         allocations.  Its name is passed to from_shared_memory().
+                         The caller is responsible for closing and unlinking it once
+                         every process has finished with it.
+
+        """
+
+        import json
+        from multiprocessing import shared_memory
+
+        # replace each record's categories with an index into a table of the
+        # distinct categories.
+        category_codes = {}
+        codes          = array.array( "L", [category_codes.setdefault( categories, len( category_codes ) )
+                                            for (_, categories) in self._allocations] )
+
+        partition_codes = {}
+        day_partitions  = array.array( "L", [partition_codes.setdefault( partition_key, len( partition_codes ) )
+                                             for partition_key in self._day_partitions] )
+
+        columns = [("category_codes",  codes),
+                   ("durations",       self._durations),
+                   ("allocation_days", self._allocation_days),
+                   ("day_ordinals",    self._day_ordinals),
+                   ("day_starts",      self._day_starts),
+                   ("day_hashes",      self._day_hashes),
+                   ("day_partitions",  day_partitions),
+                   ("timeline_days",   self._timeline_days),
+                   ("timeline_starts", self._timeline_starts),
+                   ("timeline_ends",   self._timeline_ends)]
+
+        # the columns come first, each aligned to 8 bytes, followed by a JSON
+        # header describing them.  the first 16 bytes hold the header's offset
+        # and length.
+        column_offsets = {}
+        offset         = 16
+        for column_name, column in columns:
+            column_offsets[column_name] = (offset, column.typecode, len( column ))
+            offset                     += (len( column ) * column.itemsize + 7) // 8 * 8
+
+        header = {"duration_scale": self._duration_scale,
+                  "days":           list( self._days ),
+                  "categories":     list( category_codes ),
+                  "partitions":     list( partition_codes ),
+                  "errors":         [list( error ) for error in self._errors],
+                  "number_errors":  self._number_errors,
+                  "columns":        column_offsets}
+        header_bytes = json.dumps( header ).encode( "utf-8" )
+
+        shared_block = shared_memory.SharedMemory( name=name,
+                                                   create=True,
+                                                   size=offset + len( header_bytes ) )
+
+        shared_block.buf[:8]                                = offset.to_bytes( 8, "little" )
+        shared_block.buf[8:16]                              = len( header_bytes ).to_bytes( 8, "little" )
+        shared_block.buf[offset:offset + len( header_bytes )] = header_bytes
+
+        for column_name, column in columns:
+            column_start = column_offsets[column_name][0]
+            column_bytes = column.tobytes()
+
+            shared_block.buf[column_start:column_start + len( column_bytes )] = column_bytes
+
+        return shared_block
+
+    def to_sparse( self, max_depth=1, categories=None, owners=None, start=None, end=None ):
+        """
+        Builds a SciPy sparse matrix of the hours allocated to each category on
+        each day.  See category_day_matrix() for the matrix's layout and
+        parameters.
+
+        Takes 5 arguments:
+
+          max_depth  - See category_day_matrix().
+          categories - See category_day_matrix().
+          owners     - See category_day_matrix().
+          start      - See category_day_matrix().
+          end        - See category_day_matrix().
+
+        Returns 3 values:
+
+          matrix       - scipy.sparse.csr_matrix with a row per category and a
+                         column per day.
+          categories   - List of category tuples labeling each row.
+          day_ordinals - NumPy array of the ordinals labeling each column.
+
+        """
+
+        import numpy as np
+        import scipy.sparse
+
+        coo_matrix = self.category_day_matrix( max_depth=max_depth,
+                                               categories=categories,
+                                               owners=owners,
+                                               start=start,
+                                               end=end )
+
+        # the arrays are handed over as buffers rather than copied element by
+        # element.
+        def to_numpy( values ):
+            return np.frombuffer( values, dtype=values.typecode )
+
+        matrix = scipy.sparse.csr_matrix( (to_numpy( coo_matrix.hours ),
+                                           (to_numpy( coo_matrix.rows ),
+                                            to_numpy( coo_matrix.columns ))),
+                                          shape=(len( coo_matrix.categories ), len( coo_matrix.day_ordinals )) )
+
+        return (matrix,
+                coo_matrix.categories,
+                to_numpy( coo_matrix.day_ordinals ))
+
+    def write_csv( self, file_like, batch_size=None ):
+        """
+        Writes the allocations as CSV without building a DataFrame.  Records are
+        streamed from the parsed allocations in batches so memory use doesn't grow
+        with the number of allocations.  The columns match those of to_df() when
+        written with DataFrame.to_csv(): one "level_NN" column per category level,
+        followed by "date", "duration" (in hours), and "datetime" (the ISO date, or
+        empty when the year is unknown).
+
+        Takes 2 arguments:
+
+          file_like  - File-like object to write to.  Files should be opened with
+                       newline="".
+          batch_size - Optional number of records to write at a time.  If omitted,
+                       defaults to Allocations.EXPORT_BATCH_SIZE.
+
+        Returns nothing.
+
+        """
+
+        import csv
+
+        if batch_size is None:
+            batch_size = Allocations.EXPORT_BATCH_SIZE
+
+        max_category_depth = max( (len( categories ) for (_, categories) in self._allocations),
+                                  default=0 )
+        padding            = ("",) * max_category_depth
+
+        writer = csv.writer( file_like, lineterminator="\n" )
+        writer.writerow( ["level_{:02d}".format( level ) for level in range( max_category_depth )] +
+                         ["date", "duration", "datetime"] )
+
+        for batch in self._export_batches( batch_size ):
+            writer.writerows( (categories + padding[len( categories ):] +
+                               (date_string, repr( duration ), iso_date or ""))
+                              for (date_string, iso_date, duration, categories) in batch )
+
+    def write_jsonl( self, file_like, batch_size=None ):
+        """
+        Writes the allocations as JSON Lines, one object per allocation, without
+        building a DataFrame.  Records are streamed from the parsed allocations in
+        batches so memory use doesn't grow with the number of allocations.  Each
+        object has the following keys:
+
+          date       - "<month>/<date>" string the allocation was recorded under.
+          datetime   - ISO date of the allocation, or null when its year is
+                       unknown.
+          duration   - Duration of the allocation in hours.
+          categories - List of nested categories.
+
+        Takes 2 arguments:
+
+          file_like  - File-like object to write to.
+          batch_size - Optional number of records to write at a time.  If omitted,
+                       defaults to Allocations.EXPORT_BATCH_SIZE.
+
+        Returns nothing.
+
+        """
+
+        import json
+
+        if batch_size is None:
+            batch_size = Allocations.EXPORT_BATCH_SIZE
+
+        encode = json.JSONEncoder().encode
+
+        for batch in self._export_batches( batch_size ):
+            file_like.write( "".join( encode( {"date":       date_string,
+                                               "datetime":   iso_date,
+                                               "duration":   duration,
+                                               "categories": categories} ) + "\n"
+                                      for (date_string, iso_date, duration, categories) in batch ) )
+
+class AllocationsQuery( object ):
+    """
+    Lazy, composable query over parsed allocations.  Each operation returns a new
+    query with the operation recorded so queries can be built up and shared
+    without being evaluated.  Nothing is computed until collect(), sum(), or
+    to_df() is called, at which point every filter is fused into a single pass
+    over the allocations that skips the partitions that can't match.  Queries are
+    evaluated against the allocations as they are at that time.
+
+    Queries are created with Allocations.query().
+    """
+
+    # keys that results may be grouped by.  see group_by().
+    GROUP_CATEGORY = "category"
+    GROUP_DATE     = "date"
+    GROUP_OWNER    = "owner"
+    GROUP_MONTH    = Allocations.WINDOW_MONTH
+    GROUP_QUARTER  = Allocations.WINDOW_QUARTER
+    GROUP_YEAR     = Allocations.WINDOW_YEAR
+
+    def __init__( self, allocations ):
+        """
+        Takes 1 argument:
+
+          allocations - Allocations object to query.
+        """
+
+        self._allocations = allocations
+
+        # nested categories allocations must be within, or None when the
+        # category filters contradict each other and nothing matches.
+        self._categories = ()
+
+        # ordinals of the first and last days to include, or None when
+        # unbounded.
+        self._start_ordinal = None
+        self._end_ordinal   = None
+
+        self._max_depth  = None
+        self._group_keys = None
+
+    def _extend( self, **operations ):
+        """
+        Returns a copy of the query with the supplied attributes replaced.
+        """
+
+        query = object.__new__( AllocationsQuery )
+        query.__dict__.update( self.__dict__ )
+
+        for name, value in operations.items():
+            setattr( query, "_" + name, value )
+
+        return query
+
+    def where_category( self, categories ):
+        """
+        Restricts the query to allocations within a category, or its
+        sub-categories.  Restrictions are cumulative so allocations must be within
+        every category requested.
+
+        Takes 1 argument:
+
+          categories - Tuple of nested categories.  The categories are normalized
+                       like those parsed.
+
+        Returns 1 value:
+
+          query - New AllocationsQuery with the restriction applied.
+
+        """
+
+        categories = tuple( categories )
+        if self._allocations._normalize_categories:
+            categories = tuple( map( self._allocations._normalize_category, categories ) )
+
+        current_categories = self._categories
+        if current_categories is None:
+            return self
+
+        # keep the more specific of the two categories, if one is within the
+        # other.
+        if categories[:len( current_categories )] == current_categories:
+            return self._extend( categories=categories )
+        elif current_categories[:len( categories )] == categories:
+            return self
+
+        return self._extend( categories=None )
+
+    def between( self, start=None, end=None ):
+        """
+        Restricts the query to a range of dates.  Restrictions are cumulative so
+        allocations must be within every range requested.  Days without a year are
+        excluded.
+
+        Takes 2 arguments:
+
+          start - Optional datetime.date of the first day to include.  If omitted,
+                  defaults to None and the range is unbounded at the start.
+          end   - Optional datetime.date of the last day to include.  If omitted,
+                  defaults to None and the range is unbounded at the end.
+
+        Returns 1 value:
+
+          query - New AllocationsQuery with the restriction applied.
+
+        """
+
+        start_ordinal = self._start_ordinal
+        if start is not None:
+            start_ordinal = max( start.toordinal(), start_ordinal or 0 )
+
+        end_ordinal = self._end_ordinal
+        if end is not None:
+            end_ordinal = end.toordinal() if end_ordinal is None else min( end.toordinal(), end_ordinal )
+
+        return self._extend( start_ordinal=start_ordinal,
+                             end_ordinal=end_ordinal )
+
+    def depth( self, max_depth ):
+        """
+        Rolls nested categories deeper than a maximum depth up into their parent.
+        See Allocations.summarize().
+
+        Takes 1 argument:
+
+          max_depth - Positive integer specifying the deepest category level to
+                      report.
+
+        Returns 1 value:
+
+          query - New AllocationsQuery with the depth applied.
+
+        """
+
+        if max_depth < 1:
+            raise ValueError( "Maximum depth must be positive ({:d})".format( max_depth ) )
+
+        return self._extend( max_depth=max_depth )
+
+    def group_by( self, *group_keys ):
+        """
+        Totals the query's allocations per group rather than returning them
+        individually.  Grouping again replaces the previous grouping.
+
+        Takes 1 or more arguments:
+
+          group_keys - Keys to group by, each one of AllocationsQuery.GROUP_CATEGORY
+                       (the categories, subject to depth()),
+                       AllocationsQuery.GROUP_DATE (the "<month>/<date>" string),
+                       AllocationsQuery.GROUP_OWNER (see Allocations.parse()), or
+                       AllocationsQuery.GROUP_MONTH, AllocationsQuery.GROUP_QUARTER,
+                       or AllocationsQuery.GROUP_YEAR (window labels, see
+                       top_categories()).
+
+        Returns 1 value:
+
+          query - New AllocationsQuery with the grouping applied.
+
+        """
+
+        group_keys_allowed = (AllocationsQuery.GROUP_CATEGORY,
+                              AllocationsQuery.GROUP_DATE,
+                              AllocationsQuery.GROUP_OWNER,
+                              AllocationsQuery.GROUP_MONTH,
+                              AllocationsQuery.GROUP_QUARTER,
+                              AllocationsQuery.GROUP_YEAR)
+
+        if len( group_keys ) == 0:
+            raise ValueError( "At least one key is required to group by" )
+
+        for group_key in group_keys:
+            if group_key not in group_keys_allowed:
+                raise ValueError( "Unknown group key ({:s})".format( group_key ) )
+
+        return self._extend( group_keys=group_keys )
+
+    def _scan( self ):
+        """
+        Evaluates the query's filters in a single pass over the allocations.
+
+        Takes no arguments.
+
+        Returns 1 value:
+
+          matches - Iterator of (date, day index, categories, duration) tuples for
+                    each allocation matching the query, in the order they were
+                    parsed.  categories are rolled up to the query's depth and
+                    durations are in the units they're stored in.
+
+        """
+
+        allocations = self._allocations
+        categories  = self._categories
+
+        if categories is None:
+            return
+
+        number_categories = len( categories )
+        start_ordinal     = self._start_ordinal
+        end_ordinal       = self._end_ordinal
+        max_depth         = self._max_depth
+
+        if start_ordinal is None and end_ordinal is None and number_categories == 0:
+            ranges = [(0, len( allocations._allocations ), False)]
+        else:
+            ranges = allocations._partition_ranges( None, start_ordinal, end_ordinal, categories )
+
+        for (range_start, range_end, check_dates) in ranges:
+            for ((date_string, allocation_categories), duration, day_index) in zip( allocations._allocations[range_start:range_end],
+                                                                                     allocations._durations[range_start:range_end],
+                                                                                     allocations._allocation_days[range_start:range_end] ):
+                if allocation_categories[:number_categories] != categories:
+                    continue
+                if check_dates:
+                    day_ordinal = allocations._day_ordinals[day_index]
+
+                    if ((start_ordinal is not None and day_ordinal < start_ordinal) or
+                        (end_ordinal is not None and day_ordinal > end_ordinal)):
+                        continue
+
+                if max_depth is not None:
+                    allocation_categories = allocation_categories[:max_depth]
+
+                yield (date_string, day_index, allocation_categories, duration)
+
+    def _group_totals( self ):
+        """
+        Evaluates a grouped query.  Returns a dictionary mapping tuples of group
+        values, in the order they were grouped by, to totals in the units durations
+        are stored in.
+        """
+
+        allocations = self._allocations
+
+        def group_value( group_key, date_string, day_index, categories ):
+            if group_key == AllocationsQuery.GROUP_CATEGORY:
+                return categories
+            elif group_key == AllocationsQuery.GROUP_DATE:
+                return date_string
+            elif group_key == AllocationsQuery.GROUP_OWNER:
+                return allocations._day_partitions[day_index][1]
+
+            return Allocations._window_label( group_key,
+                                              date_string,
+                                              allocations._day_ordinals[day_index] )
+
+        # group values other than the categories only depend on the day so they
+        # are computed once per day.
+        totals       = {}
+        previous_day = None
+        day_values   = None
+
+        for (date_string, day_index, categories, duration) in self._scan():
+            if day_index != previous_day:
+                day_values   = [group_value( group_key, date_string, day_index, categories )
+                                for group_key in self._group_keys]
+                previous_day = day_index
+
+            group = tuple( categories if group_key == AllocationsQuery.GROUP_CATEGORY else day_value
+                           for group_key, day_value in zip( self._group_keys, day_values ) )
+
+            totals[group] = totals.get( group, 0 ) + duration
+
+        return totals
+
+    def collect( self ):
+        """
+        Evaluates the query.
+
+        Takes no arguments.
+
+        Returns 1 value:
+
+          results - List of (date, categories, duration) tuples, like
+                    Allocations.records(), for each allocation matching the query
+                    when it isn't grouped.  Otherwise a dictionary mapping tuples
+                    of group values, in the order they were grouped by, to the
+                    total hours allocated to each group.
+
+        """
+
+        duration_scale = self._allocations._duration_scale
+
+        if self._group_keys is not None:
+            totals = self._group_totals()
+
+            if duration_scale is None:
+                return totals
+
+            return {group: total / duration_scale for group, total in totals.items()}
+
+        if duration_scale is None:
+            duration_scale = 1
+
+        return [(date_string, categories, duration / duration_scale)
+                for (date_string, _, categories, duration) in self._scan()]
+
+    def sum( self ):
+        """
+        Evaluates the query and totals the hours of the allocations matching it,
+        regardless of how they're grouped.
+
+        Takes no arguments.
+
+        Returns 1 value:
+
+          total - Total hours allocated.
+
+        """
+
+        total = sum( duration for (_, _, _, duration) in self._scan() )
+
+        if self._allocations._duration_scale is None:
+            return total
+
+        return total / self._allocations._duration_scale
+
+    def to_df( self ):
+        """
+        Evaluates the query into a Pandas DataFrame.  Only the query's results are
+        materialized.
+
+        Takes no arguments.
+
+        Returns 1 value:
+
+          df - DataFrame with one row per allocation, with category, "date", and
+               "duration" columns, when the query isn't grouped.  Otherwise one
+               row per group with a column per group key and a "duration" column.
+               Categories are split into one "level_NN" column per category
+               level, with missing levels empty.
+
+        """
+
+        import pandas as pd
+
+        results = self.collect()
+
+        # ungrouped allocations are treated as grouped by category and date.
+        if self._group_keys is None:
+            group_keys = (AllocationsQuery.GROUP_CATEGORY, AllocationsQuery.GROUP_DATE)
+            rows       = [((categories, date_string), duration)
+                          for (date_string, categories, duration) in results]
+        else:
+            group_keys = self._group_keys
+            rows       = list( results.items() )
+
+        max_category_depth = 0
+        if AllocationsQuery.GROUP_CATEGORY in group_keys:
+            category_index     = group_keys.index( AllocationsQuery.GROUP_CATEGORY )
+            max_category_depth = max( (len( group[category_index] ) for (group, _) in rows),
+                                      default=0 )
+
+        column_names = []
+        for group_key in group_keys:
+            if group_key == AllocationsQuery.GROUP_CATEGORY:
+                column_names.extend( "level_{:02d}".format( level ) for level in range( max_category_depth ) )
+            else:
+                column_names.append( group_key )
+
+        data = []
+        for (group, duration) in rows:
+            row = []
+            for group_key, group_value in zip( group_keys, group ):
+                if group_key == AllocationsQuery.GROUP_CATEGORY:
+                    row.extend( group_value + ("",) * (max_category_depth - len( group_value )) )
+                else:
+                    row.append( group_value )
+
+            row.append( duration )
+            data.append( row )
+
+        return pd.DataFrame( data, columns=column_names + ["duration"] )
+
+def validate_day_blocks( lines, first_line_number, last_line_number=None, year=None, source=STRING_INPUT_LABEL ):
+    """
+    Validates the day blocks that overlap a range of lines without parsing the
+    remainder of the lines.  This is intended for editors that re-validate a buffer
+    as it changes: only the days touched by an edit need to be validated again.
+
+    A day block starts at a date line and continues until the line before the next
+    date line.  The range of lines supplied is expanded to cover each of the day
+    blocks it overlaps.  Lines before the first date line form their own block.
+
+    Takes 5 arguments:
+
+      lines             - List of lines, or a string containing the lines, to validate.
+      first_line_number - Line number, starting from 1, of the first line changed.
+      last_line_number  - Optional line number of the last line changed.  If omitted,
+                          defaults to first_line_number.
+      year              - Optional integer specifying the year to validate dates with.
+                          See Allocations._is_valid_date() for details.
+      source            - Optional string identifying where lines came from.  If
+                          omitted, defaults to STRING_INPUT_LABEL.
+
+    Returns 3 values:
+
+      block_first_line_number - Line number of the first line validated.
+      block_last_line_number  - Line number of the last line validated.
+      errors                  - List of ParseError's for the lines validated, ordered
+                                by line number.  Diagnostics previously reported in
+                                [block_first_line_number, block_last_line_number]
+                                should be replaced by these.
+
+    """
+
+    if isinstance( lines, str ):
+        lines = lines.splitlines()
+
+    if last_line_number is None:
+        last_line_number = first_line_number
+
+    if first_line_number > last_line_number:
+        raise ValueError( "Line range is reversed ({:d}-{:d})".format( first_line_number,
+                                                                       last_line_number ) )
+
+    if len( lines ) == 0:
+        return (1, 0, [])
+
+    # clamp the range to the lines available.
+    last_index  = min( max( last_line_number, 1 ), len( lines ) ) - 1
+    first_index = min( max( first_line_number, 1 ) - 1, last_index )
+
+    def is_date_line( line ):
+        return Allocations._is_valid_date( Allocations._clean_line( line ), year )[0]
+
+    # walk backwards to the date that starts the first block and forwards to the
+    # line before the date that starts the block after the last block.
+    while first_index > 0 and not is_date_line( lines[first_index] ):
+        first_index -= 1
+
+    last_index += 1
+    while last_index < len( lines ) and not is_date_line( lines[last_index] ):
+        last_index += 1
+
+    errors       = []
+    current_date = None
+    for line_index in range( first_index, last_index ):
+        line_type, line, error_code, error_string = Allocations._classify_line( lines[line_index],
+                                                                                year )
+
+        if line_type == Allocations.LINE_TYPE_DATE:
+            current_date = line
+        elif line_type == Allocations.LINE_TYPE_ALLOCATION and current_date is None:
+            errors.append( ParseError( source,
+                                       line_index + 1,
+                                       Allocations.ERROR_ALLOCATION_UNDATED,
+                                       "Cannot record allocations without a date",
+                                       Allocations._line_span( lines[line_index], line ) ) )
+        elif line_type == Allocations.LINE_TYPE_INVALID:
+            errors.append( ParseError( source,
+                                       line_index + 1,
+                                       error_code,
+                                       error_string,
+                                       Allocations._line_span( lines[line_index], line ) ) )
+
+    return (first_index + 1, last_index, errors)
+
+def top_categories( allocations_chunks, k, window=Allocations.WINDOW_QUARTER, max_depth=1, categories=None ):
+    """
+    Streams the categories with the most hours allocated in each window of time.
+    Allocations are totaled one window at a time, so memory is proportional to the
+    number of distinct categories in a window rather than to the number of
+    allocations.
+
+    Windows are identified by consecutive runs of allocations, so allocations are
+    expected in chronological order.  A window that reappears later is reported
+    again.
+
+    Takes 5 arguments:
+
+      allocations_chunks - Iterable of Allocations objects, e.g. from
+                           Allocations.stream(), in chronological order.  Every
+                           chunk must have the same duration scale.  See
+                           AllocationsConfig.
+      k                  - Positive integer specifying the number of categories to
+                           report per window.  ValueError is raised if k isn't
+                           positive.
+      window             - Optional window to total over.  Must be one of
+                           Allocations.WINDOW_MONTH, Allocations.WINDOW_QUARTER,
+                           or Allocations.WINDOW_YEAR.  Windows are labeled
+                           "<year>-<month>", "<year>-Q<quarter>", and "<year>",
+                           respectively, with the year omitted from month and
+                           quarter labels when dates don't have a year.  Yearly
+                           windows require dates with a year.  If omitted,
+                           defaults to Allocations.WINDOW_QUARTER.
+      max_depth          - Optional positive integer specifying the deepest
+                           category level to total.  See Allocations.summarize().
+                           If omitted, defaults to 1.
+      categories         - Optional tuple of nested categories to restrict the
+                           totals to.  The categories are normalized like those
+                           parsed into each chunk.  If omitted, defaults to None
+                           and all categories are totaled.
+
+    Returns 1 value:
+
+      windows - Iterator of (window label, top categories) pairs, one per window.
+                top categories is a list of at most k (categories, hours) pairs
+                ordered from the most to the fewest hours.
+
+    """
+
+    if window not in (Allocations.WINDOW_MONTH, Allocations.WINDOW_QUARTER, Allocations.WINDOW_YEAR):
+        raise ValueError( "Unknown window ({:s})".format( window ) )
+    if k < 1:
+        raise ValueError( "K must be positive ({:d})".format( k ) )
+
+    if categories is None:
+        categories = ()
+
+    number_categories = len( categories )
+
+    def top_totals( totals, duration_scale ):
+        top = heapq.nsmallest( k, totals.items(), key=lambda item: (-item[1], item[0]) )
+
+        if duration_scale is None:
+            return top
+
+        return [(window_categories, total / duration_scale) for (window_categories, total) in top]
+
+    current_label  = None
+    totals         = {}
+    duration_scale = None
+
+    for chunk_index, chunk in enumerate( allocations_chunks ):
+        # totals are kept in the units durations are stored in, so every chunk
+        # must store them the same way.
+        if chunk_index == 0:
+            duration_scale = chunk._duration_scale
+        elif chunk._duration_scale != duration_scale:
+            raise ValueError( "Chunks must have the same duration scale ({!s} and {!s})".format( duration_scale,
+                                                                                              chunk._duration_scale ) )
+
+        # restrict the totals with categories as they were parsed into the chunk.
+        if chunk._normalize_categories:
+            chunk_categories = tuple( map( chunk._normalize_category, categories ) )
+        else:
+            chunk_categories = categories
+
+        # label each day once rather than each allocation.
+        day_labels = [Allocations._window_label( window, date_string, day_ordinal )
+                      for date_string, day_ordinal in zip( chunk._days, chunk._day_ordinals )]
+
+        for ((_, allocation_categories), duration, day_index) in zip( chunk._allocations,
+                                                                       chunk._durations,
+                                                                       chunk._allocation_days ):
+            if allocation_categories[:number_categories] != chunk_categories:
+                continue
+
+            label = day_labels[day_index]
+            if label != current_label:
+                if len( totals ) > 0:
+                    yield (current_label, top_totals( totals, duration_scale ))
+
+                current_label = label
+                totals        = {}
+
+            allocation_categories         = allocation_categories[:max_depth]
+            totals[allocation_categories] = totals.get( allocation_categories, 0 ) + duration
+
+    if len( totals ) > 0:
+        yield (current_label, top_totals( totals, duration_scale ))
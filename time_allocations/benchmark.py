@@ -0,0 +1,523 @@
+#!/usr/bin/env python
+
+# performance benchmarks for parsing and exporting allocations.  a synthetic,
+# deterministic corpus is generated at several scales and each stage of the
+# pipeline is timed against it.  invoked as:
+#
+#    python -m time_allocations.benchmark [-y <years> ...] [-o <results>] [-b <baseline>] [-m]
+#
+# results are written as tab separated lines, one per benchmark and scale:
+#
+#    <benchmark>  <years>  <items>  <seconds>  <items per second>  <peak KiB>
+#
+# so that they can be saved and compared against the results from another
+# commit with -b.  with -m the memory allocated by each phase of parsing is
+# reported instead of timings, see profile_memory().
+#
+
+import argparse
+import datetime
+import importlib
+import importlib.util
+import random
+import sys
+import time
+import tracemalloc
+
+from .allocations import Allocations
+
+WEEKDAY_NAMES = ["Monday",
+                 "Tuesday",
+                 "Wednesday",
+                 "Thursday",
+                 "Friday",
+                 "Saturday",
+                 "Sunday"]
+
+# lines that show up between allocations in real files and should be ignored
+# by the parser.
+NOISE_LINES = ["############ divider #############",
+               "------------------------------------",
+               "notes - follow up with the team",
+               "see https://example.com/tickets/12345 for details",
+               "meeting ran long, picked up the rest tomorrow",
+               "TODO review 3 pull requests"]
+
+def generate_adversarial_lines( length=10000 ):
+    """
+    Generates lines that are pathological for the parser's noise detection, e.g.
+    long runs of digits or whitespace like those in pasted log dumps and URLs.
+    None of the lines are valid so each one runs through every validator.
+
+    Takes 1 argument:
+
+      length - Optional approximate length, in characters, of each line.  If
+               omitted, defaults to 10000.
+
+    Returns 1 value:
+
+      lines - List of adversarial lines.
+
+    """
+
+    return ["1" * length + "x",                                    # digits that never get units
+            "category: " + " " * length + ":",                     # whitespace between colons
+            "1 " * (length // 2) + "x",                            # durations that never get units
+            "1." * (length // 2) + " hourz",                       # numbers that almost end with units
+            "see https://example.com/" + "a1" * (length // 2),     # long URL with digits
+            "Monday " + "1/" * (length // 2),                      # date-like prefix
+            "category (" * (length // 10) + ": 1 hour",            # unbalanced sub-categories
+            "2015-03-02T08:00:00 " * (length // 20) + "pid 1234"]  # log dump
+
+def generate_allocations( years=1, days_per_week=5, allocations_per_day=4, depth=2,
+                          categories=20, noise_fraction=0.05, comment_fraction=0.05,
+                          timelines=True, start_year=2010, seed=0 ):
+    """
+    Generates a realistic, deterministic allocations file.  Each workday starts with
+    a date line, optionally followed by a timeline, and is followed by allocations
+    against a fixed pool of nested categories.  Comment and noise lines are sprinkled
+    throughout.
+
+    Takes 10 arguments:
+
+      years               - Optional number of years to generate.  If omitted,
+                            defaults to 1.
+      days_per_week       - Optional number of days, in [1, 7], worked each week
+                            starting with Monday.  If omitted, defaults to 5.
+      allocations_per_day - Optional number of allocations per day.  If omitted,
+                            defaults to 4.
+      depth               - Optional maximum category depth.  Each allocation's depth
+                            is chosen uniformly from [1, depth].  If omitted,
+                            defaults to 2.
+      categories          - Optional number of distinct names available at each
+                            category level.  If omitted, defaults to 20.
+      noise_fraction      - Optional fraction of lines, in [0, 1), followed by a noise
+                            line that the parser ignores.  If omitted, defaults to
+                            0.05.
+      comment_fraction    - Optional fraction of allocations, in [0, 1], with a
+                            trailing comment.  If omitted, defaults to 0.05.
+      timelines           - Optional flag specifying whether each day has a timeline.
+                            If omitted, defaults to True.
+      start_year          - Optional year the allocations start on January 1st of.
+                            If omitted, defaults to 2010.
+      seed                - Optional seed for the random number generator.  If
+                            omitted, defaults to 0.
+
+    Returns 1 value:
+
+      allocations_string - String containing the generated allocations.
+
+    """
+
+    generator = random.Random( seed )
+
+    # name each level's categories up front so the categories repeat like they
+    # would in a real file.
+    category_names = [["{:s}{:d}".format( ["project", "task", "subtask", "item"][min( level, 3 )], index )
+                       for index in range( categories )]
+                      for level in range( depth )]
+
+    def generate_categories():
+        names = [generator.choice( category_names[level] )
+                 for level in range( generator.randint( 1, depth ) )]
+
+        categories_string = names[-1]
+        for name in reversed( names[:-1] ):
+            categories_string = "{:s} ({:s})".format( name, categories_string )
+
+        return categories_string
+
+    lines    = []
+    date     = datetime.date( start_year, 1, 1 )
+    end_date = datetime.date( start_year + years, 1, 1 )
+    one_day  = datetime.timedelta( days=1 )
+
+    while date < end_date:
+        if date.weekday() >= days_per_week:
+            date += one_day
+            continue
+
+        lines.append( "{:s} {:d}/{:d}".format( WEEKDAY_NAMES[date.weekday()],
+                                               date.month,
+                                               date.day ) )
+
+        # durations are in quarter hours.
+        quarter_hours = [generator.randint( 1, 12 ) for _ in range( allocations_per_day )]
+
+        if timelines:
+            start_minutes = 7 * 60 + generator.randint( 0, 8 ) * 15
+            end_minutes   = start_minutes + sum( quarter_hours ) * 15
+            lines.append( "{:02d}:{:02d}-{:02d}:{:02d} ({:.2f} hours)".format( (start_minutes // 60) % 24,
+                                                                             start_minutes % 60,
+                                                                             (end_minutes // 60) % 24,
+                                                                             end_minutes % 60,
+                                                                             sum( quarter_hours ) / 4 ) )
+
+        for quarter_hour in quarter_hours:
+            allocation_string = "{:s}: {:g} hour{:s}".format( generate_categories(),
+                                                             quarter_hour / 4,
+                                                             "" if quarter_hour == 4 else "s" )
+
+            if generator.random() < comment_fraction:
+                allocation_string += "  # carried over"
+
+            lines.append( allocation_string )
+
+            if generator.random() < noise_fraction:
+                lines.append( generator.choice( NOISE_LINES ) )
+
+        lines.append( "" )
+        date += one_day
+
+    return "\n".join( lines ) + "\n"
+
+def time_function( function, repeat ):
+    """
+    Times a function, returning the best of several runs.
+
+    Takes 2 arguments:
+
+      function - Function, taking no arguments, to time.
+      repeat   - Positive number of times to run function.
+
+    Returns 1 value:
+
+      seconds - Shortest wall clock time, in seconds, across the runs.
+
+    """
+
+    best_seconds = None
+    for _ in range( repeat ):
+        start_time = time.perf_counter()
+        function()
+        seconds    = time.perf_counter() - start_time
+
+        if best_seconds is None or seconds < best_seconds:
+            best_seconds = seconds
+
+    return best_seconds
+
+def peak_memory( function ):
+    """
+    Measures the peak memory allocated while running a function.
+
+    Takes 1 argument:
+
+      function - Function, taking no arguments, to measure.
+
+    Returns 1 value:
+
+      peak_bytes - Peak number of bytes allocated by function, as traced by
+                   tracemalloc.
+
+    """
+
+    tracemalloc.start()
+    try:
+        function()
+        _, peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return peak_bytes
+
+def profile_memory( allocations_string ):
+    """
+    Attributes the memory allocated while parsing and exporting to each phase of
+    the pipeline.  Each phase is run under tracemalloc with the peak reset in between
+    so that transient allocations (e.g. temporary strings created by the validators)
+    are distinguished from the memory retained once the phase completes.
+
+    Takes 1 argument:
+
+      allocations_string - String containing the corpus to profile.
+
+    Returns 1 value:
+
+      phases - List of (phase name, peak bytes, retained bytes) tuples, one per
+               phase, in the order they were run.  Peak and retained bytes are
+               relative to the memory traced before the phase started.
+
+    """
+
+    phases = []
+
+    def run_phase( phase_name, function ):
+        start_bytes, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+
+        result = function()
+
+        current_bytes, peak_bytes = tracemalloc.get_traced_memory()
+        phases.append( (phase_name, peak_bytes - start_bytes, current_bytes - start_bytes) )
+
+        return result
+
+    tracemalloc.start()
+    try:
+        lines = run_phase( "split", allocations_string.splitlines )
+
+        # classify every line without recording anything so the validators'
+        # memory is separated from the memory holding the allocations.
+        run_phase( "classify", lambda: [Allocations._classify_line( line ) for line in lines] )
+
+        allocations = run_phase( "parse", lambda: Allocations( allocations_string ) )
+
+        # Pandas is imported ahead of its phase so that the memory used by the
+        # import isn't attributed to to_df().
+        if importlib.util.find_spec( "pandas" ) is not None:
+            importlib.import_module( "pandas" )
+            run_phase( "to_df", allocations.to_df )
+    finally:
+        tracemalloc.stop()
+
+    return phases
+
+def build_benchmarks( allocations_string ):
+    """
+    Builds the benchmarks for a single corpus.
+
+    Takes 1 argument:
+
+      allocations_string - String containing the corpus to benchmark against.
+
+    Returns 1 value:
+
+      benchmarks - List of (name, number of items, function) tuples.  Each
+                   function takes no arguments and processes its items once.
+
+    """
+
+    lines = allocations_string.splitlines()
+
+    # separate out the lines each validator sees so their throughput is
+    # measured on their own.
+    cleaned_lines    = [Allocations._clean_line( line ) for line in lines]
+    date_lines       = [line for line in cleaned_lines if Allocations._is_valid_date( line )[0]]
+    allocation_lines = [line for line in cleaned_lines
+                        if ":" in line and not Allocations._is_valid_date( line )[0]]
+
+    parsed_allocations = Allocations( allocations_string )
+
+    # lines that used to backtrack in noise detection, both fully classified
+    # and rejected by length.
+    adversarial_lines = generate_adversarial_lines()
+
+    def run_parse():
+        Allocations( allocations_string )
+
+    def run_is_valid_date():
+        for line in date_lines:
+            Allocations._is_valid_date( line )
+
+    def run_is_valid_allocation():
+        for line in allocation_lines:
+            Allocations._is_valid_allocation( line )
+
+    def run_adversarial_lines():
+        for line in adversarial_lines:
+            Allocations._classify_line( line )
+
+    def run_adversarial_lines_rejected():
+        for line in adversarial_lines:
+            Allocations._classify_line( line, max_line_length=1000 )
+
+    def run_to_df():
+        parsed_allocations.to_df()
+
+    benchmarks = [("parse",                      len( lines ),             run_parse),
+                  ("_is_valid_date",             len( date_lines ),        run_is_valid_date),
+                  ("_is_valid_allocation",       len( allocation_lines ),  run_is_valid_allocation),
+                  ("adversarial_lines",          len( adversarial_lines ), run_adversarial_lines),
+                  ("adversarial_lines_rejected", len( adversarial_lines ), run_adversarial_lines_rejected)]
+
+    # exporting requires Pandas which isn't a hard requirement.
+    if importlib.util.find_spec( "pandas" ) is None:
+        print( "Pandas is not available, skipping to_df.", file=sys.stderr )
+    else:
+        benchmarks.append( ("to_df", len( parsed_allocations._allocations ), run_to_df) )
+
+    return benchmarks
+
+def read_results( file_name ):
+    """
+    Reads results written by a previous run.
+
+    Takes 1 argument:
+
+      file_name - Path to the results to read.
+
+    Returns 1 value:
+
+      results - Dictionary mapping (benchmark, years) to items per second.
+
+    """
+
+    results = {}
+
+    with open( file_name, "r" ) as results_file:
+        for line in results_file:
+            if line.startswith( "#" ) or len( line.strip() ) == 0:
+                continue
+
+            fields = line.split( "\t" )
+            results[(fields[0], fields[1])] = float( fields[4] )
+
+    return results
+
+def run_benchmarks( years_list, repeat, output_file, baseline=None, **generator_arguments ):
+    """
+    Runs each benchmark at each scale and writes the results.
+
+    Takes 5 arguments:
+
+      years_list          - List of the number of years to generate for each scale.
+      repeat              - Number of times to run each benchmark.  The best time
+                            is reported.
+      output_file         - File-like object to write results to.
+      baseline            - Optional dictionary of previous results, as returned by
+                            read_results(), to compare against.  If omitted,
+                            defaults to None and no comparison is made.
+      generator_arguments - Additional keyword arguments for generate_allocations().
+
+    Returns nothing.
+
+    """
+
+    print( "# benchmark\tyears\titems\tseconds\titems/s\tpeak KiB{:s}".format(
+        "\tspeedup" if baseline is not None else "" ),
+           file=output_file )
+
+    for years in years_list:
+        allocations_string = generate_allocations( years=years, **generator_arguments )
+
+        for (name, number_items, function) in build_benchmarks( allocations_string ):
+            seconds    = time_function( function, repeat )
+            peak_bytes = peak_memory( function )
+
+            items_per_second = number_items / seconds if seconds > 0 else float( "inf" )
+
+            result_line = "{:s}\t{:d}\t{:d}\t{:.6f}\t{:.1f}\t{:.1f}".format( name,
+                                                                            years,
+                                                                            number_items,
+                                                                            seconds,
+                                                                            items_per_second,
+                                                                            peak_bytes / 1024 )
+
+            if baseline is not None:
+                baseline_rate = baseline.get( (name, str( years )) )
+                if baseline_rate:
+                    result_line += "\t{:.2f}x".format( items_per_second / baseline_rate )
+                else:
+                    result_line += "\t-"
+
+            print( result_line, file=output_file )
+            output_file.flush()
+
+def run_memory_profile( years_list, output_file, **generator_arguments ):
+    """
+    Profiles the memory used by each phase at each scale and writes the results.
+
+    Takes 3 arguments:
+
+      years_list          - List of the number of years to generate for each scale.
+      output_file         - File-like object to write results to.
+      generator_arguments - Additional keyword arguments for generate_allocations().
+
+    Returns nothing.
+
+    """
+
+    print( "# phase\tyears\tpeak KiB\tretained KiB", file=output_file )
+
+    for years in years_list:
+        allocations_string = generate_allocations( years=years, **generator_arguments )
+
+        for (phase_name, peak_bytes, retained_bytes) in profile_memory( allocations_string ):
+            print( "{:s}\t{:d}\t{:.1f}\t{:.1f}".format( phase_name,
+                                                         years,
+                                                         peak_bytes / 1024,
+                                                         retained_bytes / 1024 ),
+                   file=output_file )
+            output_file.flush()
+
+def main( argv=None ):
+    """
+    Parses the command line and runs the benchmarks.
+
+    Takes 1 argument:
+
+      argv - Optional list of command line arguments, excluding the program name.
+             If omitted, defaults to sys.argv[1:].
+
+    Returns 1 value:
+
+      exit_status - Integer status to exit with.
+
+    """
+
+    parser = argparse.ArgumentParser( prog="python -m time_allocations.benchmark",
+                                      description="Benchmarks parsing and exporting synthetic allocations." )
+    parser.add_argument( "-y", "--years", type=int, nargs="+", default=[1, 5, 10],
+                         help="Years of allocations at each scale.  Defaults to 1, 5, and 10." )
+    parser.add_argument( "-r", "--repeat", type=int,
+                         help="Number of times to run each benchmark.  Defaults to 3." )
+    parser.add_argument( "-w", "--days-per-week", type=int, default=5,
+                         help="Days worked per week.  Defaults to 5." )
+    parser.add_argument( "-a", "--allocations-per-day", type=int, default=4,
+                         help="Allocations per day.  Defaults to 4." )
+    parser.add_argument( "-d", "--depth", type=int, default=2,
+                         help="Maximum category depth.  Defaults to 2." )
+    parser.add_argument( "-c", "--categories", type=int, default=20,
+                         help="Distinct categories per level.  Defaults to 20." )
+    parser.add_argument( "-n", "--noise-fraction", type=float, default=0.05,
+                         help="Fraction of lines followed by noise.  Defaults to 0.05." )
+    parser.add_argument( "-s", "--seed", type=int, default=0,
+                         help="Random seed.  Defaults to 0." )
+    parser.add_argument( "-m", "--memory", action="store_true",
+                         help="Profile the memory used by each phase rather than benchmarking." )
+    parser.add_argument( "-b", "--baseline",
+                         help="Results from a previous run to compare against." )
+    parser.add_argument( "-o", "--output",
+                         help="Path to write results to.  Defaults to standard output." )
+
+    arguments = parser.parse_args( sys.argv[1:] if argv is None else argv )
+
+    # memory profiles run each phase once and aren't comparable to timings.
+    if arguments.memory and arguments.baseline is not None:
+        parser.error( "Memory profiles can't be compared against a baseline (-b)" )
+    if arguments.memory and arguments.repeat is not None:
+        parser.error( "Memory profiles aren't repeated (-r)" )
+    if arguments.repeat is None:
+        arguments.repeat = 3
+
+    baseline = None
+    if arguments.baseline is not None:
+        baseline = read_results( arguments.baseline )
+
+    generator_arguments = {"days_per_week":       arguments.days_per_week,
+                           "allocations_per_day": arguments.allocations_per_day,
+                           "depth":               arguments.depth,
+                           "categories":          arguments.categories,
+                           "noise_fraction":      arguments.noise_fraction,
+                           "seed":                arguments.seed}
+
+    if arguments.memory:
+        if arguments.output is None:
+            run_memory_profile( arguments.years, sys.stdout, **generator_arguments )
+        else:
+            with open( arguments.output, "w" ) as output_file:
+                run_memory_profile( arguments.years, output_file, **generator_arguments )
+
+        return 0
+
+    if arguments.output is None:
+        run_benchmarks( arguments.years, arguments.repeat, sys.stdout, baseline, **generator_arguments )
+    else:
+        with open( arguments.output, "w" ) as output_file:
+            run_benchmarks( arguments.years, arguments.repeat, output_file, baseline, **generator_arguments )
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit( main() )
@@ -0,0 +1,431 @@
+#!/usr/bin/env python
+
+# resident query daemon that keeps parsed allocations in memory and answers
+# JSON queries over a Unix domain socket.  editors, shell prompts, and
+# dashboards can then ask small questions of large archives without paying the
+# cost of parsing them each time.
+#
+# the protocol is newline delimited JSON.  each request is a single JSON object
+# on its own line and each response is a single JSON object on its own line.
+# requests are of the form:
+#
+#    {"query": "<query>", ...}
+#
+# with the following queries supported:
+#
+#    files     - lists the files loaded along with their error counts.  accepts
+#                "files" and "year".
+#    lint      - validates the day blocks of "text" that overlap the lines
+#                "first_line" through "last_line".  see validate_day_blocks().
+#    reload    - reparses any files that have changed.
+#    summary   - totals hours per category.  accepts "files", "year",
+#                "max_depth", "categories", "dates", "month", "start", and "end"
+#                parameters.  "start" and "end" are ISO 8601 dates (e.g.
+#                "2024-01-31") bounding the days totaled and require a year.
+#    total     - totals hours.  accepts the same parameters as "summary".
+#    validate  - reports the number of errors in each file along with the errors
+#                themselves.  accepts "files" and "year".
+#
+# "year" is the year of the first date in each file and is used to validate
+# dates and to roll years over.  if omitted, the daemon's configured year is
+# used.  files are parsed once per year requested.
+#
+# responses are of the form:
+#
+#    {"status": "ok", "result": <result>}
+#    {"status": "error", "message": "<message>"}
+#
+
+import datetime
+import hashlib
+import json
+import os
+import socketserver
+import threading
+
+from .allocations import Allocations, AllocationsConfig, STRING_INPUT_LABEL, validate_day_blocks
+
+class AllocationsCache( object ):
+    """
+    Cache of parsed allocations.  Each file is parsed in day-aligned chunks, one
+    Allocations object per chunk, and is reparsed when its modification time or
+    size changes.  Only the chunks from the first one whose lines changed onward
+    are reparsed, so appending to, or editing the end of, a large archive only
+    pays the cost of parsing its last few days.
+
+    Since chunks are parsed independently, bounds on the number of errors (e.g.
+    max_errors) and duplicate days are checked per chunk.  See
+    Allocations.stream().
+    """
+
+    # minimum number of lines in each chunk.  smaller chunks reparse less of a
+    # file after an edit at the cost of more objects per file.
+    CHUNK_SIZE = 1000
+
+    def __init__( self, file_names=None, configuration=None ):
+        """
+        Takes 2 arguments:
+
+          file_names    - Optional list of file names to load.  If omitted, defaults
+                          to None and files are loaded as they are queried.
+          configuration - Optional AllocationsConfig to parse with.  Its default
+                          year is used for files queried without a year.  If
+                          omitted, defaults to AllocationsConfig.defaults().
+        """
+
+        if configuration is None:
+            configuration = AllocationsConfig.defaults()
+
+        self._configuration = configuration
+
+        # map from (absolute file name, year) pairs to (stat key, chunks) pairs.
+        # the stat key identifies the version of the file that was parsed and
+        # chunks is a list of (digest, Allocations object, parser state) tuples,
+        # one per day-aligned chunk of the file.  the parser state is the state
+        # after the chunk was parsed and is where the next chunk's parse starts.
+        self._files = {}
+
+        # serialize access so a reload doesn't race with a query.
+        self._lock = threading.Lock()
+
+        for file_name in (file_names or []):
+            self.load( file_name )
+
+    def _stat_key( file_name ):
+        """
+        Returns a key identifying the version of file_name on disk.
+        """
+
+        file_stat = os.stat( file_name )
+
+        return (file_stat.st_mtime_ns, file_stat.st_size)
+
+    def _parse_chunks( self, file_name, year, previous_chunks ):
+        """
+        Parses file_name in day-aligned chunks, reusing the leading chunks of a
+        previous parse whose lines haven't changed.
+
+        Takes 3 arguments:
+
+          file_name       - Absolute path to the allocations file to parse.
+          year            - Year of the first date in file_name, or None.
+          previous_chunks - List of chunks from a previous parse of file_name with
+                            the same year.  See __init__().
+
+        Returns 1 value:
+
+          chunks - List of chunks for file_name.  See __init__().
+
+        """
+
+        with open( file_name, "r" ) as allocations_file:
+            lines = allocations_file.readlines()
+
+        chunks       = []
+        parser_state = (year, None)
+
+        for first_line_number, chunk_lines in Allocations._split_day_chunks( lines,
+                                                                            AllocationsCache.CHUNK_SIZE ):
+            digest = hashlib.blake2b( "".join( chunk_lines ).encode( "utf-8" ) ).digest()
+
+            # chunks after the first change must be reparsed even if their lines
+            # are the same since their line numbers or years may have changed.
+            chunk_index = len( chunks )
+            if (chunk_index < len( previous_chunks ) and
+                previous_chunks[chunk_index][0] == digest):
+                chunks.append( previous_chunks[chunk_index] )
+                parser_state = previous_chunks[chunk_index][2]
+                continue
+
+            previous_chunks = []
+
+            allocations  = Allocations( configuration=self._configuration )
+            parser_state = allocations._parse_lines( chunk_lines,
+                                                     file_name,
+                                                     first_line_number,
+                                                     *parser_state )
+
+            chunks.append( (digest, allocations, parser_state) )
+
+        return chunks
+
+    def load( self, file_name, year=None ):
+        """
+        Parses file_name if it hasn't been parsed, or if it has changed since it
+        was last parsed.
+
+        Takes 2 arguments:
+
+          file_name - Path to the allocations file to load.
+          year      - Optional year of the first date in file_name.  If omitted,
+                      defaults to None and the configuration's default year is
+                      used.
+
+        Returns 1 value:
+
+          allocations - List of Allocations objects for file_name, one per chunk,
+                        in the order they appear in the file.
+
+        """
+
+        if year is None:
+            year = self._configuration.get( "default_year" )
+
+        file_name = os.path.abspath( file_name )
+        stat_key  = AllocationsCache._stat_key( file_name )
+
+        with self._lock:
+            cached = self._files.get( (file_name, year) )
+            if cached is None:
+                chunks = self._parse_chunks( file_name, year, [] )
+            elif cached[0] != stat_key:
+                chunks = self._parse_chunks( file_name, year, cached[1] )
+            else:
+                chunks = cached[1]
+
+            self._files[(file_name, year)] = (stat_key, chunks)
+
+        return [allocations for _, allocations, _ in chunks]
+
+    def reload( self ):
+        """
+        Reparses every loaded file that has changed on disk.  Files that no longer
+        exist are dropped.
+
+        Takes no arguments.
+
+        Returns 1 value:
+
+          file_names - List of file names that were reparsed.
+
+        """
+
+        reloaded_file_names = []
+
+        with self._lock:
+            cache_keys = sorted( self._files, key=lambda cache_key: (cache_key[0], str( cache_key[1] )) )
+
+        for file_name, year in cache_keys:
+            try:
+                stat_key = AllocationsCache._stat_key( file_name )
+            except OSError:
+                with self._lock:
+                    self._files.pop( (file_name, year), None )
+                continue
+
+            with self._lock:
+                cached = self._files.get( (file_name, year) )
+
+            if cached is not None and cached[0] != stat_key:
+                self.load( file_name, year )
+                if file_name not in reloaded_file_names:
+                    reloaded_file_names.append( file_name )
+
+        return reloaded_file_names
+
+    def file_names( self ):
+        """
+        Returns a sorted list of the file names loaded.
+        """
+
+        with self._lock:
+            return sorted( {file_name for file_name, _ in self._files} )
+
+    def allocations( self, file_names=None, year=None ):
+        """
+        Returns up-to-date allocations for the supplied files.
+
+        Takes 2 arguments:
+
+          file_names - Optional list of file names to return allocations for.  Files
+                       that haven't been loaded are loaded.  If omitted, defaults
+                       to None and every loaded file is returned.
+          year       - Optional year of the first date in each file.  See load().
+
+        Returns 1 value:
+
+          allocations - List of (file name, Allocations objects) pairs, one per
+                        file.  See load().
+
+        """
+
+        if file_names is None:
+            self.reload()
+            file_names = self.file_names()
+
+        return [(os.path.abspath( file_name ), self.load( file_name, year ))
+                for file_name in file_names]
+
+class QueryHandler( socketserver.StreamRequestHandler ):
+    """
+    Answers newline delimited JSON queries until the client disconnects.
+    """
+
+    def handle( self ):
+        for request_line in self.rfile:
+            if len( request_line.strip() ) == 0:
+                continue
+
+            try:
+                request  = json.loads( request_line.decode( "utf-8" ) )
+                response = {"status": "ok",
+                            "result": answer_query( self.server.cache, request )}
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                response = {"status": "error",
+                            "message": str( e )}
+
+            self.wfile.write( (json.dumps( response ) + "\n").encode( "utf-8" ) )
+            self.wfile.flush()
+
+class AllocationsServer( socketserver.ThreadingMixIn, socketserver.UnixStreamServer ):
+    """
+    Unix domain socket server answering queries against an AllocationsCache.
+    """
+
+    daemon_threads = True
+
+    def __init__( self, socket_path, cache ):
+        """
+        Takes 2 arguments:
+
+          socket_path - Path to create the Unix domain socket at.  An existing
+                        socket at this path is replaced.
+          cache       - AllocationsCache to answer queries from.
+        """
+
+        if os.path.exists( socket_path ):
+            os.unlink( socket_path )
+
+        self.cache = cache
+
+        socketserver.UnixStreamServer.__init__( self, socket_path, QueryHandler )
+
+    def server_close( self ):
+        socketserver.UnixStreamServer.server_close( self )
+
+        try:
+            os.unlink( self.server_address )
+        except OSError:
+            pass
+
+def answer_query( cache, request ):
+    """
+    Answers a single query against the cache.
+
+    Takes 2 arguments:
+
+      cache   - AllocationsCache to answer the query from.
+      request - Dictionary describing the query.  See the top of this module for
+                the queries supported.
+
+    Returns 1 value:
+
+      result - JSON serializable result of the query.
+
+    """
+
+    if not isinstance( request, dict ):
+        raise ValueError( "Requests must be JSON objects" )
+
+    query      = request["query"]
+    file_names = request.get( "files" )
+    year       = request.get( "year" )
+
+    # check the parameters shared by queries so that, for instance, a single
+    # file name isn't treated as a list of one character file names.
+    if file_names is not None and not (isinstance( file_names, list ) and
+                                       all( isinstance( file_name, str ) for file_name in file_names )):
+        raise ValueError( "\"files\" must be a list of file names" )
+    if year is not None and (not isinstance( year, int ) or isinstance( year, bool )):
+        raise ValueError( "\"year\" must be an integer" )
+    if request.get( "dates" ) is not None and not (isinstance( request["dates"], list ) and
+                                                   all( isinstance( date, str ) for date in request["dates"] )):
+        raise ValueError( "\"dates\" must be a list of \"<month>/<date>\" strings" )
+    for date_name in ("start", "end"):
+        if request.get( date_name ) is not None and not isinstance( request[date_name], str ):
+            raise ValueError( "\"{:s}\" must be an ISO 8601 date".format( date_name ) )
+
+    if query == "files":
+        return [{"file": file_name,
+                 "errors": sum( chunk.number_errors() for chunk in chunks )}
+                for file_name, chunks in cache.allocations( file_names, year )]
+    elif query == "validate":
+        return [{"file": file_name,
+                 "errors": sum( chunk.number_errors() for chunk in chunks ),
+                 "details": [error._asdict() for chunk in chunks for error in chunk.errors()]}
+                for file_name, chunks in cache.allocations( file_names, year )]
+    elif query == "lint":
+        first_line_number, last_line_number, errors = validate_day_blocks( request["text"],
+                                                                           request["first_line"],
+                                                                           request.get( "last_line" ),
+                                                                           source=request.get( "source", STRING_INPUT_LABEL ) )
+
+        return {"first_line": first_line_number,
+                "last_line": last_line_number,
+                "errors": [error._asdict() for error in errors]}
+    elif query == "reload":
+        return cache.reload()
+    elif query == "summary" or query == "total":
+        categories = request.get( "categories" )
+        if isinstance( categories, str ):
+            categories = Allocations._parse_categories( categories )
+        elif categories is not None:
+            categories = tuple( categories )
+
+        # ranges of dates are only meaningful when the files' years are known.
+        start = request.get( "start" )
+        end   = request.get( "end" )
+        if start is not None:
+            start = datetime.date.fromisoformat( start )
+        if end is not None:
+            end = datetime.date.fromisoformat( end )
+        if ((start is not None or end is not None) and
+            year is None and cache._configuration.get( "default_year" ) is None):
+            raise ValueError( "Ranges of dates require a year" )
+
+        totals = {}
+        for _, chunks in cache.allocations( file_names, year ):
+            for chunk in chunks:
+                chunk_totals = chunk.summarize( max_depth=request.get( "max_depth", 1 ),
+                                                categories=categories,
+                                                dates=request.get( "dates" ),
+                                                month=request.get( "month" ),
+                                                start=start,
+                                                end=end )
+
+                for allocation_categories, duration in chunk_totals.items():
+                    totals[allocation_categories] = totals.get( allocation_categories, 0.0 ) + duration
+
+        if query == "total":
+            return sum( totals.values() )
+
+        return [{"categories": list( allocation_categories ),
+                 "hours": totals[allocation_categories]}
+                for allocation_categories in sorted( totals )]
+
+    raise ValueError( "Unknown query ({:s})".format( query ) )
+
+def serve( socket_path, file_names, configuration=None ):
+    """
+    Loads the supplied files and answers queries on socket_path until
+    interrupted.
+
+    Takes 3 arguments:
+
+      socket_path   - Path to create the Unix domain socket at.
+      file_names    - List of allocations files to load up front.
+      configuration - Optional AllocationsConfig to parse with.  Its default year
+                      is used for queries without a year.  If omitted, defaults
+                      to AllocationsConfig.defaults().
+
+    Returns nothing.
+
+    """
+
+    cache = AllocationsCache( file_names, configuration )
+
+    with AllocationsServer( socket_path, cache ) as server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
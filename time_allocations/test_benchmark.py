@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+# the benchmarks are part of the package so make sure they are importable when
+# the tests are run from within the package's directory.
+sys.path.insert( 0, os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) ) )
+
+from time_allocations import allocations as allocations_module
+from time_allocations import benchmark as benchmark_module
+
+class TestBenchmarkCorpus( unittest.TestCase ):
+    """
+    """
+
+    def test_generate_allocations( self ):
+        """
+        Verifies the synthetic corpus is deterministic, parses without errors, and
+        honors the requested shape.
+        """
+
+        allocations_string = benchmark_module.generate_allocations( years=1,
+                                                                    days_per_week=5,
+                                                                    allocations_per_day=3,
+                                                                    depth=3,
+                                                                    categories=4,
+                                                                    seed=1 )
+
+        self.assertEqual( allocations_string,
+                          benchmark_module.generate_allocations( years=1,
+                                                                 days_per_week=5,
+                                                                 allocations_per_day=3,
+                                                                 depth=3,
+                                                                 categories=4,
+                                                                 seed=1 ) )
+
+        allocation = allocations_module.Allocations( allocations_string )
+        records    = list( allocation.records() )
+
+        # 2010 has 261 weekdays.
+        self.assertEqual( allocation.number_errors(), 0 )
+        self.assertEqual( len( records ), 261 * 3 )
+        self.assertEqual( max( len( categories ) for (_, categories, _) in records ), 3 )
+        self.assertEqual( len( set( categories[0] for (_, categories, _) in records ) ), 4 )
+
+        # timelines cover each day's allocations.
+        self.assertEqual( allocation.timeline_discrepancies(), [] )
+
+    def test_generate_adversarial_lines( self ):
+        """
+        Verifies adversarial lines are classified quickly, as they would take
+        minutes if noise detection backtracked, and aren't mistaken for dates or
+        allocations.
+        """
+
+        for line in benchmark_module.generate_adversarial_lines( length=50000 ):
+            start_time = time.perf_counter()
+            line_type  = allocations_module.Allocations._classify_line( line )[0]
+
+            self.assertLess( time.perf_counter() - start_time, 1.0 )
+            self.assertIn( line_type, (allocations_module.Allocations.LINE_TYPE_IGNORED,
+                                       allocations_module.Allocations.LINE_TYPE_INVALID) )
+
+    def test_profile_memory( self ):
+        """
+        Verifies each phase of the pipeline is profiled.
+        """
+
+        allocations_string = benchmark_module.generate_allocations( years=1, seed=1 )
+        phases             = benchmark_module.profile_memory( allocations_string )
+
+        self.assertEqual( [phase_name for (phase_name, _, _) in phases][:3],
+                          ["split", "classify", "parse"] )
+        for (_, peak_bytes, retained_bytes) in phases:
+            self.assertGreaterEqual( peak_bytes, retained_bytes )
+
+    def test_memory_command_line( self ):
+        """
+        Verifies memory profiles are written to the requested output and that
+        options that don't apply to them are rejected.
+        """
+
+        with tempfile.TemporaryDirectory() as temporary_directory:
+            output_path = os.path.join( temporary_directory, "memory.tsv" )
+
+            self.assertEqual( benchmark_module.main( ["-m", "-y", "1", "-o", output_path] ), 0 )
+
+            with open( output_path, "r" ) as output_file:
+                output_lines = output_file.read().splitlines()
+
+            self.assertEqual( output_lines[0], "# phase\tyears\tpeak KiB\tretained KiB" )
+            self.assertEqual( output_lines[1].split( "\t" )[:2], ["split", "1"] )
+
+        for arguments in (["-m", "-r", "1"], ["-m", "-b", "baseline.tsv"]):
+            with self.assertRaises( SystemExit ), contextlib.redirect_stderr( io.StringIO() ):
+                benchmark_module.main( arguments )
+
+if __name__ == "__main__":
+    unittest.main()
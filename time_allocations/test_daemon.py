@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+
+import datetime
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import unittest
+
+# the daemon is part of the package so make sure it is importable when the
+# tests are run from within the package's directory.
+sys.path.insert( 0, os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) ) )
+
+from time_allocations import daemon as daemon_module
+
+class TestDaemon( unittest.TestCase ):
+    """
+    """
+
+    ALLOCATIONS_STRING = ("Monday 1/1\n" +
+                          "category1 (subcategoryA): 1.5 hours\n" +
+                          "category2: 1 hour\n" +
+                          "Tuesday 1/2\n" +
+                          "category1 (subcategoryB): 2 hours\n")
+
+    def setUp( self ):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+
+        self.allocations_path = os.path.join( self.temporary_directory.name, "allocations.txt" )
+        self.socket_path      = os.path.join( self.temporary_directory.name, "daemon.socket" )
+
+        with open( self.allocations_path, "w" ) as allocations_file:
+            allocations_file.write( self.ALLOCATIONS_STRING )
+
+        cache       = daemon_module.AllocationsCache( [self.allocations_path] )
+        self.server = daemon_module.AllocationsServer( self.socket_path, cache )
+
+        self.server_thread = threading.Thread( target=self.server.serve_forever )
+        self.server_thread.start()
+
+    def tearDown( self ):
+        self.server.shutdown()
+        self.server.server_close()
+        self.server_thread.join()
+
+        self.temporary_directory.cleanup()
+
+    def query( self, client_file, request ):
+        """
+        Sends a request and returns the decoded response.
+        """
+
+        client_file.write( (json.dumps( request ) + "\n").encode( "utf-8" ) )
+        client_file.flush()
+
+        return json.loads( client_file.readline().decode( "utf-8" ) )
+
+    def test_queries( self ):
+        """
+        Verifies summaries, totals, and reloads after the underlying file changes.
+        """
+
+        with socket.socket( socket.AF_UNIX, socket.SOCK_STREAM ) as client_socket:
+            client_socket.connect( self.socket_path )
+            client_file = client_socket.makefile( "rwb" )
+
+            self.assertEqual( self.query( client_file, {"query": "total", "dates": ["1/1"]} ),
+                              {"status": "ok", "result": 2.5} )
+            self.assertEqual( self.query( client_file, {"query": "summary", "max_depth": 2, "categories": "category1"} ),
+                              {"status": "ok", "result": [{"categories": ["category1", "subcategoryA"], "hours": 1.5},
+                                                          {"categories": ["category1", "subcategoryB"], "hours": 2.0}]} )
+            self.assertEqual( self.query( client_file, {"query": "bogus"} )["status"],
+                              "error" )
+
+            # malformed parameters are reported rather than misinterpreted.
+            self.assertEqual( self.query( client_file, {"query": "files", "files": self.allocations_path} ),
+                              {"status": "error", "message": "\"files\" must be a list of file names"} )
+            self.assertEqual( self.query( client_file, {"query": "total", "year": "2024"} ),
+                              {"status": "error", "message": "\"year\" must be an integer"} )
+            self.assertEqual( self.query( client_file, {"query": "total", "dates": "1/1"} )["status"],
+                              "error" )
+            self.assertEqual( self.query( client_file, {"query": "total", "start": 2024} )["status"],
+                              "error" )
+            self.assertEqual( self.query( client_file, ["total"] ),
+                              {"status": "error", "message": "Requests must be JSON objects"} )
+
+            # append to the file and make sure the change is visible without an
+            # explicit reload.
+            with open( self.allocations_path, "a" ) as allocations_file:
+                allocations_file.write( "category2: 4 hours\nbogus: XYZ hours\n" )
+            os.utime( self.allocations_path, ns=(0, 0) )
+
+            self.assertEqual( self.query( client_file, {"query": "total"} ),
+                              {"status": "ok", "result": 8.5} )
+            self.assertEqual( self.query( client_file, {"query": "validate"} ),
+                              {"status": "ok", "result": [{"file": self.allocations_path,
+                                                           "errors": 1,
+                                                           "details": [{"source": self.allocations_path,
+                                                                        "line_number": 7,
+                                                                        "code": "allocation-duration",
+                                                                        "message": "Allocation has invalid duration",
+                                                                        "span": [0, 16]}]}]} )
+
+    def test_years( self ):
+        """
+        Verifies queries parse with the requested year and that ranges of dates
+        only include days within them.
+        """
+
+        with open( self.allocations_path, "a" ) as allocations_file:
+            allocations_file.write( "Tuesday 12/31\ncategory2: 3 hours\nWednesday 1/1\ncategory2: 4 hours\n" )
+
+        with socket.socket( socket.AF_UNIX, socket.SOCK_STREAM ) as client_socket:
+            client_socket.connect( self.socket_path )
+            client_file = client_socket.makefile( "rwb" )
+
+            # without a year both 1/1's are totaled.
+            self.assertEqual( self.query( client_file, {"query": "total", "dates": ["1/1"]} ),
+                              {"status": "ok", "result": 6.5} )
+            self.assertEqual( self.query( client_file, {"query": "total", "start": "2024-01-01"} )["status"],
+                              "error" )
+
+            self.assertEqual( self.query( client_file, {"query": "files", "year": 2024} ),
+                              {"status": "ok", "result": [{"file": self.allocations_path,
+                                                           "errors": 0}]} )
+            self.assertEqual( self.query( client_file, {"query": "total",
+                                                        "year": 2024,
+                                                        "start": "2025-01-01",
+                                                        "end": "2025-01-01"} ),
+                              {"status": "ok", "result": 4.0} )
+            self.assertEqual( self.query( client_file, {"query": "total",
+                                                        "year": 2024,
+                                                        "start": "2024-01-01",
+                                                        "end": "2024-01-01"} ),
+                              {"status": "ok", "result": 2.5} )
+
+            # the wrong year invalidates each of the dates, which leaves each of
+            # the allocations undated.
+            self.assertEqual( self.query( client_file, {"query": "files", "year": 2023} ),
+                              {"status": "ok", "result": [{"file": self.allocations_path,
+                                                           "errors": 9}]} )
+
+    def test_incremental_reload( self ):
+        """
+        Verifies only the chunks that changed are reparsed when a file changes.
+        """
+
+        # write enough days to span several chunks.
+        day = datetime.date( 2024, 1, 1 )
+        with open( self.allocations_path, "w" ) as allocations_file:
+            for _ in range( 1000 ):
+                allocations_file.write( "{:s} {:d}/{:d}\ncategory1: 1 hour\n".format( day.strftime( "%A" ),
+                                                                                      day.month,
+                                                                                      day.day ) )
+                day += datetime.timedelta( days=1 )
+
+        cache  = daemon_module.AllocationsCache()
+        chunks = cache.load( self.allocations_path, 2024 )
+
+        self.assertEqual( len( chunks ), 2 )
+        self.assertEqual( sum( chunk.number_errors() for chunk in chunks ), 0 )
+
+        # append a day in the following year and make sure the first chunk is
+        # reused while the year carries into the last one.
+        with open( self.allocations_path, "a" ) as allocations_file:
+            allocations_file.write( "{:s} {:d}/{:d}\ncategory2: 2 hours\n".format( day.strftime( "%A" ),
+                                                                                  day.month,
+                                                                                  day.day ) )
+        os.utime( self.allocations_path, ns=(0, 0) )
+
+        reloaded_chunks = cache.load( self.allocations_path, 2024 )
+
+        self.assertIs( reloaded_chunks[0], chunks[0] )
+        self.assertIsNot( reloaded_chunks[-1], chunks[-1] )
+        self.assertEqual( sum( chunk.number_errors() for chunk in reloaded_chunks ), 0 )
+        self.assertEqual( sum( sum( chunk.summarize( start=day, end=day ).values() )
+                               for chunk in reloaded_chunks ),
+                          2.0 )
+
+        # changing the first day reparses everything.
+        with open( self.allocations_path, "r+" ) as allocations_file:
+            allocations_file.write( "Monday 1/1\ncategory3: 1 hour\n" )
+        os.utime( self.allocations_path, ns=(1, 1) )
+
+        self.assertIsNot( cache.load( self.allocations_path, 2024 )[0], chunks[0] )
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+class TestCommandLine( unittest.TestCase ):
+    """
+    """
+
+    ALLOCATIONS_STRING = ("Monday 1/1\n" +
+                          "category1 (subcategoryA): 1.5 hours\n" +
+                          "category1 (subcategoryB): 0.5 hours\n" +
+                          "category2: 1 hour\n" +
+                          "Tuesday 2/2\n" +
+                          "category1 (subcategoryA): 2 hours\n")
+
+    # the command line is run as a module so it needs to be run from the
+    # directory containing the package.
+    PACKAGE_PARENT = os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) )
+
+    def run_command( self, arguments, allocations_string ):
+        """
+        Runs the command line with the supplied arguments against a temporary
+        allocations file.  Returns the completed process.
+        """
+
+        with tempfile.NamedTemporaryFile( "w", suffix=".txt", delete=False ) as allocations_file:
+            allocations_file.write( allocations_string )
+
+        try:
+            return subprocess.run( [sys.executable, "-m", "time_allocations"] + arguments + [allocations_file.name],
+                                   cwd=self.PACKAGE_PARENT,
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE,
+                                   universal_newlines=True )
+        finally:
+            os.unlink( allocations_file.name )
+
+    def test_summary( self ):
+        """
+        Verifies summaries at different depths, restricted to a category and
+        month.
+        """
+
+        process = self.run_command( ["summary"], self.ALLOCATIONS_STRING )
+        self.assertEqual( process.returncode, 0 )
+        self.assertEqual( process.stdout.splitlines(),
+                          ["    4.00  category1",
+                           "    1.00  category2",
+                           "    5.00  (total)"] )
+
+        process = self.run_command( ["summary", "-d", "2", "-c", "category1", "-m", "1"],
+                                    self.ALLOCATIONS_STRING )
+        self.assertEqual( process.returncode, 0 )
+        self.assertEqual( process.stdout.splitlines(),
+                          ["    1.50  category1 (subcategoryA)",
+                           "    0.50  category1 (subcategoryB)",
+                           "    2.00  (total)"] )
+
+    def test_top( self ):
+        """
+        Verifies the top categories are reported per window.
+        """
+
+        process = self.run_command( ["top", "-k", "1", "-w", "month"], self.ALLOCATIONS_STRING )
+        self.assertEqual( process.returncode, 0 )
+        self.assertEqual( process.stdout.splitlines(),
+                          ["01",
+                           "    2.00  category1",
+                           "02",
+                           "    2.00  category1"] )
+
+    def test_export( self ):
+        """
+        Verifies CSV and JSON Lines exports.
+        """
+
+        process = self.run_command( ["export"], self.ALLOCATIONS_STRING )
+        self.assertEqual( process.returncode, 0 )
+        self.assertEqual( process.stdout.splitlines(),
+                          ["level_00,level_01,date,duration,datetime",
+                           "category1,subcategoryA,1/1,1.5,",
+                           "category1,subcategoryB,1/1,0.5,",
+                           "category2,,1/1,1.0,",
+                           "category1,subcategoryA,2/2,2.0,"] )
+
+        process = self.run_command( ["export", "-f", "jsonl"], self.ALLOCATIONS_STRING )
+        self.assertEqual( process.returncode, 0 )
+        self.assertEqual( len( process.stdout.splitlines() ), 4 )
+
+        # ISO dates are only known with a year.
+        process = self.run_command( ["export", "-y", "2024"], "Monday 1/1\ncategory1: 1 hour\n" )
+        self.assertEqual( process.returncode, 0 )
+        self.assertEqual( process.stdout.splitlines(),
+                          ["level_00,date,duration,datetime",
+                           "category1,1/1,1.0,2024-01-01"] )
+
+    def test_validate( self ):
+        """
+        Verifies validation succeeds on valid allocations and fails when errors
+        are present, regardless of whether the errors come from dates or
+        allocations.
+        """
+
+        process = self.run_command( ["validate"], self.ALLOCATIONS_STRING )
+        self.assertEqual( process.returncode, 0 )
+        self.assertEqual( process.stdout, "0 errors in 1 file.\n" )
+
+        process = self.run_command( ["validate"],
+                                    self.ALLOCATIONS_STRING + "Monday 2/30\ncategory: XYZ hours\n" )
+        self.assertEqual( process.returncode, 1 )
+        self.assertEqual( process.stdout, "2 errors in 1 file.\n" )
+        self.assertEqual( len( process.stderr.splitlines() ), 2 )
+
+        # allocations without a date are errors rather than crashes.
+        process = self.run_command( ["validate"], "category: 1 hour\n" )
+        self.assertEqual( process.returncode, 1 )
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,16 @@
 #!/usr/bin/env python
 
+import asyncio
+import datetime
+import importlib.util
+import io
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import threading
 import unittest
 
 import allocations as allocations_module
@@ -205,6 +216,51 @@ class TestAllocationValidAllocations( unittest.TestCase ):
         allocation.parse( self.VALID_DATE_STRING + duration_notes_3_string )
         allocation.parse( self.VALID_DATE_STRING + duration_notes_4_string )
 
+class TestAllocationTimelines( unittest.TestCase ):
+    """
+    """
+
+    def test_timelines( self ):
+        """
+        Verifies that timelines are parsed into per-day ranges, including open
+        ranges and ranges spanning midnight, and are compared against each day's
+        allocations.
+        """
+
+        allocation = allocations_module.Allocations( None,
+                                                     configuration=allocations_module.AllocationsConfig( strict_parsing=True ) )
+
+        allocation.parse( "07:00-08:00\n" +
+                          "Monday 1/1\n" +
+                          "07:00-08:00 (1 hour)\n" +
+                          "09:15-12:00 13:00-\n" +
+                          "category: 3.75 hours\n" +
+                          "Tuesday 1/2\n" +
+                          "23:00-01:00 (2 hours)\n" +
+                          "category: 1.5 hours\n" +
+                          "Wednesday 1/3\n" +
+                          "category: 1 hour\n" )
+
+        timelines = allocation.timelines()
+        self.assertEqual( [(date, list( starts ), list( ends ), hours) for (date, starts, ends, hours) in timelines],
+                          [("1/1", [420, 555], [480, 720], 3.75),
+                           ("1/2", [1380], [1500], 2.0)] )
+
+        self.assertEqual( allocation.timeline_discrepancies(),
+                          [("1/2", 2.0, 1.5)] )
+        self.assertEqual( allocation.timeline_discrepancies( tolerance=0.5 ),
+                          [] )
+
+        # malformed times are flagged.
+        with self.assertRaisesRegex( ValueError,
+                                     re.escape( "{:s}:2 - Timeline has an invalid time (25:00)".format(
+                                         allocations_module.STRING_INPUT_LABEL ) ) ):
+            allocation.parse( "Monday 1/1\n25:00-26:00\n" )
+        with self.assertRaisesRegex( ValueError,
+                                     re.escape( "{:s}:2 - Timeline has an open range before its end".format(
+                                         allocations_module.STRING_INPUT_LABEL ) ) ):
+            allocation.parse( "Monday 1/1\n07:00- 08:00-09:00\n" )
+
 class TestAllocationAllocationNormalizations( unittest.TestCase ):
     """
     """
@@ -768,5 +824,1526 @@ class TestAllocationInvalidAllocations( unittest.TestCase ):
                                          self.FIRST_INVALID_LINE_NUMBER ) ) ):
             allocation.parse( self.VALID_DATE_STRING + unnested_subcategory_2_string )
 
+class TestAllocationErrorCollection( unittest.TestCase ):
+    """
+    """
+
+    INVALID_ALLOCATIONS_STRING = ("category: 1 hour\n" +
+                                  "Monday 1/1\n" +
+                                  "category: XYZ hours\n" +
+                                  "  category: 1 minute  # comment\n" +
+                                  "category: -1 hours\n" +
+                                  "Monday 2/30\n")
+
+    def test_errors_recorded( self ):
+        """
+        Verifies that non-strict parsing records structured errors rather than
+        reporting them.
+        """
+
+        allocation = allocations_module.Allocations( self.INVALID_ALLOCATIONS_STRING )
+
+        self.assertEqual( allocation.number_errors(), 5 )
+        self.assertEqual( allocation.errors(),
+                          [allocations_module.ParseError( allocations_module.STRING_INPUT_LABEL, 1,
+                                                          allocations_module.Allocations.ERROR_ALLOCATION_UNDATED,
+                                                          "Cannot record allocations without a date",
+                                                          (0, 16) ),
+                           allocations_module.ParseError( allocations_module.STRING_INPUT_LABEL, 3,
+                                                          allocations_module.Allocations.ERROR_ALLOCATION_DURATION,
+                                                          "Allocation has invalid duration",
+                                                          (0, 19) ),
+                           allocations_module.ParseError( allocations_module.STRING_INPUT_LABEL, 4,
+                                                          allocations_module.Allocations.ERROR_ALLOCATION_UNITS,
+                                                          "Allocation has wrong units - expected \"hours\" but received \"minute\"",
+                                                          (2, 20) ),
+                           allocations_module.ParseError( allocations_module.STRING_INPUT_LABEL, 5,
+                                                          allocations_module.Allocations.ERROR_ALLOCATION_DURATION,
+                                                          "Allocation has invalid duration",
+                                                          (0, 18) ),
+                           allocations_module.ParseError( allocations_module.STRING_INPUT_LABEL, 6,
+                                                          allocations_module.Allocations.ERROR_DATE_INVALID,
+                                                          "Date is invalid (2/30)",
+                                                          (0, 11) )] )
+
+        allocation.clear()
+        self.assertEqual( allocation.errors(), [] )
+
+    def test_errors_bounded( self ):
+        """
+        Verifies the maximum number of errors recorded, error deduplication, and
+        aborting after too many errors.
+        """
+
+        allocation = allocations_module.Allocations( self.INVALID_ALLOCATIONS_STRING,
+                                                     configuration=allocations_module.AllocationsConfig( max_errors=2 ) )
+        self.assertEqual( allocation.number_errors(), 5 )
+        self.assertEqual( [error.line_number for error in allocation.errors()], [1, 3] )
+
+        allocation = allocations_module.Allocations( self.INVALID_ALLOCATIONS_STRING,
+                                                     configuration=allocations_module.AllocationsConfig( deduplicate_errors=True ) )
+        self.assertEqual( allocation.number_errors(), 5 )
+        self.assertEqual( [error.line_number for error in allocation.errors()], [1, 3, 4, 6] )
+
+        allocation = allocations_module.Allocations( None,
+                                                     configuration=allocations_module.AllocationsConfig( abort_after_errors=3 ) )
+        with self.assertRaisesRegex( ValueError,
+                                     re.escape( "{:s}:4 - Too many errors (3)".format(
+                                         allocations_module.STRING_INPUT_LABEL ) ) ):
+            allocation.parse( self.INVALID_ALLOCATIONS_STRING )
+        self.assertEqual( len( allocation.errors() ), 3 )
+
+class TestAllocationStatistics( unittest.TestCase ):
+    """
+    """
+
+    def test_statistics( self ):
+        """
+        Verifies that statistics are only collected when requested and that each
+        kind of line is counted.
+        """
+
+        allocations_string = ("# comment\n" +
+                              "category: 1 hour\n" +
+                              "Monday 1/1\n" +
+                              "07:00-08:00\n" +
+                              "category: 1 hour\n" +
+                              "category: XYZ hours\n" +
+                              "\n" +
+                              "free-form notes\n" +
+                              "Monday 2/30\n")
+
+        allocation = allocations_module.Allocations( allocations_string )
+        self.assertIsNone( allocation.statistics() )
+
+        allocation = allocations_module.Allocations( allocations_string,
+                                                     configuration=allocations_module.AllocationsConfig( collect_statistics=True ) )
+        statistics = allocation.statistics()
+
+        self.assertEqual( {name: statistics[name] for name in ["lines_read",
+                                                               "blank_lines",
+                                                               "comment_lines",
+                                                               "ignored_lines",
+                                                               "dates_accepted",
+                                                               "dates_rejected",
+                                                               "allocations_accepted",
+                                                               "allocations_rejected",
+                                                               "timelines_accepted",
+                                                               "timelines_rejected"]},
+                          {"lines_read": 9,
+                           "blank_lines": 1,
+                           "comment_lines": 1,
+                           "ignored_lines": 1,
+                           "dates_accepted": 1,
+                           "dates_rejected": 1,
+                           "allocations_accepted": 1,
+                           "allocations_rejected": 2,
+                           "timelines_accepted": 1,
+                           "timelines_rejected": 0} )
+        self.assertGreater( statistics["is_valid_allocation_seconds"], 0 )
+        self.assertEqual( statistics["sources"][allocations_module.STRING_INPUT_LABEL]["lines"], 9 )
+
+        allocation.clear()
+        self.assertEqual( allocation.statistics()["lines_read"], 0 )
+
+class TestAllocationMemoryUsage( unittest.TestCase ):
+    """
+    """
+
+    def test_memory_usage( self ):
+        """
+        Verifies the memory footprint breakdown is consistent and reflects the
+        records parsed.
+        """
+
+        allocations_string = ("Monday 1/1\n" +
+                              "category1 (subcategoryA): 1 hour\n" +
+                              "category2: 2 hours\n" +
+                              "Tuesday 1/2\n" +
+                              "category1: XYZ hours\n")
+
+        allocation = allocations_module.Allocations( allocations_string )
+
+        shallow_usage = allocation.memory_usage( deep=False )
+        deep_usage    = allocation.memory_usage()
+
+        self.assertEqual( set( deep_usage ),
+                          {"records", "categories", "dates", "timelines", "errors", "statistics", "snapshot",
+                           "partition_index", "weekday_tables", "total"} )
+        for usage in (shallow_usage, deep_usage):
+            self.assertEqual( usage["total"],
+                              sum( size for name, size in usage.items() if name != "total" ) )
+        self.assertGreater( deep_usage["total"], shallow_usage["total"] )
+
+        # more records take more memory.
+        allocation.parse( allocations_string * 10 )
+        self.assertGreater( allocation.memory_usage()["records"], deep_usage["records"] )
+
+        # the partition index is only counted once it has been built.
+        self.assertEqual( allocation.memory_usage()["partition_index"], 0 )
+        allocation.partitions()
+        self.assertGreater( allocation.memory_usage()["partition_index"], 0 )
+
+        # weekday tables are built as years are parsed.
+        allocation.parse( "Monday 1/1\ncategory1: 1 hour\n", current_year=2024 )
+        self.assertGreater( allocation.memory_usage()["weekday_tables"], 0 )
+
+class TestAllocationDayBlockValidation( unittest.TestCase ):
+    """
+    """
+
+    ALLOCATIONS_LINES = ["category: 1 hour",                  # 1
+                         "Monday 1/1",                        # 2
+                         "category: 1 hour",                  # 3
+                         "category (): 1 hour",               # 4
+                         "",                                  # 5
+                         "Tuesday 1/2",                       # 6
+                         "category: XYZ hours",               # 7
+                         "07:00-08:00 (1 hour)",              # 8
+                         "Wednesday 1/3",                     # 9
+                         "category: 1 hour",                  # 10
+                         "Thursday 2/30"]                     # 11
+
+    def test_block_expansion( self ):
+        """
+        Verifies that changed lines are expanded to the day blocks containing
+        them and that only those blocks are validated.
+        """
+
+        # a change in the middle of a day validates the entire day.
+        first_line_number, last_line_number, errors = allocations_module.validate_day_blocks( self.ALLOCATIONS_LINES, 7 )
+        self.assertEqual( (first_line_number, last_line_number), (6, 8) )
+        self.assertEqual( errors,
+                          [allocations_module.ParseError( allocations_module.STRING_INPUT_LABEL,
+                                                          7,
+                                                          allocations_module.Allocations.ERROR_ALLOCATION_DURATION,
+                                                          "Allocation has invalid duration",
+                                                          (0, 19) )] )
+
+        # a change spanning days validates each of them.  invalid dates do not
+        # start a new day.
+        first_line_number, last_line_number, errors = allocations_module.validate_day_blocks( self.ALLOCATIONS_LINES, 4, 9 )
+        self.assertEqual( (first_line_number, last_line_number), (2, 11) )
+        self.assertEqual( [error.line_number for error in errors], [4, 7, 11] )
+
+        # changes to a date line validate the day it starts.
+        first_line_number, last_line_number, errors = allocations_module.validate_day_blocks( self.ALLOCATIONS_LINES, 6 )
+        self.assertEqual( (first_line_number, last_line_number), (6, 8) )
+        self.assertEqual( [error.message for error in errors], ["Allocation has invalid duration"] )
+
+        # allocations before the first date are reported.
+        first_line_number, last_line_number, errors = allocations_module.validate_day_blocks( "\n".join( self.ALLOCATIONS_LINES ), 1 )
+        self.assertEqual( (first_line_number, last_line_number), (1, 1) )
+        self.assertEqual( [error.message for error in errors], ["Cannot record allocations without a date"] )
+
+class TestAllocationAsyncLoad( unittest.TestCase ):
+    """
+    """
+
+    def test_aload_matches_parse( self ):
+        """
+        Verifies that loading asynchronously in small, day-aligned chunks produces
+        the same allocations, and the same error line numbers, as parsing in one
+        go.
+        """
+
+        allocations_string = ("Monday 1/1\n" +
+                              "category1 (subcategoryA): 1 hour\n" +
+                              "category2: 2 hours\n" +
+                              "Tuesday 1/2\n" +
+                              "category1: XYZ hours\n" +
+                              "category2: 3 hours\n" +
+                              "Wednesday 1/3\n" +
+                              "category3: 0.5 hours\n") * 3
+
+        with tempfile.NamedTemporaryFile( "w", suffix=".txt", delete=False ) as allocations_file:
+            allocations_file.write( allocations_string )
+
+        try:
+            strict_config = allocations_module.AllocationsConfig( strict_parsing=True )
+
+            with self.assertRaisesRegex( ValueError,
+                                         re.escape( "{:s}:5 - Allocation has invalid duration".format(
+                                             allocations_file.name ) ) ):
+                asyncio.run( allocations_module.Allocations.aload( [allocations_file.name],
+                                                                   configuration=strict_config,
+                                                                   chunk_size=2 ) )
+
+            allocation = asyncio.run( allocations_module.Allocations.aload( [allocations_file.name, allocations_file.name],
+                                                                            chunk_size=2 ) )
+        finally:
+            os.unlink( allocations_file.name )
+
+        expected_allocation = allocations_module.Allocations()
+        expected_allocation.parse( allocations_string )
+        expected_allocation.parse( allocations_string )
+
+        self.assertEqual( list( allocation.records() ),
+                          list( expected_allocation.records() ) )
+        self.assertEqual( allocation.number_errors(), 6 )
+
+class TestAllocationYears( unittest.TestCase ):
+    """
+    """
+
+    ALLOCATIONS_STRING = ("Saturday 12/30\n" +
+                          "category1: 1 hour\n" +
+                          "Sunday 12/31\n" +
+                          "category2: 2 hours\n" +
+                          "Monday 1/1\n" +
+                          "category1: 3 hours\n" +
+                          "Thursday 2/29\n" +
+                          "category2: 4 hours\n")
+
+    def test_weekdays_validated( self ):
+        """
+        Verifies dates are validated against the year's calendar when a year is
+        supplied.
+        """
+
+        strict_config = allocations_module.AllocationsConfig( default_year=2023, strict_parsing=True )
+        allocation    = allocations_module.Allocations( configuration=strict_config )
+
+        allocation.parse( "Tuesday 1/3\n" )
+
+        with self.assertRaisesRegex( ValueError,
+                                     re.escape( "{:s}:1 - Weekday does not match date (1/3/2023 is a Tuesday)".format(
+                                         allocations_module.STRING_INPUT_LABEL ) ) ):
+            allocation.parse( "Monday 1/3\n" )
+
+        with self.assertRaisesRegex( ValueError,
+                                     re.escape( "{:s}:1 - Date is invalid (2/29/2023)".format(
+                                         allocations_module.STRING_INPUT_LABEL ) ) ):
+            allocation.parse( "Wednesday 2/29\n" )
+
+        # an explicit year overrides the configured year.
+        allocation.parse( "Thursday 2/29\n", current_year=2024 )
+
+    def test_year_rollover( self ):
+        """
+        Verifies the year rolls over when dates wrap around, including when the
+        wrap falls between the chunks parsed by aload().
+        """
+
+        configuration = allocations_module.AllocationsConfig( default_year=2023, strict_parsing=True )
+        allocation    = allocations_module.Allocations( self.ALLOCATIONS_STRING, configuration=configuration )
+
+        expected_dates = [("12/30", datetime.date( 2023, 12, 30 )),
+                          ("12/31", datetime.date( 2023, 12, 31 )),
+                          ("1/1",   datetime.date( 2024, 1, 1 )),
+                          ("2/29",  datetime.date( 2024, 2, 29 ))]
+
+        self.assertEqual( allocation.dates(), expected_dates )
+
+        with tempfile.NamedTemporaryFile( "w", suffix=".txt", delete=False ) as allocations_file:
+            allocations_file.write( self.ALLOCATIONS_STRING )
+
+        try:
+            allocation = asyncio.run( allocations_module.Allocations.aload( [allocations_file.name],
+                                                                            configuration=configuration,
+                                                                            chunk_size=2 ) )
+        finally:
+            os.unlink( allocations_file.name )
+
+        self.assertEqual( allocation.dates(), expected_dates )
+
+        # without a year, dates aren't resolved.
+        allocation = allocations_module.Allocations( self.ALLOCATIONS_STRING )
+        self.assertEqual( allocation.dates(),
+                          [(date_string, None) for (date_string, _) in expected_dates] )
+
+    def test_malformed_dates_after_rollover( self ):
+        """
+        Verifies malformed date-like lines following a date are recorded as errors
+        rather than considered for a rollover.
+        """
+
+        configuration = allocations_module.AllocationsConfig( default_year=2015 )
+
+        for allocations_string in ["Thursday 12/31\nx: 1 hour\nmonday 1/\n",
+                                   "Thursday 12/31\nFoo /5\n"]:
+            allocation = allocations_module.Allocations( allocations_string, configuration=configuration )
+
+            self.assertEqual( allocation.number_errors(), 1 )
+            self.assertEqual( allocation.dates(), [("12/31", datetime.date( 2015, 12, 31 ))] )
+
+class TestAllocationFixedPointDurations( unittest.TestCase ):
+    """
+    """
+
+    def test_exact_totals( self ):
+        """
+        Verifies fixed point durations total exactly and are exported as hours.
+        """
+
+        allocations_string = ("Monday 1/1\n" +
+                              "category1: 0.1 hours\n" +
+                              "category2 (subcategoryA): 1.25 hours\n" +
+                              "category1: .05 hours\n") * 1000
+
+        floating_allocation = allocations_module.Allocations( allocations_string )
+        self.assertNotEqual( floating_allocation.summarize()[("category1",)], 150.0 )
+
+        for scale in [allocations_module.Allocations.DURATION_SCALE_MINUTES,
+                      allocations_module.Allocations.DURATION_SCALE_HUNDREDTHS]:
+            configuration = allocations_module.AllocationsConfig( duration_scale=scale )
+            allocation    = allocations_module.Allocations( allocations_string, configuration=configuration )
+
+            self.assertEqual( allocation.summarize( max_depth=2 ),
+                              {("category1",): 150.0,
+                               ("category2", "subcategoryA"): 1250.0} )
+            self.assertEqual( list( allocation.records() ),
+                              list( floating_allocation.records() ) )
+
+    def test_rounding( self ):
+        """
+        Verifies durations that aren't a whole number of units are rounded to the
+        nearest unit.
+        """
+
+        self.assertEqual( allocations_module.Allocations._fixed_point_duration( "0.333", 60 ), 20 )
+        self.assertEqual( allocations_module.Allocations._fixed_point_duration( "0.005", 100 ), 1 )
+        self.assertEqual( allocations_module.Allocations._fixed_point_duration( "10.", 100 ), 1000 )
+        self.assertEqual( allocations_module.Allocations._fixed_point_duration( ".5", 60 ), 30 )
+
+    def test_rounds_to_zero( self ):
+        """
+        Verifies durations that round to zero units are rejected rather than
+        recorded without any time.
+        """
+
+        allocations_string = ("Monday 1/1\n" +
+                              "category1: 0.001 hours\n" +
+                              "category2: 0.01 hours\n")
+
+        configuration = allocations_module.AllocationsConfig( collect_statistics=True,
+                                                              duration_scale=allocations_module.Allocations.DURATION_SCALE_MINUTES )
+        allocation    = allocations_module.Allocations( allocations_string, configuration=configuration )
+
+        self.assertEqual( allocation.summarize(), {("category2",): 1 / 60} )
+        self.assertEqual( [(error.line_number, error.code) for error in allocation.errors()],
+                          [(2, allocations_module.Allocations.ERROR_ALLOCATION_DURATION)] )
+        self.assertEqual( allocation.statistics()["allocations_rejected"], 1 )
+
+        configuration = allocations_module.AllocationsConfig( strict_parsing=True,
+                                                              duration_scale=allocations_module.Allocations.DURATION_SCALE_MINUTES )
+        with self.assertRaisesRegex( ValueError, re.escape( "Allocation duration rounds to zero (60 units per hour)" ) ):
+            allocations_module.Allocations( allocations_string, configuration=configuration )
+
+        # floating point durations can underflow to zero as well.
+        allocation = allocations_module.Allocations( "Monday 1/1\n" +
+                                                     "category1: 0.{:s}1 hours\n".format( "0" * 400 ) +
+                                                     "category2: 0.01 hours\n" )
+
+        self.assertEqual( allocation.summarize(), {("category2",): 0.01} )
+        self.assertEqual( [(error.line_number, error.code, error.message) for error in allocation.errors()],
+                          [(2, allocations_module.Allocations.ERROR_ALLOCATION_DURATION, "Allocation duration rounds to zero")] )
+
+class TestAllocationStreaming( unittest.TestCase ):
+    """
+    """
+
+    def test_top_categories( self ):
+        """
+        Verifies streamed top categories agree with summaries of each window,
+        regardless of how the allocations are chunked.
+        """
+
+        allocations_string = ("Friday 12/30\n" +
+                              "category1 (subcategoryA): 1 hour\n" +
+                              "category2: 2 hours\n" +
+                              "Saturday 12/31\n" +
+                              "category3: 4 hours\n" +
+                              "Sunday 1/1\n" +
+                              "category1 (subcategoryB): 3 hours\n" +
+                              "category2: 1 hour\n" +
+                              "Saturday 4/1\n" +
+                              "category2: 5 hours\n")
+
+        configuration = allocations_module.AllocationsConfig( default_year=2022, strict_parsing=True )
+
+        for chunk_size in [1, 3, 100]:
+            chunks = allocations_module.Allocations.stream( allocations_string,
+                                                            configuration=configuration,
+                                                            chunk_size=chunk_size )
+
+            self.assertEqual( list( allocations_module.top_categories( chunks, 2 ) ),
+                              [("2022-Q4", [(("category3",), 4.0),
+                                            (("category2",), 2.0)]),
+                               ("2023-Q1", [(("category1",), 3.0),
+                                            (("category2",), 1.0)]),
+                               ("2023-Q2", [(("category2",), 5.0)])] )
+
+        # without a year, windows aren't labeled with one.
+        chunks = allocations_module.Allocations.stream( allocations_string, chunk_size=3 )
+        self.assertEqual( list( allocations_module.top_categories( chunks,
+                                                                   1,
+                                                                   window=allocations_module.Allocations.WINDOW_MONTH,
+                                                                   max_depth=2,
+                                                                   categories=("category1",) ) ),
+                          [("12", [(("category1", "subcategoryA"), 1.0)]),
+                           ("01", [(("category1", "subcategoryB"), 3.0)])] )
+
+        with self.assertRaisesRegex( ValueError,
+                                     re.escape( "Yearly windows require dates with a year (12/30)" ) ):
+            list( allocations_module.top_categories( allocations_module.Allocations.stream( allocations_string ),
+                                                     1,
+                                                     window=allocations_module.Allocations.WINDOW_YEAR ) )
+
+        with self.assertRaisesRegex( ValueError, re.escape( "K must be positive (0)" ) ):
+            list( allocations_module.top_categories( allocations_module.Allocations.stream( allocations_string ), 0 ) )
+
+        # totals can't mix durations stored in different units.
+        fixed_configuration = allocations_module.AllocationsConfig( duration_scale=allocations_module.Allocations.DURATION_SCALE_MINUTES )
+        with self.assertRaisesRegex( ValueError, re.escape( "Chunks must have the same duration scale (None and 60)" ) ):
+            list( allocations_module.top_categories( [allocations_module.Allocations( allocations_string ),
+                                                      allocations_module.Allocations( allocations_string,
+                                                                                      configuration=fixed_configuration )],
+                                                     1 ) )
+
+class TestAllocationDiff( unittest.TestCase ):
+    """
+    """
+
+    def test_diff( self ):
+        """
+        Verifies added, removed, and modified days are identified along with their
+        records, and that formatting changes aren't reported.
+        """
+
+        old_allocation = allocations_module.Allocations( "Monday 1/1\n" +
+                                                         "category1 (subcategoryA): 1 hour\n" +
+                                                         "category2: 2 hours\n" +
+                                                         "Tuesday 1/2\n" +
+                                                         "category1: 1 hour\n" +
+                                                         "category2: 1 hour\n" +
+                                                         "Wednesday 1/3\n" +
+                                                         "category3: 1 hour\n" )
+        new_allocation = allocations_module.Allocations( "Monday 1/1\n" +
+                                                         "category1  (subcategoryA):  1.0 hours # note\n" +
+                                                         "category2: 2 hours\n" +
+                                                         "Tuesday 1/2\n" +
+                                                         "category1: 1 hour\n" +
+                                                         "category2: 1.5 hours\n" +
+                                                         "Thursday 1/4\n" +
+                                                         "category3: 2 hours\n" )
+
+        self.assertEqual( old_allocation.diff( old_allocation ),
+                          ([], [], [], [], []) )
+        self.assertEqual( old_allocation.diff( new_allocation ),
+                          allocations_module.AllocationsDiff( added_days=["1/4"],
+                                                              removed_days=["1/3"],
+                                                              modified_days=["1/2"],
+                                                              added_records=[("1/2", ("category2",), 1.5),
+                                                                             ("1/4", ("category3",), 2.0)],
+                                                              removed_records=[("1/2", ("category2",), 1.0),
+                                                                               ("1/3", ("category3",), 1.0)] ) )
+
+    def test_diff_after_strict_error( self ):
+        """
+        Verifies days parsed before a strict parsing error are hashed so that
+        they can still be compared.
+        """
+
+        configuration = allocations_module.AllocationsConfig( strict_parsing=True )
+        allocation    = allocations_module.Allocations( configuration=configuration )
+
+        with self.assertRaisesRegex( ValueError, re.escape( "Allocation has invalid duration" ) ):
+            allocation.parse( "Monday 1/1\n" +
+                              "category1: 1 hour\n" +
+                              "Tuesday 1/2\n" +
+                              "category1: XYZ hours\n" )
+
+        self.assertEqual( len( allocation._day_hashes ), len( allocation._days ) )
+
+        allocation.parse( "Wednesday 1/3\ncategory1: 1 hour\n" )
+        other = allocations_module.Allocations( "Monday 1/1\n" +
+                                                "category1: 1 hour\n" +
+                                                "Tuesday 1/2\n" +
+                                                "Wednesday 1/3\n" +
+                                                "category1: 1 hour\n" )
+
+        self.assertEqual( allocation.diff( other ), ([], [], [], [], []) )
+
+    def test_hashes_across_processes( self ):
+        """
+        Verifies day hashes don't depend upon the process computing them, so they
+        can be compared against those shared or persisted by another process.
+        """
+
+        allocations_string = ("Monday 1/1\n" +
+                              "category1 (subcategoryA): 1 hour\n" +
+                              "category2: 2 hours\n" +
+                              "Tuesday 1/2\n" +
+                              "category1: 1 hour\n")
+
+        hashes_command = ("import allocations; " +
+                          "print( list( allocations.Allocations( {:s} )._day_hashes ) )".format( repr( allocations_string ) ))
+
+        process_hashes = []
+        for hash_seed in ["1", "2"]:
+            process = subprocess.run( [sys.executable, "-c", hashes_command],
+                                      cwd=os.path.dirname( os.path.abspath( __file__ ) ),
+                                      env=dict( os.environ, PYTHONHASHSEED=hash_seed ),
+                                      stdout=subprocess.PIPE,
+                                      check=True,
+                                      universal_newlines=True )
+            process_hashes.append( json.loads( process.stdout ) )
+
+        self.assertEqual( process_hashes[0],
+                          list( allocations_module.Allocations( allocations_string )._day_hashes ) )
+        self.assertEqual( process_hashes[0], process_hashes[1] )
+        self.assertEqual( len( set( process_hashes[0] ) ), 2 )
+
+class TestAllocationDuplicateDays( unittest.TestCase ):
+    """
+    """
+
+    FIRST_STRING  = ("Monday 1/1\n" +
+                     "category1: 1 hour\n" +
+                     "08:00-09:00\n" +
+                     "Tuesday 1/2\n" +
+                     "category2: 2 hours\n")
+    SECOND_STRING = ("Tuesday 1/2\n" +
+                     "category2: 3 hours\n" +
+                     "Wednesday 1/3\n" +
+                     "category3: 4 hours\n")
+
+    def parse_with_policy( self, policy, strict_parsing=False, second_owner=None ):
+        """
+        Parses both strings with the supplied duplicate days policy and returns
+        the Allocations object.
+        """
+
+        configuration = allocations_module.AllocationsConfig( strict_parsing=strict_parsing,
+                                                              duplicate_days=policy )
+        allocation    = allocations_module.Allocations( configuration=configuration )
+
+        allocation.parse( self.FIRST_STRING )
+        allocation.parse( self.SECOND_STRING, owner=second_owner )
+
+        return allocation
+
+    def test_policies( self ):
+        """
+        Verifies each duplicate days policy keeps the expected allocations.
+        """
+
+        allocation = self.parse_with_policy( allocations_module.Allocations.DUPLICATE_DAYS_KEEP_FIRST )
+        self.assertEqual( list( allocation.records() ),
+                          [("1/1", ("category1",), 1.0),
+                           ("1/2", ("category2",), 2.0),
+                           ("1/3", ("category3",), 4.0)] )
+        self.assertEqual( allocation.number_errors(), 0 )
+
+        allocation = self.parse_with_policy( allocations_module.Allocations.DUPLICATE_DAYS_KEEP_LAST )
+        self.assertEqual( list( allocation.records() ),
+                          [("1/1", ("category1",), 1.0),
+                           ("1/2", ("category2",), 3.0),
+                           ("1/3", ("category3",), 4.0)] )
+        self.assertEqual( [date_string for (date_string, _) in allocation.dates()],
+                          ["1/1", "1/2", "1/3"] )
+        self.assertEqual( [(date_string, list( starts ), list( ends ))
+                           for (date_string, starts, ends, _) in allocation.timelines()],
+                          [("1/1", [480], [540])] )
+
+        allocation = self.parse_with_policy( allocations_module.Allocations.DUPLICATE_DAYS_SUM )
+        self.assertEqual( allocation.summarize(),
+                          {("category1",): 1.0,
+                           ("category2",): 5.0,
+                           ("category3",): 4.0} )
+
+        allocation = self.parse_with_policy( allocations_module.Allocations.DUPLICATE_DAYS_ERROR )
+        self.assertEqual( allocation.summarize(),
+                          {("category1",): 1.0,
+                           ("category2",): 2.0,
+                           ("category3",): 4.0} )
+        self.assertEqual( [(error.line_number, error.code) for error in allocation.errors()],
+                          [(1, allocations_module.Allocations.ERROR_DATE_DUPLICATE)] )
+
+        with self.assertRaisesRegex( ValueError,
+                                     re.escape( "{:s}:1 - Day was already recorded (1/2)".format(
+                                         allocations_module.STRING_INPUT_LABEL ) ) ):
+            self.parse_with_policy( allocations_module.Allocations.DUPLICATE_DAYS_ERROR,
+                                    strict_parsing=True )
+
+        # days of different owners aren't duplicates.
+        allocation = self.parse_with_policy( allocations_module.Allocations.DUPLICATE_DAYS_ERROR,
+                                             second_owner="someone else" )
+        self.assertEqual( allocation.number_errors(), 0 )
+        self.assertEqual( allocation.summarize()[("category2",)], 5.0 )
+
+class TestAllocationCategoryNormalization( unittest.TestCase ):
+    """
+    """
+
+    def test_normalization( self ):
+        """
+        Verifies categories are rewritten, case-folded, and aliased at parse time,
+        and that summaries are restricted with normalized categories.
+        """
+
+        allocations_string = ("Monday 1/1\n" +
+                              "Proj X (Design): 1 hour\n" +
+                              "ProjectX (design): 2 hours\n" +
+                              "projectx  (DESIGN): 3 hours\n" +
+                              "Other (Proj X): 4 hours\n")
+
+        configuration = allocations_module.AllocationsConfig( category_aliases={"proj x": "ProjectX",
+                                                                                "projectx": "ProjectX"},
+                                                              casefold_categories=True,
+                                                              category_rewrites=[(r"\s+", " ")] )
+        allocation    = allocations_module.Allocations( allocations_string, configuration=configuration )
+
+        self.assertEqual( allocation.summarize( max_depth=2 ),
+                          {("ProjectX", "design"): 6.0,
+                           ("other", "ProjectX"): 4.0} )
+        self.assertEqual( allocation.summarize( categories=("Proj  X",) ),
+                          {("ProjectX",): 6.0} )
+        self.assertEqual( list( allocations_module.top_categories( [allocation], 2, categories=("Proj  X",) ) ),
+                          [("Q1", [(("ProjectX",), 6.0)])] )
+
+        # identical categories share storage.
+        records = list( allocation.records() )
+        self.assertIs( records[0][1], records[1][1] )
+        self.assertIs( records[0][1][0], records[3][1][1] )
+
+        # without normalization, categories are as written.
+        allocation = allocations_module.Allocations( allocations_string )
+        self.assertEqual( len( allocation.summarize() ), 4 )
+
+class TestAllocationSnapshots( unittest.TestCase ):
+    """
+    """
+
+    DAY_STRING = ("Monday 1/1\n" +
+                  "category1 (subcategoryA): 1 hour\n" +
+                  "category2: 2 hours\n")
+
+    def test_snapshot_isolation( self ):
+        """
+        Verifies snapshots are unaffected by later parses and can't be modified.
+        """
+
+        allocation = allocations_module.Allocations( self.DAY_STRING )
+        snapshot   = allocation.snapshot()
+
+        self.assertIs( allocation.snapshot(), snapshot )
+
+        allocation.parse( self.DAY_STRING )
+        self.assertEqual( len( list( snapshot.records() ) ), 2 )
+        self.assertEqual( len( list( allocation.snapshot().records() ) ), 4 )
+
+        allocation.clear()
+        self.assertEqual( len( list( snapshot.records() ) ), 2 )
+        self.assertEqual( list( allocation.snapshot().records() ), [] )
+
+        with self.assertRaisesRegex( ValueError, re.escape( "Snapshots cannot be modified" ) ):
+            snapshot.parse( self.DAY_STRING )
+        with self.assertRaisesRegex( ValueError, re.escape( "Snapshots cannot be modified" ) ):
+            snapshot.clear()
+
+    def test_snapshot_views( self ):
+        """
+        Verifies snapshots view the parsed allocations rather than copying them
+        and answer queries like the allocations they were taken from.
+        """
+
+        configuration = allocations_module.AllocationsConfig( default_year=2024 )
+        allocation    = allocations_module.Allocations( ("Monday 1/1\n" +
+                                                         "09:00-10:30\n" +
+                                                         "category1 (subcategoryA): 1.5 hours\n" +
+                                                         "category2: XYZ hours\n" +
+                                                         "Tuesday 1/2\n" +
+                                                         "category2: 2 hours\n"),
+                                                        configuration=configuration )
+        snapshot      = allocation.snapshot()
+
+        self.assertIs( snapshot._allocations._container, allocation._allocations )
+        self.assertIs( snapshot._durations._container, allocation._durations )
+
+        self.assertEqual( list( snapshot.records() ), list( allocation.records() ) )
+        self.assertEqual( snapshot.summarize( max_depth=2, categories=("category1",), start=datetime.date( 2024, 1, 1 ) ),
+                          allocation.summarize( max_depth=2, categories=("category1",), start=datetime.date( 2024, 1, 1 ) ) )
+        self.assertEqual( snapshot.dates(), allocation.dates() )
+        self.assertEqual( snapshot.errors(), allocation.errors() )
+        self.assertEqual( snapshot.partitions(), allocation.partitions() )
+        self.assertEqual( snapshot.timelines(), allocation.timelines() )
+        self.assertEqual( snapshot.diff( allocation ), ([], [], [], [], []) )
+        self.assertEqual( snapshot.daily_totals( datetime.date( 2024, 1, 1 ), datetime.date( 2024, 1, 2 ) ),
+                          allocation.daily_totals( datetime.date( 2024, 1, 1 ), datetime.date( 2024, 1, 2 ) ) )
+
+        # views only extend to the allocations published when they were taken.
+        allocation.parse( "Wednesday 1/3\ncategory3: 3 hours\n" )
+        self.assertEqual( len( snapshot._allocations ), 2 )
+        self.assertEqual( snapshot._durations[-1], 2.0 )
+        self.assertEqual( list( snapshot._durations[::-1] ), [2.0, 1.5] )
+        with self.assertRaises( IndexError ):
+            snapshot._durations[2]
+
+        snapshot_csv   = io.StringIO()
+        allocation_csv = io.StringIO()
+        snapshot.write_csv( snapshot_csv )
+        allocations_module.Allocations( "Monday 1/1\n" +
+                                        "category1 (subcategoryA): 1.5 hours\n" +
+                                        "Tuesday 1/2\n" +
+                                        "category2: 2 hours\n",
+                                        configuration=configuration ).write_csv( allocation_csv )
+        self.assertEqual( snapshot_csv.getvalue(), allocation_csv.getvalue() )
+
+        # snapshots can be published to other processes.
+        shared_block = snapshot.to_shared_memory()
+        attached     = None
+        try:
+            attached = allocations_module.Allocations.from_shared_memory( shared_block.name )
+            self.assertEqual( list( attached.records() ), list( snapshot.records() ) )
+        finally:
+            del attached
+            shared_block.close()
+            shared_block.unlink()
+
+        if importlib.util.find_spec( "pandas" ) is None:
+            return
+
+        self.assertEqual( list( snapshot.to_df()["duration"] ), [1.5, 2.0] )
+
+    def test_snapshot_caches( self ):
+        """
+        Verifies snapshots don't share the caches that change while parsing, so
+        they can be inspected while another thread parses.
+        """
+
+        allocation = allocations_module.Allocations()
+        allocation.parse( self.DAY_STRING )
+
+        snapshot = allocation.snapshot()
+        self.assertIsNot( snapshot._categories_cache, allocation._categories_cache )
+        self.assertIsNot( snapshot._error_codes, allocation._error_codes )
+
+        def parse_repeatedly():
+            for day_number in range( 2000 ):
+                allocation.parse( "Monday 1/1\ncategory{:d}: 1 hour\n".format( day_number ) )
+
+        parse_thread = threading.Thread( target=parse_repeatedly )
+        parse_thread.start()
+
+        try:
+            while parse_thread.is_alive():
+                usage = allocation.snapshot().memory_usage()
+                self.assertEqual( usage["total"],
+                                  sum( size for name, size in usage.items() if name != "total" ) )
+        finally:
+            parse_thread.join()
+
+    def test_snapshot_memory( self ):
+        """
+        Verifies the copy made for a snapshot is counted while the snapshot is in
+        use and is freed once readers are done with it.
+        """
+
+        allocation = allocations_module.Allocations( self.DAY_STRING * 100 )
+        self.assertEqual( allocation.memory_usage()["snapshot"], 0 )
+
+        snapshot = allocation.snapshot()
+        self.assertGreater( allocation.memory_usage()["snapshot"], 0 )
+        self.assertEqual( snapshot.memory_usage()["snapshot"], 0 )
+
+        del snapshot
+        self.assertEqual( allocation.memory_usage()["snapshot"], 0 )
+        self.assertEqual( len( list( allocation.snapshot().records() ) ), 200 )
+
+    def test_concurrent_snapshots( self ):
+        """
+        Verifies snapshots taken while another thread parses only contain whole
+        parses.
+        """
+
+        allocation  = allocations_module.Allocations()
+        days_string = self.DAY_STRING * 50
+
+        def parse_repeatedly():
+            for _ in range( 200 ):
+                allocation.parse( days_string )
+
+        parse_thread = threading.Thread( target=parse_repeatedly )
+        parse_thread.start()
+
+        try:
+            while parse_thread.is_alive():
+                snapshot    = allocation.snapshot()
+                number_days = len( snapshot.dates() )
+                records     = list( snapshot.records() )
+
+                self.assertEqual( number_days % 50, 0 )
+                self.assertEqual( len( records ), 2 * number_days )
+                self.assertEqual( sum( snapshot.summarize().values() ), 3.0 * number_days )
+        finally:
+            parse_thread.join()
+
+        self.assertEqual( len( allocation.snapshot().dates() ), 200 * 50 )
+
+class TestAllocationPartitions( unittest.TestCase ):
+    """
+    """
+
+    def test_partition_pruning( self ):
+        """
+        Verifies days are partitioned by year and owner and that restricted
+        summaries agree with filtering every allocation.
+        """
+
+        configuration = allocations_module.AllocationsConfig( default_year=2022 )
+        allocation    = allocations_module.Allocations( configuration=configuration )
+
+        allocation.parse( "Friday 12/30\n" +
+                          "category1 (subcategoryA): 1 hour\n" +
+                          "Monday 1/2\n" +
+                          "category1 (subcategoryB): 2 hours\n" +
+                          "Tuesday 1/3\n" +
+                          "category2: 4 hours\n",
+                          owner="alice" )
+        allocation.parse( "Friday 12/30\n" +
+                          "category3: 8 hours\n",
+                          owner="bob" )
+        allocation.parse( "Tuesday 1/3\n" +
+                          "category1: 16 hours\n",
+                          current_year=2023,
+                          owner="bob" )
+
+        self.assertEqual( allocation.partitions(),
+                          {(2022, "alice"): (datetime.date( 2022, 12, 30 ), datetime.date( 2022, 12, 30 ), 1,
+                                             frozenset( [("category1", "subcategoryA")] )),
+                           (2023, "alice"): (datetime.date( 2023, 1, 2 ), datetime.date( 2023, 1, 3 ), 2,
+                                             frozenset( [("category1", "subcategoryB"), ("category2",)] )),
+                           (2022, "bob"):   (datetime.date( 2022, 12, 30 ), datetime.date( 2022, 12, 30 ), 1,
+                                             frozenset( [("category3",)] )),
+                           (2023, "bob"):   (datetime.date( 2023, 1, 3 ), datetime.date( 2023, 1, 3 ), 1,
+                                             frozenset( [("category1",)] ))} )
+
+        self.assertEqual( allocation.summarize( owners=["bob"] ),
+                          {("category1",): 16.0,
+                           ("category3",): 8.0} )
+        self.assertEqual( allocation.summarize( start=datetime.date( 2023, 1, 3 ) ),
+                          {("category1",): 16.0,
+                           ("category2",): 4.0} )
+        self.assertEqual( allocation.summarize( max_depth=2,
+                                                categories=("category1",),
+                                                owners=["alice"],
+                                                end=datetime.date( 2023, 1, 2 ) ),
+                          {("category1", "subcategoryA"): 1.0,
+                           ("category1", "subcategoryB"): 2.0} )
+
+        # the index is extended as more days are parsed.
+        allocation.parse( "Wednesday 1/4\n" +
+                          "category3: 32 hours\n",
+                          current_year=2023,
+                          owner="alice" )
+        self.assertEqual( allocation.summarize( categories=("category3",), owners=["alice"] ),
+                          {("category3",): 32.0} )
+        self.assertEqual( allocation.partitions()[(2023, "alice")][1:3],
+                          (datetime.date( 2023, 1, 4 ), 3) )
+
+        # days without a year are never within a range of dates.
+        allocation = allocations_module.Allocations( "Monday 1/2\ncategory1: 1 hour\n" )
+        self.assertEqual( allocation.summarize( start=datetime.date( 2000, 1, 1 ) ), {} )
+
+class TestAllocationSharedMemory( unittest.TestCase ):
+    """
+    """
+
+    ALLOCATIONS_STRING = ("Monday 1/1\n" +
+                          "category1 (subcategoryA): 1.5 hours\n" +
+                          "category2: 1 hour\n" +
+                          "Tuesday 1/2\n" +
+                          "category1 (subcategoryB): 2 hours\n" +
+                          "category3: XYZ hours\n" +
+                          "Wednesday 1/3\n" +
+                          "category2: 0.25 hours\n")
+
+    def test_round_trip( self ):
+        """
+        Verifies allocations attached to shared memory match the allocations
+        published and can't be modified.
+        """
+
+        for configuration in [allocations_module.AllocationsConfig( default_year=2024 ),
+                              allocations_module.AllocationsConfig( default_year=2024,
+                                                                    duration_scale=allocations_module.Allocations.DURATION_SCALE_MINUTES )]:
+            allocation   = allocations_module.Allocations( self.ALLOCATIONS_STRING,
+                                                           configuration=configuration )
+            shared_block = allocation.to_shared_memory()
+
+            attached     = None
+
+            try:
+                attached = allocations_module.Allocations.from_shared_memory( shared_block.name )
+
+                self.assertEqual( list( attached.records() ), list( allocation.records() ) )
+                self.assertEqual( attached.summarize( max_depth=2 ), allocation.summarize( max_depth=2 ) )
+                self.assertEqual( attached.summarize( categories=("category2",), start=datetime.date( 2024, 1, 2 ) ),
+                                  allocation.summarize( categories=("category2",), start=datetime.date( 2024, 1, 2 ) ) )
+                self.assertEqual( attached.dates(), allocation.dates() )
+                self.assertEqual( attached.errors(), allocation.errors() )
+                self.assertEqual( attached.number_errors(), 1 )
+                self.assertEqual( attached.partitions(), allocation.partitions() )
+                self.assertEqual( attached.diff( allocation ),
+                                  allocations_module.AllocationsDiff( [], [], [], [], [] ) )
+                self.assertIs( attached.snapshot(), attached )
+
+                with self.assertRaisesRegex( ValueError, re.escape( "Snapshots cannot be modified" ) ):
+                    attached.parse( self.ALLOCATIONS_STRING )
+
+            finally:
+                # the attached columns must be released before the block is
+                # closed.
+                del attached
+                shared_block.close()
+                shared_block.unlink()
+
+class TestAllocationDailyTotals( unittest.TestCase ):
+    """
+    """
+
+    # 1/1/2024 is a Monday.  Wednesday, the weekend, and the following Monday
+    # are not recorded.
+    ALLOCATIONS_STRING = ("Monday 1/1\n" +
+                          "category1: 6 hours\n" +
+                          "category2: 1 hour\n" +
+                          "Tuesday 1/2\n" +
+                          "category1: 10 hours\n" +
+                          "Thursday 1/4\n" +
+                          "category1: 8 hours\n" +
+                          "Friday 1/5\n" +
+                          "category2: 8 hours\n" +
+                          "Tuesday 1/9\n" +
+                          "category1: 4 hours\n")
+
+    def test_daily_totals( self ):
+        """
+        Verifies dense totals, missing workdays, days outside of bounds, and
+        weekly utilization.
+        """
+
+        configuration = allocations_module.AllocationsConfig( default_year=2024 )
+        allocation    = allocations_module.Allocations( self.ALLOCATIONS_STRING,
+                                                        configuration=configuration )
+
+        daily_totals = allocation.daily_totals( datetime.date( 2024, 1, 1 ),
+                                                datetime.date( 2024, 1, 9 ),
+                                                minimum_hours=7.5,
+                                                maximum_hours=9.0 )
+
+        self.assertEqual( daily_totals.start, datetime.date( 2024, 1, 1 ) )
+        self.assertEqual( list( daily_totals.hours ), [7.0, 10.0, 0.0, 8.0, 8.0, 0.0, 0.0, 0.0, 4.0] )
+        self.assertEqual( list( daily_totals.missing_days ), [2, 7] )
+        self.assertEqual( list( daily_totals.under_days ), [0, 8] )
+        self.assertEqual( list( daily_totals.over_days ), [1] )
+        self.assertEqual( list( daily_totals.weekly_utilization ), [33.0 / 40.0, 4.0 / 16.0] )
+
+        # weekends can be workdays and weeks without workdays have no
+        # utilization.
+        daily_totals = allocation.daily_totals( datetime.date( 2024, 1, 6 ),
+                                                datetime.date( 2024, 1, 7 ) )
+        self.assertEqual( list( daily_totals.missing_days ), [] )
+        self.assertTrue( math.isnan( daily_totals.weekly_utilization[0] ) )
+
+        daily_totals = allocation.daily_totals( datetime.date( 2024, 1, 6 ),
+                                                datetime.date( 2024, 1, 7 ),
+                                                workdays=["Saturday"] )
+        self.assertEqual( list( daily_totals.missing_days ), [0] )
+
+        # fixed point durations and owners are honored.
+        configuration = allocations_module.AllocationsConfig( default_year=2024,
+                                                              duration_scale=allocations_module.Allocations.DURATION_SCALE_MINUTES )
+        allocation    = allocations_module.Allocations( configuration=configuration )
+        allocation.parse( self.ALLOCATIONS_STRING, owner="alice" )
+        allocation.parse( self.ALLOCATIONS_STRING, owner="bob" )
+
+        daily_totals = allocation.daily_totals( datetime.date( 2024, 1, 1 ),
+                                                datetime.date( 2024, 1, 2 ),
+                                                owners=["bob"] )
+        self.assertEqual( list( daily_totals.hours ), [7.0, 10.0] )
+
+        with self.assertRaisesRegex( ValueError, re.escape( "Unknown workday (Caturday)" ) ):
+            allocation.daily_totals( datetime.date( 2024, 1, 1 ),
+                                     datetime.date( 2024, 1, 2 ),
+                                     workdays=["Caturday"] )
+        with self.assertRaisesRegex( ValueError, re.escape( "Span of dates ends before it starts (2024-01-02 - 2024-01-01)" ) ):
+            allocation.daily_totals( datetime.date( 2024, 1, 2 ),
+                                     datetime.date( 2024, 1, 1 ) )
+
+class TestAllocationExports( unittest.TestCase ):
+    """
+    """
+
+    ALLOCATIONS_STRING = ("Monday 1/1\n" +
+                          "category1 (subcategoryA): 1.5 hours\n" +
+                          "category2, \"quoted\": 1 hour\n" +
+                          "Tuesday 1/2\n" +
+                          "category1: 0.25 hours\n")
+
+    def test_write_csv( self ):
+        """
+        Verifies CSV exports regardless of the batch size.
+        """
+
+        configuration = allocations_module.AllocationsConfig( default_year=2024,
+                                                              duration_scale=allocations_module.Allocations.DURATION_SCALE_MINUTES )
+        allocation    = allocations_module.Allocations( self.ALLOCATIONS_STRING,
+                                                        configuration=configuration )
+
+        for batch_size in [None, 1, 2]:
+            csv_file = io.StringIO()
+            allocation.write_csv( csv_file, batch_size=batch_size )
+
+            self.assertEqual( csv_file.getvalue().splitlines(),
+                              ["level_00,level_01,date,duration,datetime",
+                               "category1,subcategoryA,1/1,1.5,2024-01-01",
+                               "\"category2, \"\"quoted\"\"\",,1/1,1.0,2024-01-01",
+                               "category1,,1/2,0.25,2024-01-02"] )
+
+        # days without a year have empty dates.
+        csv_file = io.StringIO()
+        allocations_module.Allocations( "Monday 1/1\ncategory1: 1 hour\n" ).write_csv( csv_file )
+        self.assertEqual( csv_file.getvalue(),
+                          "level_00,date,duration,datetime\ncategory1,1/1,1.0,\n" )
+
+    def test_write_jsonl( self ):
+        """
+        Verifies JSON Lines exports.
+        """
+
+        allocation = allocations_module.Allocations( self.ALLOCATIONS_STRING )
+        jsonl_file = io.StringIO()
+        allocation.write_jsonl( jsonl_file, batch_size=2 )
+
+        self.assertEqual( [json.loads( line ) for line in jsonl_file.getvalue().splitlines()],
+                          [{"date": "1/1", "datetime": None, "duration": 1.5, "categories": ["category1", "subcategoryA"]},
+                           {"date": "1/1", "datetime": None, "duration": 1.0, "categories": ["category2, \"quoted\""]},
+                           {"date": "1/2", "datetime": None, "duration": 0.25, "categories": ["category1"]}] )
+
+class TestAllocationBatchSummaries( unittest.TestCase ):
+    """
+    """
+
+    ALLOCATIONS_STRING = ("Friday 12/29\n" +
+                          "category1 (subcategoryA): 1 hour\n" +
+                          "category2: 2 hours\n" +
+                          "Monday 1/1\n" +
+                          "category1 (subcategoryB): 3 hours\n" +
+                          "Thursday 4/4\n" +
+                          "category1 (subcategoryA): 0.5 hours\n" +
+                          "category3: 4 hours\n")
+
+    def test_summarize_batch( self ):
+        """
+        Verifies batched summaries match individual summaries and are totaled per
+        window when requested.
+        """
+
+        for duration_scale in [None, allocations_module.Allocations.DURATION_SCALE_HUNDREDTHS]:
+            configuration = allocations_module.AllocationsConfig( default_year=2023,
+                                                                  duration_scale=duration_scale )
+            allocation    = allocations_module.Allocations( configuration=configuration )
+            allocation.parse( self.ALLOCATIONS_STRING, owner="alice" )
+            allocation.parse( self.ALLOCATIONS_STRING, owner="bob" )
+
+            reports = [{},
+                       {"max_depth": 2, "categories": ("category1",)},
+                       {"owners": ["bob"], "month": 1},
+                       {"dates": ["12/29", "4/4"], "max_depth": 2},
+                       {"start": datetime.date( 2024, 1, 1 ), "end": datetime.date( 2024, 3, 31 )},
+                       {"categories": ("bogus",)}]
+
+            results = allocation.summarize_batch( reports + [{"window": allocations_module.Allocations.WINDOW_QUARTER,
+                                                              "owners": ["alice"]}] )
+
+            for report, result in zip( reports, results ):
+                self.assertEqual( result, allocation.summarize( **report ) )
+
+            self.assertEqual( results[-1],
+                              {"2023-Q4": {("category1",): 1.0, ("category2",): 2.0},
+                               "2024-Q1": {("category1",): 3.0},
+                               "2024-Q2": {("category1",): 0.5, ("category3",): 4.0}} )
+
+        self.assertEqual( allocation.summarize_batch( [] ), [] )
+
+        with self.assertRaisesRegex( ValueError, re.escape( "Unknown report parameter (bogus)" ) ):
+            allocation.summarize_batch( [{"bogus": 1}] )
+        with self.assertRaisesRegex( ValueError, re.escape( "Unknown window (decade)" ) ):
+            allocation.summarize_batch( [{"window": "decade"}] )
+
+class TestAllocationQueries( unittest.TestCase ):
+    """
+    """
+
+    ALLOCATIONS_STRING = ("Friday 12/29\n" +
+                          "category1 (subcategoryA): 1 hour\n" +
+                          "category2: 2 hours\n" +
+                          "Monday 1/1\n" +
+                          "category1 (subcategoryB): 3 hours\n" +
+                          "Thursday 4/4\n" +
+                          "category1 (subcategoryA (detail)): 0.5 hours\n" +
+                          "category3: 4 hours\n")
+
+    def setUp( self ):
+        configuration = allocations_module.AllocationsConfig( default_year=2023 )
+
+        self.allocation = allocations_module.Allocations( self.ALLOCATIONS_STRING,
+                                                          configuration=configuration )
+
+    def test_filters( self ):
+        """
+        Verifies filters are combined and only evaluated on request.
+        """
+
+        query = self.allocation.query()
+        self.assertEqual( query.collect(), list( self.allocation.records() ) )
+        self.assertEqual( query.sum(), 10.5 )
+
+        category1 = query.where_category( ("category1",) )
+        self.assertEqual( category1.sum(), 4.5 )
+        self.assertEqual( category1.where_category( ("category1", "subcategoryA") ).depth( 2 ).collect(),
+                          [("12/29", ("category1", "subcategoryA"), 1.0),
+                           ("4/4", ("category1", "subcategoryA"), 0.5)] )
+        self.assertEqual( category1.where_category( ("category2",) ).collect(), [] )
+
+        self.assertEqual( query.between( start=datetime.date( 2024, 1, 1 ) ).between( end=datetime.date( 2024, 3, 31 ) ).collect(),
+                          [("1/1", ("category1", "subcategoryB"), 3.0)] )
+
+        # queries see allocations parsed after they were built.
+        self.allocation.parse( "Wednesday 4/5\ncategory1: 2 hours\n" )
+        self.assertEqual( category1.sum(), 6.5 )
+
+        with self.assertRaisesRegex( ValueError, re.escape( "Maximum depth must be positive (0)" ) ):
+            query.depth( 0 )
+
+    def test_grouping( self ):
+        """
+        Verifies grouped totals and DataFrames.
+        """
+
+        query = self.allocation.query().depth( 1 ).group_by( allocations_module.AllocationsQuery.GROUP_QUARTER,
+                                                             allocations_module.AllocationsQuery.GROUP_CATEGORY )
+
+        self.assertEqual( query.collect(),
+                          {("2023-Q4", ("category1",)): 1.0,
+                           ("2023-Q4", ("category2",)): 2.0,
+                           ("2024-Q1", ("category1",)): 3.0,
+                           ("2024-Q2", ("category1",)): 0.5,
+                           ("2024-Q2", ("category3",)): 4.0} )
+        self.assertEqual( query.sum(), 10.5 )
+        self.assertEqual( query.group_by( allocations_module.AllocationsQuery.GROUP_OWNER ).collect(),
+                          {(None,): 10.5} )
+
+        with self.assertRaisesRegex( ValueError, re.escape( "Unknown group key (decade)" ) ):
+            query.group_by( "decade" )
+
+        if importlib.util.find_spec( "pandas" ) is None:
+            return
+
+        df = query.to_df()
+        self.assertEqual( list( df.columns ), ["quarter", "level_00", "duration"] )
+        self.assertEqual( len( df ), 5 )
+
+        df = self.allocation.query().where_category( ("category1",) ).to_df()
+        self.assertEqual( list( df.columns ), ["level_00", "level_01", "level_02", "date", "duration"] )
+        self.assertEqual( list( df["level_02"] ), ["", "", "detail"] )
+
+class TestAllocationNoiseDetection( unittest.TestCase ):
+    """
+    """
+
+    def test_looks_like_allocation( self ):
+        """
+        Verifies lines that look like allocations are distinguished from noise.
+        """
+
+        for line in ["category: XYZ hours",
+                     "category (subcategory): 1 hour",
+                     "category\t1.5 hours",
+                     "category 2. HRS",
+                     "category:\tsoon"]:
+            self.assertTrue( allocations_module.Allocations._looks_like_allocation( line ), line )
+
+        for line in ["see https://example.com/tickets/12345 for details",
+                     "category:soon",
+                     "category: 1 hour: later",
+                     "category . hours",
+                     "TODO review 3 pull requests",
+                     "category 1 hourly"]:
+            self.assertFalse( allocations_module.Allocations._looks_like_allocation( line ), line )
+
+    def test_max_line_length( self ):
+        """
+        Verifies lines longer than the maximum are ignored rather than validated.
+        """
+
+        allocations_string = ("Monday 1/1\n" +
+                              "category1: 1 hour\n" +
+                              "category2: " + "x" * 100 + " hours\n" +
+                              "category3: 2 hours" + " " * 100 + "# trailing whitespace and comments don't count\n")
+
+        allocation = allocations_module.Allocations( allocations_string )
+        self.assertEqual( allocation.number_errors(), 1 )
+
+        configuration = allocations_module.AllocationsConfig( max_line_length=50,
+                                                              collect_statistics=True )
+        allocation    = allocations_module.Allocations( allocations_string,
+                                                        configuration=configuration )
+        self.assertEqual( allocation.number_errors(), 0 )
+        self.assertEqual( allocation.summarize(), {("category1",): 1.0, ("category3",): 2.0} )
+        self.assertEqual( allocation.statistics()["ignored_lines"], 1 )
+
+class TestAllocationCategoryDayMatrix( unittest.TestCase ):
+    """
+    """
+
+    ALLOCATIONS_STRING = ("Friday 12/29\n" +
+                          "category1 (subcategoryA): 1 hour\n" +
+                          "category2: 2 hours\n" +
+                          "category1 (subcategoryB): 0.5 hours\n" +
+                          "Monday 1/1\n" +
+                          "category1: 3 hours\n" +
+                          "category3: 4 hours\n")
+
+    def test_category_day_matrix( self ):
+        """
+        Verifies entries are totaled per category and day, across owners, and
+        respect the requested depth and filters.
+        """
+
+        configuration = allocations_module.AllocationsConfig( duration_scale=allocations_module.Allocations.DURATION_SCALE_MINUTES )
+        allocation    = allocations_module.Allocations( configuration=configuration )
+        allocation.parse( self.ALLOCATIONS_STRING, current_year=2023, owner="alice" )
+        allocation.parse( "Friday 12/29\ncategory2: 1 hour\n", current_year=2023, owner="bob" )
+
+        # days without a year are excluded.
+        allocation.parse( "Monday 1/1\ncategory4: 1 hour\n" )
+
+        matrix = allocation.category_day_matrix()
+
+        self.assertEqual( matrix.categories, [("category1",), ("category2",), ("category3",)] )
+        self.assertEqual( list( matrix.day_ordinals ), [datetime.date( 2023, 12, 29 ).toordinal(),
+                                                        datetime.date( 2024, 1, 1 ).toordinal()] )
+        self.assertEqual( list( zip( matrix.rows, matrix.columns, matrix.hours ) ),
+                          [(0, 0, 1.5), (0, 1, 3.0), (1, 0, 3.0), (2, 1, 4.0)] )
+
+        matrix = allocation.category_day_matrix( max_depth=2,
+                                                 categories=("category1",),
+                                                 start=datetime.date( 2023, 12, 29 ),
+                                                 end=datetime.date( 2023, 12, 31 ) )
+
+        self.assertEqual( matrix.categories, [("category1", "subcategoryA"), ("category1", "subcategoryB")] )
+        self.assertEqual( list( zip( matrix.rows, matrix.columns, matrix.hours ) ),
+                          [(0, 0, 1.0), (1, 0, 0.5)] )
+
+        # categories shallower than the filter are excluded even when they
+        # match the rows of deeper ones.
+        matrix = allocation.category_day_matrix( max_depth=1,
+                                                 categories=("category1", "subcategoryA") )
+        self.assertEqual( matrix.categories, [("category1",)] )
+        self.assertEqual( list( matrix.hours ), [1.0] )
+
+        matrix = allocation.category_day_matrix( owners=["bob"] )
+        self.assertEqual( matrix.categories, [("category2",)] )
+        self.assertEqual( list( matrix.hours ), [1.0] )
+
+        if importlib.util.find_spec( "scipy" ) is None:
+            return
+
+        sparse_matrix, categories, day_ordinals = allocation.to_sparse()
+        self.assertEqual( sparse_matrix.shape, (3, 2) )
+        self.assertEqual( sparse_matrix.toarray().tolist(), [[1.5, 3.0], [3.0, 0.0], [0.0, 4.0]] )
+        self.assertEqual( len( categories ), 3 )
+        self.assertEqual( len( day_ordinals ), 2 )
+
+class TestAllocationBulkRecords( unittest.TestCase ):
+    """
+    """
+
+    def test_add_records( self ):
+        """
+        Verifies records are grouped into days, validated in bulk, and match the
+        equivalent parsed allocations.
+        """
+
+        configuration = allocations_module.AllocationsConfig( duration_scale=allocations_module.Allocations.DURATION_SCALE_MINUTES,
+                                                              collect_statistics=True )
+        allocation    = allocations_module.Allocations( configuration=configuration )
+
+        status = allocation.add_records( [datetime.date( 2024, 1, 2 ),
+                                          datetime.date( 2024, 1, 1 ),
+                                          datetime.date( 2024, 1, 2 ),
+                                          "1/3",
+                                          datetime.date( 2024, 1, 3 ),
+                                          datetime.date( 2024, 1, 3 ),
+                                          datetime.date( 2024, 1, 3 )],
+                                         [("category1", " subcategoryA "),
+                                          ["category2"],
+                                          "category3",
+                                          ("category1",),
+                                          ("category1", ""),
+                                          ("category1",),
+                                          ("category1",)],
+                                         [1.5, "0.25", 2, 1.0, 1.0, -1.0, "XYZ"],
+                                         owner="alice" )
+
+        self.assertFalse( status )
+        self.assertEqual( [(error.line_number, error.code) for error in allocation.errors()],
+                          [(4, allocations_module.Allocations.ERROR_DATE_MALFORMED),
+                           (5, allocations_module.Allocations.ERROR_ALLOCATION_CATEGORY),
+                           (6, allocations_module.Allocations.ERROR_ALLOCATION_DURATION),
+                           (7, allocations_module.Allocations.ERROR_ALLOCATION_DURATION)] )
+        self.assertEqual( allocation.statistics()["allocations_accepted"], 3 )
+        self.assertEqual( allocation.statistics()["allocations_rejected"], 4 )
+
+        parsed = allocations_module.Allocations( configuration=configuration )
+        parsed.parse( "Monday 1/1\n" +
+                      "category2: 0.25 hours\n" +
+                      "Tuesday 1/2\n" +
+                      "category1 (subcategoryA): 1.5 hours\n" +
+                      "category3: 2 hours\n",
+                      current_year=2024,
+                      owner="alice" )
+
+        self.assertEqual( list( allocation.records() ), list( parsed.records() ) )
+        self.assertEqual( allocation.dates(), parsed.dates() )
+        self.assertEqual( allocation.partitions(), parsed.partitions() )
+        self.assertEqual( allocation.diff( parsed ), allocations_module.AllocationsDiff( [], [], [], [], [] ) )
+
+        with self.assertRaisesRegex( ValueError, re.escape( "Records must have the same number of dates, categories, and durations (1, 0, 0)" ) ):
+            allocation.add_records( [datetime.date( 2024, 1, 1 )], [], [] )
+
+        # strict parsing raises on the first invalid record.
+        strict_configuration = allocations_module.AllocationsConfig( strict_parsing=True )
+        with self.assertRaisesRegex( ValueError, re.escape( "(string):2 - Allocation has invalid duration (\"2024-01-01 category1: 0 hours\")" ) ):
+            allocations_module.Allocations( configuration=strict_configuration ).add_records( [datetime.date( 2024, 1, 1 )] * 2,
+                                                                                              [("category1",)] * 2,
+                                                                                              [1, 0] )
+
+        # categories must be sequences of strings.
+        allocation = allocations_module.Allocations()
+        self.assertFalse( allocation.add_records( [datetime.date( 2024, 1, 1 )] * 6,
+                                                  [None, 5, ("category1", None), ["category1", ["a"]], [], ["category1"]],
+                                                  [1] * 6 ) )
+        self.assertEqual( [(error.line_number, error.code, error.message) for error in allocation.errors()],
+                          [(1, allocations_module.Allocations.ERROR_ALLOCATION_CATEGORY, "Allocation categories are not a sequence"),
+                           (2, allocations_module.Allocations.ERROR_ALLOCATION_CATEGORY, "Allocation categories are not a sequence"),
+                           (3, allocations_module.Allocations.ERROR_ALLOCATION_CATEGORY, "Allocation has a category that is not a string"),
+                           (4, allocations_module.Allocations.ERROR_ALLOCATION_CATEGORY, "Allocation has a category that is not a string"),
+                           (5, allocations_module.Allocations.ERROR_ALLOCATION_CATEGORY, "Allocation has an empty category")] )
+        self.assertEqual( list( allocation.records() ), [("1/1", ("category1",), 1.0)] )
+
+        # positive durations that round to zero units are rejected too.
+        allocation = allocations_module.Allocations( configuration=configuration )
+        self.assertFalse( allocation.add_records( [datetime.date( 2024, 1, 1 )] * 3,
+                                                  [("category1",)] * 3,
+                                                  [0.001, "0.001", 0.01] ) )
+        self.assertEqual( [(error.line_number, error.code, error.message) for error in allocation.errors()],
+                          [(1, allocations_module.Allocations.ERROR_ALLOCATION_DURATION, "Allocation duration rounds to zero (60 units per hour)"),
+                           (2, allocations_module.Allocations.ERROR_ALLOCATION_DURATION, "Allocation duration rounds to zero (60 units per hour)")] )
+        self.assertEqual( allocation.summarize(), {("category1",): 1 / 60} )
+
+        allocation = allocations_module.Allocations()
+        self.assertFalse( allocation.add_records( [datetime.date( 2024, 1, 1 )],
+                                                  [("category1",)],
+                                                  ["0.{:s}1".format( "0" * 400 )] ) )
+        self.assertEqual( [(error.line_number, error.code, error.message) for error in allocation.errors()],
+                          [(1, allocations_module.Allocations.ERROR_ALLOCATION_DURATION, "Allocation duration rounds to zero")] )
+
+    def test_add_records_duplicate_days( self ):
+        """
+        Verifies days added in bulk are subject to the duplicate days policy.
+        """
+
+        configuration = allocations_module.AllocationsConfig( duplicate_days=allocations_module.Allocations.DUPLICATE_DAYS_KEEP_LAST )
+        allocation    = allocations_module.Allocations( configuration=configuration )
+
+        allocation.parse( "Monday 1/1\ncategory1: 1 hour\n", current_year=2024 )
+        allocation.add_records( [datetime.date( 2024, 1, 1 )], [("category2",)], [2] )
+
+        self.assertEqual( list( allocation.records() ), [("1/1", ("category2",), 2.0)] )
+
+        # duplicates are reported at the first record of the duplicate day.
+        configuration = allocations_module.AllocationsConfig( duplicate_days=allocations_module.Allocations.DUPLICATE_DAYS_ERROR )
+        allocation    = allocations_module.Allocations( configuration=configuration )
+
+        allocation.parse( "Monday 1/1\ncategory1: 1 hour\n", current_year=2024 )
+        self.assertFalse( allocation.add_records( [datetime.date( 2024, 1, 2 ),
+                                                   datetime.date( 2024, 1, 3 ),
+                                                   datetime.date( 2024, 1, 1 ),
+                                                   datetime.date( 2024, 1, 1 )],
+                                                  [("category2",)] * 4,
+                                                  [2] * 4 ) )
+        self.assertEqual( [(error.line_number, error.code) for error in allocation.errors()],
+                          [(3, allocations_module.Allocations.ERROR_DATE_DUPLICATE)] )
+
+    def test_read_csv( self ):
+        """
+        Verifies CSVs written by write_csv() are read back.
+        """
+
+        allocations_string = ("Monday 1/1\n" +
+                              "category1 (subcategoryA (detail)): 1.5 hours\n" +
+                              "category2: 1 hour\n" +
+                              "Tuesday 1/2\n" +
+                              "category1: 0.25 hours\n")
+
+        configuration = allocations_module.AllocationsConfig( default_year=2024 )
+        allocation    = allocations_module.Allocations( allocations_string,
+                                                        configuration=configuration )
+
+        csv_file = io.StringIO()
+        allocation.write_csv( csv_file )
+        csv_file.seek( 0 )
+
+        imported = allocations_module.Allocations()
+        self.assertTrue( imported.read_csv( csv_file ) )
+        self.assertEqual( list( imported.records() ), list( allocation.records() ) )
+        self.assertEqual( imported.dates(), allocation.dates() )
+
+        # errors are reported against the CSV's lines.
+        imported = allocations_module.Allocations()
+        self.assertFalse( imported.read_csv( ["duration,date,level_00",
+                                              "1,2024-01-01,category1",
+                                              "1,01/02/2024,category1",
+                                              "0.5,2024-01-02"] ) )
+        self.assertEqual( [(error.line_number, error.code) for error in imported.errors()],
+                          [(3, allocations_module.Allocations.ERROR_DATE_MALFORMED),
+                           (4, allocations_module.Allocations.ERROR_ALLOCATION_CATEGORY)] )
+        self.assertEqual( list( imported.records() ), [("1/1", ("category1",), 1.0)] )
+
+        # yearless allocations are written without ISO dates so their year is
+        # supplied when they're read back and rolls over like parsed dates do.
+        yearless_string = ("Tuesday 12/31\n" +
+                           "category1: 1 hour\n" +
+                           "Wednesday 1/1\n" +
+                           "category2 (subcategoryA): 2 hours\n" +
+                           "category1: 0.5 hours\n")
+
+        yearless = allocations_module.Allocations( yearless_string )
+
+        csv_file = io.StringIO()
+        yearless.write_csv( csv_file )
+
+        csv_file.seek( 0 )
+        imported = allocations_module.Allocations()
+        self.assertFalse( imported.read_csv( csv_file ) )
+        self.assertEqual( {error.code for error in imported.errors()},
+                          {allocations_module.Allocations.ERROR_DATE_MALFORMED} )
+
+        csv_file.seek( 0 )
+        imported = allocations_module.Allocations()
+        self.assertTrue( imported.read_csv( csv_file, year=2024 ) )
+        self.assertEqual( list( imported.records() ), list( yearless.records() ) )
+
+        configuration = allocations_module.AllocationsConfig( default_year=2024 )
+        self.assertEqual( imported.dates(),
+                          allocations_module.Allocations( yearless_string, configuration=configuration ).dates() )
+
+        with self.assertRaisesRegex( ValueError, re.escape( "CSV does not have a duration column ((string))" ) ):
+            allocations_module.Allocations().read_csv( ["date,level_00"] )
+
 if __name__ == "__main__":
     unittest.main()